@@ -1,5 +1,4 @@
 import os
-import ast
 import requests
 import wandb
 import numpy as np
@@ -62,51 +61,40 @@ def get_results_df(model_name, training_data, test_data, y_pred, prediction_hori
 
     # Add test data input for numerical features
     for feature in num_features:
-        results_df['test_input_' + feature] = [x_test[feature].tolist()]
+        results_df['test_input_' + feature] = [x_test[feature].to_numpy()]
 
     # Add test data dates
-    results_df['test_input_date'] = [x_test.index.tolist()]
+    results_df['test_input_date'] = [x_test.index.to_numpy()]
 
     metrics = helpers.list_files_in_package('metrics')
     metrics = [os.path.splitext(file)[0] for file in metrics if file not in ('__init__.py', 'base_metric.py')]
 
+    # Resolving the metric classes once for all prediction horizons
+    metric_classes = {metric: helpers.get_metric_module(metric).Metric for metric in metrics}
+
     target_cols = list(y_test.columns)
     if target_cols == ['target']:
         # In this case, targets are stored into sequences for Neural Networks
-        targets = [np.array(ast.literal_eval(target_str)) for target_str in y_test['target']]
-        targets = np.array(targets)
-        _, n_predictions = targets.shape
-
-        for i, minutes in enumerate(range(5, n_predictions * 5 + 1, 5)):
-            curr_y_test = targets[:, i].tolist()
-            curr_y_pred = [float(val[i]) for val in y_pred]
-            results_df = results_df.copy()  # To silent PerformanceWarning
-            results_df[f'target_{minutes}'] = [curr_y_test]
-            results_df[f'y_pred_{minutes}'] = [curr_y_pred]
-
-            for metric in metrics:
-                metric_module = helpers.get_metric_module(metric)
-                chosen_metric = metric_module.Metric()
-                score = chosen_metric(curr_y_test, curr_y_pred, prediction_horizon=minutes)
-                results_df[f'{metric}_{minutes}'] = [score]
-
+        targets = np.asarray(y_test['target'], dtype=float)
+        target_cols = [f'target_{minutes}' for minutes in range(5, targets.shape[1] * 5 + 1, 5)]
     else:
-        for i, minutes in enumerate(range(5, len(target_cols) * 5 + 1, 5)):
-            curr_y_test = y_test[target_cols[i]].tolist()
-            curr_y_pred = [float(val[i]) for val in y_pred]
-            results_df = results_df.copy()  # To silent PerformanceWarning
-            results_df[target_cols[i]] = [curr_y_test]
-            results_df[f'y_pred_{minutes}'] = [curr_y_pred]
-
-            for metric in metrics:
-                metric_module = helpers.get_metric_module(metric)
-                chosen_metric = metric_module.Metric()
-                score = chosen_metric(y_test[target_cols[i]], curr_y_pred, prediction_horizon=minutes)
-                results_df[f'{metric}_{minutes}'] = [score]
-
-    for col in results_df.columns:
-        if results_df[col].apply(lambda x: isinstance(x, list)).any():
-            results_df[col] = results_df[col].astype(str)  # or df[col].apply(str)
+        targets = y_test[target_cols].to_numpy(dtype=float)
+
+    # Samples x horizons matrices of the measured and predicted values
+    prediction_horizons = list(range(5, len(target_cols) * 5 + 1, 5))
+    predictions = np.array([np.asarray(val, dtype=float)[:len(target_cols)] for val in y_pred]).reshape(
+        -1, len(target_cols))
+
+    scores = {metric: metric_class().calculate_matrix(targets, predictions, prediction_horizons)
+              for metric, metric_class in metric_classes.items()}
+
+    results = {}
+    for i, minutes in enumerate(prediction_horizons):
+        results[target_cols[i]] = [targets[:, i]]
+        results[f'y_pred_{minutes}'] = [predictions[:, i]]
+        for metric in metrics:
+            results[f'{metric}_{minutes}'] = [scores[metric][i]]
+    results_df = pd.concat([results_df, pd.DataFrame(results)], axis=1)
 
     return results_df
 
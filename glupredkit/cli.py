@@ -7,6 +7,8 @@ import os
 import wandb
 import ast
 import importlib
+import json
+import shutil
 import pandas as pd
 from dotenv import load_dotenv
 from pathlib import Path
@@ -23,6 +25,10 @@ from glupredkit.helpers.unit_config_manager import unit_config_manager
 from glupredkit.helpers.model_config_manager import ModelConfigurationManager, generate_model_configuration
 import glupredkit.helpers.cli as helpers
 import glupredkit.helpers.generate_report as generate_report
+import glupredkit.helpers.results as results
+import glupredkit.helpers.preprocessing_cache as preprocessing_cache
+import glupredkit.helpers.experiments as experiments
+from glupredkit.models.per_subject import PerSubjectModel
 import glupredkit.api as gpk
 
 
@@ -58,7 +64,13 @@ def setup_directories():
 @click.option('--end-date', type=str, help='End date for data retrieval. Default is now. Format "dd-mm-yyyy"')
 @click.option('--output-file-name', type=str, help='The file name for the output.')
 @click.option('--test-size', type=float, default=0.25)
-def parse(parser, username, password, start_date, file_path, end_date, output_file_name, test_size):
+@click.option('--output-format', type=click.Choice(['csv', 'dataset']), default='csv',
+              help='Store the data as a CSV file, or as a typed dataset directory partitioned by subject, which is '
+                   'faster to load.')
+@click.option('--n-workers', type=int, default=1, help='Number of processes that parse the subjects of the OpenAPS '
+                                                        'dataset.')
+def parse(parser, username, password, start_date, file_path, end_date, output_file_name, test_size, output_format,
+          n_workers):
     """Parse data and store it as CSV in data/raw using a selected parser"""
 
     # Load the chosen parser dynamically based on user input
@@ -95,9 +107,14 @@ def parse(parser, username, password, start_date, file_path, end_date, output_fi
             file_name = (parser + '_' + start_date.strftime(date_format) + '_to_' + end_date.strftime(
                 date_format) + '.csv')
 
-        click.echo("Storing data as CSV...")
-        helpers.store_data_as_csv(data, output_path, file_name)
-        click.echo(f"Data stored as CSV at '{output_path}' as '{file_name}'")
+        if output_format == 'dataset':
+            click.echo("Storing data as dataset...")
+            helpers.store_data_as_dataset(data, output_path, file_name)
+            click.echo(f"Data stored as dataset at '{output_path}' as '{os.path.splitext(file_name)[0]}'")
+        else:
+            click.echo("Storing data as CSV...")
+            helpers.store_data_as_csv(data, output_path, file_name)
+            click.echo(f"Data stored as CSV at '{output_path}' as '{file_name}'")
         click.echo(f"Data has the shape: {data.shape}")
 
     # Ensure that the optional params match the parser
@@ -151,7 +168,7 @@ def parse(parser, username, password, start_date, file_path, end_date, output_fi
         if file_path is None:
             raise ValueError(f"{parser} parser requires that you provide --file-path")
         else:
-            parsed_data = chosen_parser(file_path=file_path)
+            parsed_data = chosen_parser(file_path=file_path, n_workers=n_workers)
             output_file_name = "open_aps"
     elif parser in ['tidepool_dataset']:
         if file_path is None:
@@ -242,8 +259,26 @@ def generate_config(file_name, data, subject_ids, preprocessor, prediction_horiz
 @click.option('--training-samples-per-subject', type=int, required=False)
 @click.option('--model-name', type=str, required=False)
 @click.option('--max-samples', type=int, required=False)
+@click.option('--n-workers', type=int, default=1, help="Number of processes for the therapy settings search of the "
+                                                      "Loop models, the per-subject fitting of the ridge model and the "
+                                                      "identification of the UvA/Padova model, of threads for the "
+                                                      "trees of the random forest, or of processes for the subjects "
+                                                      "with --per-subject")
+@click.option('--early-abandon', is_flag=True, help="Stop evaluating a therapy setting of the Loop models once it is "
+                                                     "worse than the best so far")
+@click.option('--n-bins', type=int, required=False, help="Bin the features of the random forest into this number "
+                                                         "of quantile bins before training")
+@click.option('--n-components', type=int, required=False, help="Approximate the kernel of the svr model with this "
+                                                               "number of random Fourier features")
+@click.option('--n-forecast-particles', type=click.IntRange(min=1), required=False,
+              help="Predict ahead with this number of particles of the UvA/Padova particle filter, instead of all")
+@click.option('--per-subject', is_flag=True, help="Fit one instance of the model on the data of each subject, with "
+                                                  "n-workers processes. Not supported for the sequence models")
+@click.option('--no-cache', is_flag=True, help="Process the data without reading or writing the preprocessing cache")
+@click.option('--rebuild-cache', is_flag=True, help="Process the data and replace it in the preprocessing cache")
 def train_model(config_file_name, model, model_name, model_path, epochs, n_cross_val_samples, n_steps,
-                training_samples_per_subject, max_samples):
+                training_samples_per_subject, max_samples, n_workers, early_abandon, n_bins, n_components,
+                n_forecast_particles, per_subject, no_cache, rebuild_cache):
     """
     This method does the following:
     1) Process data using the given configurations
@@ -253,6 +288,9 @@ def train_model(config_file_name, model, model_name, model_path, epochs, n_cross
         raise click.UsageError("You must specify either --model or --model-path.")
     if model and model_path:
         raise click.UsageError("You can specify only one: either --model or --model-path.")
+    if per_subject and model in experiments.DEEP_LEARNING_MODELS:
+        raise click.UsageError(f"--per-subject is not supported for {model}, which processes the data into "
+                               f"sequences without subject ids.")
 
     if model:
         click.echo(f"Using pre-defined model: {model}")
@@ -275,39 +313,72 @@ def train_model(config_file_name, model, model_name, model_path, epochs, n_cross
     model_config_manager = ModelConfigurationManager(config_file_name)
     prediction_horizon = model_config_manager.get_prediction_horizon()
 
+    # Create an instance of the chosen model
+    chosen_model = model_module.Model(prediction_horizon)
+
     # PREPROCESSING
     # Perform data preprocessing using your preprocessor
-    input_file_name = model_config_manager.get_data()
-    data = helpers.read_data_from_csv("data/raw/", input_file_name)
-    data = data[~data['is_test']]
-
-    if max_samples:
-        data = data.tail(max_samples + model_config_manager.get_num_lagged_features() + (prediction_horizon // 5))
-
-    train_data, _ = helpers.get_preprocessed_data(data, prediction_horizon, model_config_manager)
+    def process_training_data():
+        input_file_name = model_config_manager.get_data()
+        data = helpers.read_data_from_csv("data/raw/", input_file_name, model_config_manager, is_test=False)
+
+        if max_samples:
+            data = data.tail(max_samples + model_config_manager.get_num_lagged_features() + (prediction_horizon // 5))
+
+        train_data, _ = helpers.get_preprocessed_data(data, prediction_horizon, model_config_manager)
+        return chosen_model.process_data(train_data, model_config_manager, real_time=False)
+
+    # Models with the same preprocessing on the same data and configuration share the processed data in the cache
+    cache_key = helpers.get_processed_data_cache_key(model_config_manager, chosen_model.process_data, split='train',
+                                                     max_samples=max_samples)
+    processed_data, is_cached = preprocessing_cache.get_or_compute(cache_key, process_training_data,
+                                                                   use_cache=not no_cache, rebuild=rebuild_cache)
+    if is_cached:
+        click.echo("Using cached processed training data...")
+    elif not no_cache:
+        click.echo(f"Stored the processed training data in the preprocessing cache in "
+                   f"{preprocessing_cache.CACHE_DIR}/...")
     click.echo(f"Training data finished preprocessing...")
 
     # MODEL TRAINING
-    # Create an instance of the chosen model
-    chosen_model = model_module.Model(prediction_horizon)
-
-    processed_data = chosen_model.process_data(train_data, model_config_manager, real_time=False)
     target_columns = [column for column in processed_data.columns if column.startswith('target')]
     x_train = processed_data.drop(target_columns, axis=1)
     y_train = processed_data[target_columns]
 
     click.echo(f"Training model...")
 
+    # Models that are identified per subject store their progress here, so that an interrupted training can be resumed
+    checkpoint_dir = (Path("data") / "trained_models" / "checkpoints" /
+                      f'{model_name}__{config_file_name}__{prediction_horizon}')
+
     # Initialize and train the model
     # Ensure that the optional params match the parser
+    # With --per-subject, the subjects are fitted in n_workers processes, so each subject is fitted in one process
+    model_n_workers = 1 if per_subject else n_workers
+    fit_args, fit_kwargs = [], {}
     if model in ['double_lstm', 'lstm', 'mtl', 'stl', 'tcn'] and epochs:
-        model_instance = chosen_model.fit(x_train, y_train, epochs)
-    elif model in ['loop'] and n_cross_val_samples:
-        model_instance = chosen_model.fit(x_train, y_train, n_cross_val_samples)
-    elif model in ['uva_padova'] and n_steps or training_samples_per_subject:
-        model_instance = chosen_model.fit(x_train, y_train, n_steps, training_samples_per_subject)
-    else:
-        model_instance = chosen_model.fit(x_train, y_train)
+        fit_args = [epochs]
+    elif model in ['loop', 'loop_v2']:
+        if n_cross_val_samples:
+            fit_args = [n_cross_val_samples]
+        fit_kwargs = {'n_workers': model_n_workers, 'early_abandon': early_abandon}
+    elif model in ['ridge']:
+        fit_kwargs = {'n_workers': model_n_workers}
+    elif model in ['random_forest']:
+        fit_kwargs = {'n_jobs': model_n_workers, 'n_bins': n_bins}
+    elif model in ['svr']:
+        fit_kwargs = {'n_components': n_components}
+    elif model in ['uva_padova']:
+        fit_kwargs = {'n_workers': model_n_workers, 'checkpoint_dir': checkpoint_dir,
+                      'n_forecast_particles': n_forecast_particles}
+        if n_steps:
+            fit_kwargs['n_steps'] = n_steps
+        if training_samples_per_subject:
+            fit_kwargs['training_samples_per_subject'] = training_samples_per_subject
+
+    if per_subject:
+        chosen_model = PerSubjectModel(model_module.Model, prediction_horizon, n_workers=n_workers)
+    model_instance = chosen_model.fit(x_train, y_train, *fit_args, **fit_kwargs)
 
     click.echo(f"Model {model} with prediction horizon {prediction_horizon} minutes trained successfully!")
 
@@ -324,6 +395,10 @@ def train_model(config_file_name, model, model_name, model_path, epochs, n_cross
         with open(output_path, 'wb') as f:
             click.echo(f"Saving model {model} to {output_path}...")
             dill.dump(model_instance, f)
+
+        # The checkpoints are not needed after the model is stored
+        if checkpoint_dir.exists():
+            shutil.rmtree(checkpoint_dir)
     except Exception as e:
         click.echo(f"Error saving model {model}: {e}")
 
@@ -335,7 +410,9 @@ def train_model(config_file_name, model, model_name, model_path, epochs, n_cross
 @click.command()
 @click.argument('model_file', type=str)
 @click.option('--max-samples', type=int, required=False)
-def evaluate_model(model_file, max_samples):
+@click.option('--no-cache', is_flag=True, help="Process the data without reading or writing the preprocessing cache")
+@click.option('--rebuild-cache', is_flag=True, help="Process the data and replace it in the preprocessing cache")
+def evaluate_model(model_file, max_samples, no_cache, rebuild_cache):
     tested_models_path = "data/tested_models"
     model_name, config_file_name, prediction_horizon = (model_file.split('__')[0], model_file.split('__')[1],
                                                         int(model_file.split('__')[2].split('.')[0]))
@@ -343,13 +420,23 @@ def evaluate_model(model_file, max_samples):
     model_config_manager = ModelConfigurationManager(config_file_name)
     model_instance = helpers.get_trained_model(model_file)
 
-    input_file_name = model_config_manager.get_data()
-    data = helpers.read_data_from_csv("data/raw/", input_file_name)
-    test_data = data[data['is_test']]
-    training_data = data[~data['is_test']]
-    _, test_data = helpers.get_preprocessed_data(test_data, prediction_horizon, model_config_manager)
-
-    test_data = model_instance.process_data(test_data, model_config_manager, real_time=False)
+    def process_test_data():
+        input_file_name = model_config_manager.get_data()
+        data = helpers.read_data_from_csv("data/raw/", input_file_name, model_config_manager)
+        test_data = data[data['is_test']]
+        # Only the number of training samples and their CGM values are used in the results
+        training_data = data.loc[~data['is_test'], ['CGM']]
+        _, test_data = helpers.get_preprocessed_data(test_data, prediction_horizon, model_config_manager)
+        return model_instance.process_data(test_data, model_config_manager, real_time=False), training_data
+
+    cache_key = helpers.get_processed_data_cache_key(model_config_manager, model_instance.process_data, split='test')
+    (test_data, training_data), is_cached = preprocessing_cache.get_or_compute(cache_key, process_test_data,
+                                                                               use_cache=not no_cache,
+                                                                               rebuild=rebuild_cache)
+    if is_cached:
+        click.echo("Using cached processed test data...")
+    elif not no_cache:
+        click.echo(f"Stored the processed test data in the preprocessing cache in {preprocessing_cache.CACHE_DIR}/...")
     target_cols = [col for col in test_data if col.startswith('target')]
 
     if max_samples:
@@ -368,15 +455,15 @@ def evaluate_model(model_file, max_samples):
     # Define the path to store the dataframe
     model_name, config_file_name, prediction_horizon = (model_file.split('__')[0], model_file.split('__')[1],
                                                         int(model_file.split('__')[2].split('.')[0]))
-    output_file = f"{tested_models_path}/{model_name}__{config_file_name}__{prediction_horizon}.csv"
+    output_file = f"{tested_models_path}/{model_name}__{config_file_name}__{prediction_horizon}.npz"
 
-    # Store the dataframe in a file
-    results_df.to_csv(output_file, index=False)
+    # Store the results as an array bundle with a metadata sidecar
+    results.save_results(results_df, output_file)
     click.echo(f"Model {model_name} is finished testing. Results are stored in {tested_models_path}")
 
 
 @click.command()
-@click.option('--results-files', help='The name of the tested model results to evaluate, with ".csv". If '
+@click.option('--results-files', help='The name of the tested model results to evaluate, with ".npz". If '
                                       'None, all models will be tested.')
 @click.option('--plots', help='List of plots to be computed, separated by comma. '
                               'By default a scatter plot will be drawn. ', default='scatter_plot')
@@ -396,7 +483,7 @@ def draw_plots(results_files, plots, prediction_horizons, type, show_plots, metr
     plots = helpers.split_string(plots)
 
     if results_files is None:
-        results_files = helpers.list_files_in_directory('data/tested_models/')
+        results_files = results.list_results_files('data/tested_models/')
     else:
         results_files = helpers.split_string(results_files)
 
@@ -466,7 +553,7 @@ def draw_plots(results_files, plots, prediction_horizons, type, show_plots, metr
 
 
 @click.command()
-@click.option('--results-file', help='The name of the tested model results to evaluate, with ".csv".',
+@click.option('--results-file', help='The name of the tested model results to evaluate, with ".npz".',
               required=True)
 def generate_evaluation_pdf(results_file):
     """
@@ -584,7 +671,7 @@ def generate_evaluation_pdf(results_file):
 
 
 @click.command()
-@click.option('--results-files', help='The name of the tested model results to evaluate, with ".csv". If '
+@click.option('--results-files', help='The name of the tested model results to evaluate, with ".npz". If '
                                       'None, all models will be tested.')
 def generate_comparison_pdf(results_files):
     """
@@ -593,7 +680,7 @@ def generate_comparison_pdf(results_files):
     click.echo(f"Generating comparison report...")
 
     if results_files is None:
-        results_files = helpers.list_files_in_directory('data/tested_models/')
+        results_files = results.list_results_files('data/tested_models/')
     else:
         results_files = helpers.split_string(results_files)
 
@@ -656,6 +743,71 @@ def generate_comparison_pdf(results_files):
     click.echo(f"An evaluation report for {results_files} is stored in '{results_file_path}' as '{results_file_name}'")
 
 
+@click.command()
+@click.argument('spec-file', type=click.Path(exists=True))
+@click.option('--n-workers', type=int, default=1, help="Number of processes that train and test models at the same "
+                                                      "time")
+@click.option('--max-deep-learning-jobs', type=click.IntRange(min=1), default=1,
+              help="Maximum number of deep learning models that are trained or tested at the same time")
+def run_experiments(spec_file, n_workers, max_deep_learning_jobs):
+    """
+    This command trains and tests every combination of the models, configurations and options in an experiment matrix
+    JSON file. The trained models and results are stored like with train_model and evaluate_model. Running the same
+    matrix again resumes the experiments that are not finished.
+    """
+    with open(spec_file) as f:
+        spec = json.load(f)
+
+    def get_prediction_horizon(config):
+        return ModelConfigurationManager(config).get_prediction_horizon()
+
+    try:
+        jobs = experiments.get_jobs(spec, get_prediction_horizon)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+
+    experiment_dir = experiments.EXPERIMENTS_DIR / Path(spec_file).stem
+    ledger_path = experiment_dir / experiments.LEDGER_FILE
+
+    def on_task_finished(job, phase, error):
+        if error is None:
+            click.echo(f"Finished {phase} of {job['id']}")
+        else:
+            click.echo(f"Failed {phase} of {job['id']}. See the log in {experiment_dir / 'logs'}.")
+
+    click.echo(f"Running {len(jobs)} experiments from {spec_file} with {n_workers} workers...")
+    ledger = experiments.run_experiments(jobs, ledger_path, n_workers=n_workers,
+                                         max_deep_learning_tasks=max_deep_learning_jobs,
+                                         log_dir=experiment_dir / 'logs', callback=on_task_finished)
+
+    finished = [job['id'] for job in jobs if ledger[job['id']]['status'] == experiments.DONE]
+    failed = [job['id'] for job in jobs if ledger[job['id']]['status'] == experiments.FAILED]
+    click.echo(f"{len(finished)} of {len(jobs)} experiments are finished. The status of each experiment is "
+               f"stored in {ledger_path}")
+    if failed:
+        click.echo(f"Failed experiments: {', '.join(failed)}. Run the command again to retry them.")
+
+
+@click.command()
+@click.option('--results-files', help='The name of the tested model results in the legacy CSV format to convert, '
+                                      'with ".csv". If None, all CSV results will be converted.')
+def convert_results(results_files):
+    """
+    This command converts tested model results in the legacy CSV format in data/tested_models/ to the array bundle
+    format.
+    """
+    tested_models_path = 'data/tested_models/'
+    if results_files is None:
+        results_files = [file for file in results.list_results_files(tested_models_path)
+                         if file.endswith(results.LEGACY_RESULTS_EXTENSION)]
+    else:
+        results_files = helpers.split_string(results_files)
+
+    for results_file in results_files:
+        output_file = results.convert_legacy_results_csv(tested_models_path + results_file)
+        click.echo(f"Converted {results_file} to {os.path.basename(output_file)}")
+
+
 @click.command()
 @click.option('--use-mgdl', type=bool, help='Set whether to use mg/dL or mmol/L', default=None)
 def set_unit(use_mgdl):
@@ -671,9 +823,11 @@ cli = click.Group(commands={
     'generate_config': generate_config,
     'train_model': train_model,
     'evaluate_model': evaluate_model,
+    'run_experiments': run_experiments,
     'draw_plots': draw_plots,
     'generate_evaluation_pdf': generate_evaluation_pdf,
     'generate_comparison_pdf': generate_comparison_pdf,
+    'convert_results': convert_results,
     'set_unit': set_unit,
 })
 
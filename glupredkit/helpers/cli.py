@@ -14,12 +14,51 @@ from pathlib import Path
 from ..models.base_model import BaseModel
 from ..metrics.base_metric import BaseMetric
 from ..helpers.model_config_manager import ModelConfigurationManager
+from ..helpers.dataset_store import get_dataset_path, is_dataset, read_dataset, write_dataset
+from ..helpers import preprocessing_cache
 
 
-def read_data_from_csv(input_path, file_name):
-    input_path = Path(input_path)
-    file_path = input_path / file_name
-    return pd.read_csv(file_path, index_col="date", parse_dates=True, low_memory=False)
+def read_data_from_csv(input_path, file_name, model_config_manager=None, is_test=None):
+    """
+    Reads a dataset from data/raw/. If the dataset has been stored as a partitioned dataset directory, that is read
+    instead of the CSV file.
+
+    Args:
+        input_path (str): The directory of the dataset.
+        file_name (str): The file name of the dataset.
+        model_config_manager (ModelConfigurationManager): If given, only the subjects and columns used by the
+            configuration are loaded.
+        is_test (bool): If given, only the test data (True) or the training data (False) is loaded.
+    """
+    columns, subject_ids = None, None
+    if model_config_manager is not None:
+        columns = get_config_columns(model_config_manager)
+        subject_ids = model_config_manager.get_subject_ids()
+
+    dataset_path = get_dataset_path(input_path, file_name)
+    if is_dataset(dataset_path):
+        return read_dataset(dataset_path, columns=columns, subject_ids=subject_ids, is_test=is_test)
+
+    file_path = Path(input_path) / file_name
+    usecols = None if columns is None else lambda col: col in columns or col == 'date'
+    df = pd.read_csv(file_path, index_col="date", parse_dates=True, low_memory=False, usecols=usecols)
+    if subject_ids:
+        df = df[df['id'].isin(subject_ids)]
+    if is_test is not None:
+        df = df[df['is_test'] == is_test]
+    return df
+
+
+def get_config_columns(model_config_manager):
+    """
+    Returns the raw data columns that are used by a model configuration.
+    """
+    columns = ['id', 'is_test']
+    for feature in (model_config_manager.get_num_features() + model_config_manager.get_cat_features() +
+                    model_config_manager.get_what_if_features()):
+        if feature not in columns:
+            columns += [feature]
+    return columns
 
 
 def store_data_as_csv(df, output_path, file_name):
@@ -27,6 +66,10 @@ def store_data_as_csv(df, output_path, file_name):
     df.to_csv(file_path)
 
 
+def store_data_as_dataset(df, output_path, file_name):
+    write_dataset(df, get_dataset_path(output_path, file_name))
+
+
 def split_string(input_string):
     return [] if not input_string else [elem.strip() for elem in input_string.split(',')]
 
@@ -167,6 +210,20 @@ def get_preprocessed_data(data, prediction_horizon: int, config_manager: ModelCo
     return train_data, test_data
 
 
+def get_processed_data_cache_key(config_manager: ModelConfigurationManager, process_data, **params):
+    """
+    Returns the key of the processed data of a model in the preprocessing cache.
+
+    Args:
+        config_manager (ModelConfigurationManager): The model configuration.
+        process_data (callable): The `process_data` method of the model.
+        **params: Other parameters that the processed data depends on, like the train or test split.
+    """
+    preprocessor_module = importlib.import_module(f'glupredkit.preprocessors.{config_manager.get_preprocessor()}')
+    return preprocessing_cache.get_cache_key("data/raw/", config_manager, get_preprocessed_data, preprocessor_module,
+                                             process_data, **params)
+
+
 def list_files_in_directory(directory_path):
     file_list = []
     for filename in os.listdir(directory_path):
@@ -205,6 +262,9 @@ def check_if_data_file_exists(ctx, param, file_name):
 
     # If it's not a relative path, construct the path using the data/raw/ directory
     data_folder = 'data/raw/'
+    if is_dataset(get_dataset_path(data_folder, file_name)):
+        return strip_extension(file_name)
+
     full_path = os.path.join(data_folder, file_name)
     if not os.path.isfile(full_path):
         raise ValueError(f"Data file '{file_name}' not found in '{data_folder}' folder. Ensure the file is in the "
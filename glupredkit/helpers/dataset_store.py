@@ -0,0 +1,182 @@
+"""
+Typed, subject-partitioned storage of parsed datasets in `data/raw/`.
+
+A dataset is stored as a directory with a `metadata.json` file and one `.npz` file per subject and train/test split,
+with one array per column. Measurements are stored as float32, `is_test` as bool, `id` and other text columns as
+categories, and the date index as nanoseconds with its timezone in the metadata. Reading a dataset only opens the
+partitions of the requested subjects and split, and only loads the requested columns from them.
+"""
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+DATASET_FORMAT_VERSION = 1
+METADATA_FILE = 'metadata.json'
+
+
+def get_dataset_path(input_path, file_name):
+    """
+    Returns the directory of the dataset with the given file name, with or without the `.csv` extension.
+    """
+    return Path(input_path) / os.path.splitext(file_name)[0]
+
+
+def is_dataset(path):
+    return (Path(path) / METADATA_FILE).is_file()
+
+
+def write_dataset(df, path):
+    """
+    Stores a parsed dataset, indexed by date, as a subject-partitioned dataset directory. An existing dataset in the
+    directory is replaced.
+
+    Args:
+        df (pd.DataFrame): The dataset, with an `id` column, and an `is_test` column unless it is not split yet.
+        path (str or Path): The dataset directory.
+    """
+    path = Path(path)
+    if is_dataset(path):
+        shutil.rmtree(path)
+    path.mkdir(parents=True, exist_ok=True)
+
+    try:
+        dates = pd.DatetimeIndex(df.index)
+    except (TypeError, ValueError):
+        # Dates with mixed UTC offsets, for example across daylight saving time changes
+        dates = pd.DatetimeIndex(pd.to_datetime(df.index, utc=True))
+    timezone = str(dates.tz) if dates.tz is not None else None
+    # Nanoseconds since the epoch in UTC, or in local time for dates without a timezone
+    timestamps = dates.as_unit('ns').asi8
+
+    columns = list(df.columns)
+    arrays = {}
+    dtypes = {}
+    categories = {}
+    for col in columns:
+        values = df[col]
+        if col == 'id' or not (pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values)):
+            codes, col_categories = get_category_codes(values)
+            arrays[col] = codes
+            dtypes[col] = 'category'
+            categories[col] = col_categories
+        elif pd.api.types.is_bool_dtype(values):
+            arrays[col] = values.to_numpy(dtype=bool)
+            dtypes[col] = 'bool'
+        elif pd.api.types.is_integer_dtype(values):
+            arrays[col] = values.to_numpy()
+            dtypes[col] = str(arrays[col].dtype)
+        else:
+            arrays[col] = values.to_numpy(dtype=np.float32)
+            dtypes[col] = 'float32'
+
+    # A stable sort by subject and split gives the rows of each partition in their original order
+    is_split = 'is_test' in arrays
+    partition_keys = arrays['id'].astype(np.int64) * 2 + (arrays['is_test'] if is_split else 0)
+    rows = np.argsort(partition_keys, kind='stable')
+    keys, starts = np.unique(partition_keys[rows], return_index=True)
+
+    partitions = []
+    for key, partition_rows in zip(keys, np.split(rows, starts[1:])):
+        subject_code = int(key // 2)
+        is_test = bool(key % 2) if is_split else None
+        split_name = {None: 'all', False: 'train', True: 'test'}[is_test]
+        file_name = f'subject_{subject_code}/{split_name}.npz'
+        (path / file_name).parent.mkdir(exist_ok=True)
+        np.savez(path / file_name, row=partition_rows, date=timestamps[partition_rows],
+                 **{col: array[partition_rows] for col, array in arrays.items() if col not in ('id', 'is_test')})
+        partitions += [{'subject': subject_code, 'is_test': is_test, 'file': file_name,
+                        'n_rows': len(partition_rows)}]
+
+    metadata = {
+        'format_version': DATASET_FORMAT_VERSION,
+        'index_name': df.index.name or 'date',
+        'index_unit': dates.unit,
+        'timezone': timezone,
+        'columns': columns,
+        'dtypes': dtypes,
+        'categories': categories,
+        'partitions': partitions,
+    }
+    with open(path / METADATA_FILE, 'w') as f:
+        json.dump(metadata, f, indent=2)
+
+
+def read_dataset(path, columns=None, subject_ids=None, is_test=None):
+    """
+    Reads a dataset directory written by `write_dataset`.
+
+    Args:
+        path (str or Path): The dataset directory.
+        columns (list): The columns to load. Columns that are not in the dataset are ignored. All columns are loaded
+            if None.
+        subject_ids (list): The subjects to load. All subjects are loaded if None or empty.
+        is_test (bool): Whether to load only the test data (True) or only the training data (False). Both are loaded if
+            None.
+
+    Returns:
+        pd.DataFrame: The dataset indexed by date, with the rows in the order they were written.
+    """
+    path = Path(path)
+    with open(path / METADATA_FILE) as f:
+        metadata = json.load(f)
+
+    if columns is None:
+        columns = metadata['columns']
+    else:
+        columns = [col for col in metadata['columns'] if col in columns]
+    stored_columns = [col for col in columns if col not in ('id', 'is_test')]
+
+    subject_categories = metadata['categories']['id']
+    partitions = metadata['partitions']
+    if subject_ids:
+        partitions = [partition for partition in partitions
+                      if partition['subject'] >= 0 and subject_categories[partition['subject']] in subject_ids]
+    if is_test is not None:
+        partitions = [partition for partition in partitions if partition['is_test'] in (None, is_test)]
+
+    arrays = {col: [] for col in ['row', 'date', 'id', 'is_test'] + stored_columns}
+    for partition in partitions:
+        with np.load(path / partition['file']) as bundle:
+            for col in ['row', 'date'] + stored_columns:
+                arrays[col] += [bundle[col]]
+        arrays['id'] += [np.full(partition['n_rows'], partition['subject'], dtype=np.int32)]
+        arrays['is_test'] += [np.full(partition['n_rows'], bool(partition['is_test']))]
+
+    order = np.argsort(concatenate(arrays['row'], np.int64), kind='stable')
+    data = {}
+    for col in columns:
+        dtype = metadata['dtypes'][col]
+        values = concatenate(arrays[col], np.int32 if dtype == 'category' else dtype)[order]
+        if dtype == 'category':
+            values = pd.Categorical.from_codes(values, categories=metadata['categories'][col])
+            values = values.remove_unused_categories()
+        data[col] = values
+
+    index = pd.DatetimeIndex(concatenate(arrays['date'], np.int64)[order].view('datetime64[ns]'),
+                             name=metadata['index_name'])
+    index = index.as_unit(metadata['index_unit'])
+    if metadata['timezone'] is not None:
+        index = index.tz_localize('UTC').tz_convert(metadata['timezone'])
+    return pd.DataFrame(data, index=index, columns=columns)
+
+
+def get_category_codes(values):
+    """
+    Returns the integer codes and the categories of a column, where missing values have the code -1. Categories that
+    are all numbers are stored as numbers, like they would have been read from a CSV file.
+    """
+    codes, categories = pd.factorize(values, sort=True)
+    categories = pd.Index(categories)
+    numeric_categories = pd.to_numeric(categories.astype(str), errors='coerce')
+    if not categories.empty and not numeric_categories.isna().any() and numeric_categories.is_unique:
+        categories = numeric_categories
+        if (categories == categories.round()).all():
+            categories = categories.astype(np.int64)
+    return codes.astype(np.int32), [value.item() if isinstance(value, np.generic) else value for value in categories]
+
+
+def concatenate(arrays, dtype):
+    return np.concatenate(arrays).astype(dtype, copy=False) if arrays else np.empty(0, dtype=dtype)
@@ -0,0 +1,269 @@
+"""
+Running a matrix of experiments, where each cell trains and evaluates a model on a configuration.
+
+The cells are run as train and evaluate tasks on a pool of worker processes, which are reused between tasks, so that
+heavy libraries like TensorFlow are only imported once per worker. The number of deep learning tasks that run at the
+same time is limited, and every worker limits the threads of numerical libraries to its share of the CPUs, so that the
+tasks do not oversubscribe the machine. The state of every cell is stored in a ledger file after every task, so that
+an interrupted study is resumed by running it again, which only runs the tasks that are not finished.
+"""
+import contextlib
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+
+DEEP_LEARNING_MODELS = ['double_lstm', 'lstm', 'mtl', 'stacked_plsr', 'stl', 'tcn']
+TRAIN, EVALUATE = 'train', 'evaluate'
+PENDING, TRAINED, DONE, FAILED = 'pending', 'trained', 'done', 'failed'
+EXPERIMENTS_DIR = Path('data') / 'experiments'
+LEDGER_FILE = 'ledger.json'
+
+
+def get_jobs(spec, get_prediction_horizon):
+    """
+    Returns the cells of an experiment matrix.
+
+    Args:
+        spec (dict): The experiment matrix, with the keys:
+            - models (list): The names of the pre-defined models.
+            - configs (list): The names of the configurations.
+            - options (list): Optional sets of `train_model` options, like {"epochs": 10}. Each set is a column of the
+              matrix. An option set may have a `model_name`, where "{model}" is replaced by the model. Default is one
+              empty set.
+            - evaluate_options (dict): Optional `evaluate_model` options for all cells, like {"max_samples": 1000}.
+        get_prediction_horizon (callable): Returns the prediction horizon of a configuration name.
+
+    Returns:
+        list: The cells as dicts with the id, model, model name, configuration, prediction horizon and options. The id is
+        the file name of the trained model without extension, like "ridge__my_config__60".
+    """
+    option_sets = spec.get('options') or [{}]
+    jobs = []
+    for config in spec['configs']:
+        prediction_horizon = get_prediction_horizon(config)
+        for model in spec['models']:
+            for options in option_sets:
+                options = dict(options)
+                model_name = options.pop('model_name', '{model}').format(model=model)
+                jobs += [{
+                    'id': f'{model_name}__{config}__{prediction_horizon}',
+                    'model': model,
+                    'model_name': model_name,
+                    'config': config,
+                    'prediction_horizon': prediction_horizon,
+                    'train_options': options,
+                    'evaluate_options': dict(spec.get('evaluate_options', {})),
+                }]
+
+    job_ids = [job['id'] for job in jobs]
+    duplicates = sorted({job_id for job_id in job_ids if job_ids.count(job_id) > 1})
+    if duplicates:
+        raise ValueError(f"The experiment matrix has several cells with the same output files: "
+                         f"{', '.join(duplicates)}. Please give each option set a distinct model_name, like "
+                         f"\"{{model}}_10_epochs\".")
+    return jobs
+
+
+def get_options_args(options):
+    """
+    Returns command line arguments for a dict of options, where True is a flag and False or None is left out.
+    """
+    args = []
+    for key, value in options.items():
+        option = '--' + key.replace('_', '-')
+        if value is True:
+            args += [option]
+        elif value is not False and value is not None:
+            args += [option, str(value)]
+    return args
+
+
+def run_task(job, phase, log_dir=None):
+    """
+    Runs the train or evaluate task of a cell with the `train_model` or `evaluate_model` command, and writes its output
+    to a log file in log_dir, if given. Raises an exception if the command fails.
+    """
+    # Imported here because the command line interface imports this module
+    from glupredkit.cli import train_model, evaluate_model
+
+    if phase == TRAIN:
+        command = train_model
+        args = [job['config'], '--model', job['model'], '--model-name', job['model_name']]
+        args += get_options_args(job['train_options'])
+    else:
+        command = evaluate_model
+        args = [job['id'] + '.pkl'] + get_options_args(job['evaluate_options'])
+
+    if log_dir is None:
+        command.main(args, standalone_mode=False)
+        return
+
+    Path(log_dir).mkdir(parents=True, exist_ok=True)
+    with open(Path(log_dir) / f"{job['id']}__{phase}.log", 'w') as f:
+        with contextlib.redirect_stdout(f), contextlib.redirect_stderr(f):
+            command.main(args, standalone_mode=False)
+
+
+def _init_worker(n_threads):
+    # TensorFlow reads these when it is imported, which happens in the worker with the first deep learning task
+    for variable in ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'TF_NUM_INTRAOP_THREADS']:
+        os.environ[variable] = str(n_threads)
+    os.environ['TF_NUM_INTEROP_THREADS'] = '1'
+
+    # Libraries that are already loaded, like numpy in a forked worker, are limited at runtime
+    from threadpoolctl import threadpool_limits
+    threadpool_limits(n_threads)
+
+
+def _run_task(run, job, phase, log_dir):
+    # Exceptions are returned as text, because the exceptions of some libraries can not be pickled
+    start_time = time.time()
+    try:
+        run(job, phase, log_dir)
+        return None, time.time() - start_time
+    except Exception:
+        return traceback.format_exc(), time.time() - start_time
+
+
+def load_ledger(ledger_path):
+    if os.path.exists(ledger_path):
+        with open(ledger_path) as f:
+            return json.load(f)
+    return {}
+
+
+def store_ledger(ledger, ledger_path):
+    # Writing to a temporary file first, so that an interrupted run never leaves a corrupt ledger
+    Path(ledger_path).parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = str(ledger_path) + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(ledger, f, indent=2)
+    os.replace(tmp_path, ledger_path)
+
+
+def get_unfinished_phases(job, entry, is_output_stored):
+    """
+    Returns the tasks that remain for a cell, given its ledger entry. A cell is run again from the start if its options
+    have changed, and its tasks are run again if their output files have been removed.
+    """
+    if not entry or entry.get('train_options') != job['train_options']:
+        return [TRAIN, EVALUATE]
+    is_trained = entry['status'] in (TRAINED, DONE) or entry.get('failed_phase') == EVALUATE
+    if is_trained and is_output_stored(job, TRAIN):
+        if (entry['status'] == DONE and entry.get('evaluate_options') == job['evaluate_options'] and
+                is_output_stored(job, EVALUATE)):
+            return []
+        return [EVALUATE]
+    return [TRAIN, EVALUATE]
+
+
+def is_output_stored(job, phase):
+    """
+    Returns whether the output file of a task exists, with the naming convention of `train_model` and
+    `evaluate_model`.
+    """
+    if phase == TRAIN:
+        return (Path('data') / 'trained_models' / f"{job['id']}.pkl").exists()
+    return (Path('data') / 'tested_models' / f"{job['id']}.npz").exists()
+
+
+def run_experiments(jobs, ledger_path, n_workers=1, max_deep_learning_tasks=1, log_dir=None, run=run_task,
+                    is_output_stored=is_output_stored, callback=None):
+    """
+    Runs the unfinished cells of an experiment matrix, and returns the ledger.
+
+    Args:
+        jobs (list): The cells from `get_jobs`.
+        ledger_path (str or Path): The ledger file, which is read to resume a study and updated after every task.
+        n_workers (int): Number of worker processes. With one worker, the tasks are run in this process.
+        max_deep_learning_tasks (int): The maximum number of tasks of deep learning models that run at the same time.
+        log_dir (str or Path): The directory of the log files of the tasks. The output is not redirected if None.
+        run (callable): Picklable function called as run(job, phase, log_dir), that raises an exception if the task
+            fails.
+        is_output_stored (callable): Returns whether the output file of a task exists.
+        callback (callable): Optional function called as callback(job, phase, error) after each task, where error is
+            None if the task succeeded.
+
+    Returns:
+        dict: The ledger, with the status, options, durations and error of each cell by id.
+    """
+    if max_deep_learning_tasks < 1:
+        # The tasks of the deep learning models would never be run
+        raise ValueError(f"max_deep_learning_tasks must be at least 1, got {max_deep_learning_tasks}.")
+    ledger = load_ledger(ledger_path)
+    remaining = {}
+    for job in jobs:
+        phases = get_unfinished_phases(job, ledger.get(job['id']), is_output_stored)
+        if phases:
+            remaining[job['id']] = phases
+            entry = {'status': PENDING, 'model': job['model'], 'config': job['config'],
+                     'train_options': job['train_options'], 'evaluate_options': job['evaluate_options'],
+                     'durations': {}, 'failed_phase': None, 'error': None}
+            if phases == [EVALUATE]:
+                entry['status'] = TRAINED
+                entry['durations'] = ledger[job['id']].get('durations', {})
+            ledger[job['id']] = entry
+    store_ledger(ledger, ledger_path)
+
+    jobs_by_id = {job['id']: job for job in jobs}
+    # Each task of a cell is queued when the previous one has finished
+    queue = [(job_id, phases[0]) for job_id, phases in remaining.items()]
+    running_deep_learning_tasks = 0
+
+    def is_deep_learning(job_id):
+        return jobs_by_id[job_id]['model'] in DEEP_LEARNING_MODELS
+
+    def pop_next_task():
+        for index, (job_id, phase) in enumerate(queue):
+            if not is_deep_learning(job_id) or running_deep_learning_tasks < max_deep_learning_tasks:
+                return queue.pop(index)
+        return None
+
+    def finish_task(job_id, phase, error, duration):
+        entry = ledger[job_id]
+        entry['durations'][phase] = round(duration, 3)
+        if error is None:
+            entry['status'] = TRAINED if phase == TRAIN else DONE
+            if phase == TRAIN:
+                queue.append((job_id, EVALUATE))
+        else:
+            entry['status'] = FAILED
+            entry['failed_phase'] = phase
+            entry['error'] = error
+        store_ledger(ledger, ledger_path)
+        if callback:
+            callback(jobs_by_id[job_id], phase, error)
+
+    if n_workers is None or n_workers <= 1:
+        while queue:
+            job_id, phase = queue.pop(0)
+            finish_task(job_id, phase, *_run_task(run, jobs_by_id[job_id], phase, log_dir))
+        return ledger
+
+    n_threads = max(1, (os.cpu_count() or 1) // n_workers)
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker, initargs=(n_threads,)) as executor:
+        pending = {}
+
+        def submit_next():
+            nonlocal running_deep_learning_tasks
+            while len(pending) < n_workers:
+                task = pop_next_task()
+                if task is None:
+                    return
+                job_id, phase = task
+                running_deep_learning_tasks += is_deep_learning(job_id)
+                pending[executor.submit(_run_task, run, jobs_by_id[job_id], phase, log_dir)] = task
+
+        submit_next()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                job_id, phase = pending.pop(future)
+                running_deep_learning_tasks -= is_deep_learning(job_id)
+                finish_task(job_id, phase, *future.result())
+            submit_next()
+
+    return ledger
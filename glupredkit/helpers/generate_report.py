@@ -2,11 +2,11 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.colors as mcolors
 import numpy as np
-import ast
 from reportlab.lib.pagesizes import letter
 from reportlab.platypus import Table, TableStyle
 from reportlab.lib import colors
 from glupredkit.helpers.unit_config_manager import unit_config_manager
+from glupredkit.helpers.results import load_results
 from io import BytesIO
 from reportlab.graphics import renderPDF
 from svglib.svglib import svg2rlg
@@ -15,7 +15,7 @@ import seaborn as sns
 
 def get_df_from_results_file(file_name):
     file_path = 'data/tested_models/' + file_name
-    return pd.read_csv(file_path)
+    return load_results(file_path)
 
 
 def generate_single_model_front_page(canvas, df):
@@ -222,12 +222,8 @@ def draw_model_comparison_predicted_distribution_table(c, dfs, y_placement):
         models += [df['Model Name'][0]]
         std_result_values = []
         for ph in prediction_horizons:
-            y_test = df[f'target_{ph}'][0].replace('nan', 'None')
-            y_pred = df[f'y_pred_{ph}'][0].replace('nan', 'None')
-            y_test = ast.literal_eval(y_test)
-            y_test = [np.nan if val is None else val for val in y_test]
-            y_pred = ast.literal_eval(y_pred)
-            y_pred = [np.nan if val is None else val for val in y_pred]
+            y_test = df[f'target_{ph}'][0]
+            y_pred = df[f'y_pred_{ph}'][0]
             result = np.nanstd(y_pred) / np.nanstd(y_test) * 100
             std_result_values += [result]
         result_list += [np.mean(std_result_values)]
@@ -271,19 +267,8 @@ def draw_overall_ranking_table(c, dfs, y_placement):
         seg_list += [np.mean([df[f'parkes_error_grid_exp_{ph}'][0] for ph in prediction_horizons])]
         mcc_list += [np.mean([(df[f'mcc_hypo_{ph}'][0] + df[f'mcc_hyper_{ph}'][0]) / 2 for ph in prediction_horizons])]
 
-        y_test = [ast.literal_eval(df[f'target_{ph}'][0].replace('nan', 'None')) for ph in prediction_horizons]
-        y_test = [
-            [np.nan if x is None else x for x in sublist] for sublist in y_test
-        ]
-        y_test_std = [np.nanstd(y_vals) for y_vals in y_test]
-
-        y_pred_std = []
-        for ph in prediction_horizons:
-            y_pred = df[f'y_pred_{ph}'][0].replace("nan", "None")
-            y_pred = ast.literal_eval(y_pred)
-            y_pred = [np.nan if val is None else val for val in y_pred]
-            result = np.nanstd(y_pred)
-            y_pred_std += [result]
+        y_test_std = [np.nanstd(df[f'target_{ph}'][0]) for ph in prediction_horizons]
+        y_pred_std = [np.nanstd(df[f'y_pred_{ph}'][0]) for ph in prediction_horizons]
 
         relative_std = np.abs(np.mean(y_pred_std) / np.mean(y_test_std) * 100 - 100)
         std_list += [relative_std]
@@ -334,7 +319,6 @@ def draw_error_grid_table(c, df):
     for ph in range(table_interval, int(df['prediction_horizon'][0]) + 1, table_interval):
         new_row = [str(ph)]
         current_data = df[f'parkes_error_grid_{ph}'][0]
-        current_data = ast.literal_eval(current_data)
         for i in range(5):
             new_row += [current_data[i]]
         table_data += [new_row]
@@ -382,8 +366,7 @@ def draw_physiological_alignment_table(c, df, feature, y_placement):
     ]
 
     prediction_horizon = get_ph(df)
-    partial_dependencies_str = df['partial_dependencies'][0]
-    partial_dependencies_dict = ast.literal_eval(partial_dependencies_str)
+    partial_dependencies_dict = df['partial_dependencies'][0]
 
     # Add column time lags to a list
     time_lags = []
@@ -466,8 +449,6 @@ def draw_physiological_alignment_single_dimension_table(c, df, feature, y_placem
 
         for column in columns:
             y_pred = df[column][0]
-            y_pred = y_pred.replace("nan", "None")
-            y_pred = ast.literal_eval(y_pred)
             quantities += [float(column.split('_')[-1])]
             pd_numbers += [y_pred]
 
@@ -678,7 +659,6 @@ def plot_partial_dependencies_across_prediction_horizons(c, df, col, height=2, y
             else:
                 label = f'{quantity}U of insulin'
             y_pred = df[column][0]
-            y_pred = ast.literal_eval(y_pred)
             plt.plot(x_values, y_pred, marker='o', label=label)
 
         # Setting the title and labels with placeholders for the metric unit
@@ -708,12 +688,8 @@ def plot_predicted_dristribution_across_prediction_horizons(c, dfs, height=2, y_
         x_values = list(range(5, get_ph(df) + 1, 5))
         y_values = []
         for ph in x_values:
-            y_test = df[f'target_{ph}'][0].replace("nan", "None")
-            y_pred = df[f'y_pred_{ph}'][0].replace("nan", "None")
-            y_test = ast.literal_eval(y_test)
-            y_test = [np.nan if x is None else x for x in y_test]
-            y_pred = ast.literal_eval(y_pred)
-            y_pred = [np.nan if x is None else x for x in y_pred]
+            y_test = df[f'target_{ph}'][0]
+            y_pred = df[f'y_pred_{ph}'][0]
             y_values += [np.nanstd(y_pred) / np.nanstd(y_test) * 100]
         plt.plot(x_values, y_values, marker='o', label=model_name)
 
@@ -737,11 +713,8 @@ def plot_predicted_dristribution_across_prediction_horizons(c, dfs, height=2, y_
 def draw_scatter_plot(c, df, ph, x_placement, y_placement):
     fig = plt.figure(figsize=(2, 2))
 
-    y_test = df[f'target_{ph}'][0].replace('nan', 'None')
-    y_pred = df[f'y_pred_{ph}'][0].replace('nan', 'None')
-
-    y_test = ast.literal_eval(y_test)
-    y_pred = ast.literal_eval(y_pred)
+    y_test = df[f'target_{ph}'][0]
+    y_pred = df[f'y_pred_{ph}'][0]
 
     plt.scatter(y_test, y_pred, alpha=0.5)
 
@@ -779,12 +752,8 @@ def plot_predicted_distribution(c, df, x_placement, y_placement):
     y_test_std = []
 
     for ph in x_values:
-        y_test = df[f'target_{ph}'][0].replace("nan", "None")
-        y_pred = df[f'y_pred_{ph}'][0].replace("nan", "None")
-        y_test = ast.literal_eval(y_test)
-        y_test = [np.nan if x is None else x for x in y_test]
-        y_pred = ast.literal_eval(y_pred)
-        y_pred = [np.nan if x is None else x for x in y_pred]
+        y_test = df[f'target_{ph}'][0]
+        y_pred = df[f'y_pred_{ph}'][0]
         y_pred_std += [np.nanstd(y_pred)]
         y_test_std += [np.nanstd(y_test)]
 
@@ -809,7 +778,6 @@ def plot_predicted_distribution(c, df, x_placement, y_placement):
 
 def plot_confusion_matrix(c, df, classes, ph, x_placement, y_placement, cmap=plt.cm.Blues):
     percentages = df[f'glycemia_detection_{ph}'][0]
-    percentages = ast.literal_eval(percentages)
 
     fig = plt.figure(figsize=(3, 2.5))
     sns.heatmap(percentages, annot=True, cmap=cmap, fmt='.2%', xticklabels=classes, yticklabels=classes)
@@ -830,8 +798,7 @@ def plot_confusion_matrix(c, df, classes, ph, x_placement, y_placement, cmap=plt
 
 def plot_partial_dependency_heatmap(c, df, feature, x_placement, y_placement, title):
     prediction_horizon = get_ph(df)
-    partial_dependencies_str = df['partial_dependencies'][0]
-    partial_dependencies_dict = ast.literal_eval(partial_dependencies_str)
+    partial_dependencies_dict = df['partial_dependencies'][0]
 
     # Define custom colormap
     colors = [(1, 0, 0), (1, 1, 1), (0, 1, 0)]  # Red, White, Green
@@ -0,0 +1,86 @@
+"""
+Parallel grid search over candidate settings, used by the models that tune their parameters by simulation instead of
+by gradient-based training, such as the therapy settings of the Loop models.
+"""
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+# The evaluation function of the current worker process, set once per process so that the data it holds is only
+# transferred to each worker once, instead of once per candidate
+_evaluate = None
+
+
+def _set_evaluate(evaluate):
+    global _evaluate
+    _evaluate = evaluate
+
+
+def _run_evaluate(group, candidate, max_score):
+    return _evaluate(group, candidate, max_score)
+
+
+def grid_search(evaluate, candidates, n_workers=1, early_abandon=False, callback=None):
+    """
+    Evaluates candidate settings for groups of data, like subjects, and returns the best candidate for each group.
+
+    Args:
+        evaluate (callable): Picklable function called as evaluate(group, candidate, max_score), returning the score of
+            the candidate for the group, where lower is better. max_score is np.inf, unless early_abandon is enabled.
+        candidates (dict): The list of candidates to evaluate for each group.
+        n_workers (int): Number of worker processes. With one worker, the candidates are evaluated in this process.
+        early_abandon (bool): Whether to pass the best score of the group so far as max_score, so that evaluate can
+            stop and return np.inf as soon as the score of a candidate is known to be higher.
+        callback (callable): Optional function called as callback(group, candidate, score) after each evaluation.
+
+    Returns:
+        dict: The best candidate and its score for each group, or (None, np.inf) if no candidate has a finite score.
+        In ties, the first candidate in the list is chosen, so the result is the same as an exhaustive sequential
+        search regardless of the number of workers and of early abandoning.
+    """
+    tasks = [(group, index) for group, group_candidates in candidates.items() for index in range(len(group_candidates))]
+    scores = {group: [np.inf] * len(group_candidates) for group, group_candidates in candidates.items()}
+    best_scores = {group: np.inf for group in candidates}
+
+    def get_max_score(group):
+        return best_scores[group] if early_abandon else np.inf
+
+    def add_score(group, index, score):
+        scores[group][index] = score
+        if score < best_scores[group]:
+            best_scores[group] = score
+        if callback:
+            callback(group, candidates[group][index], score)
+
+    if n_workers is None or n_workers <= 1:
+        for group, index in tasks:
+            add_score(group, index, evaluate(group, candidates[group][index], get_max_score(group)))
+    else:
+        # Candidates are submitted as workers become available, so that each one gets the latest best score
+        tasks = iter(tasks)
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_set_evaluate, initargs=(evaluate,)) as executor:
+            def submit_next():
+                task = next(tasks, None)
+                if task is not None:
+                    group, index = task
+                    future = executor.submit(_run_evaluate, group, candidates[group][index], get_max_score(group))
+                    pending[future] = task
+
+            pending = {}
+            for _ in range(n_workers):
+                submit_next()
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    group, index = pending.pop(future)
+                    add_score(group, index, future.result())
+                    submit_next()
+
+    results = {}
+    for group, group_candidates in candidates.items():
+        best_candidate, best_score = None, np.inf
+        for candidate, score in zip(group_candidates, scores[group]):
+            if score < best_score:
+                best_candidate, best_score = candidate, score
+        results[group] = (best_candidate, best_score)
+    return results
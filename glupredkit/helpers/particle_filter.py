@@ -0,0 +1,250 @@
+"""
+Particle filter of the UvA/Padova glucose-insulin model, where every step is computed for all particles at once.
+
+The state of a particle is (Qsto1, Qsto2, Qgut, Isc1, Isc2, Ip, X, G, IG). `gi_state_function_continuous` gives the
+derivatives of the states of all particles, which `gi_particle_filter_state_function` integrates with one Euler step and
+Gaussian process noise. The interstitial glucose IG of each particle is weighted by its likelihood of the measured CGM
+value in `ParticleFilter.correct`, and the particles are resampled by their weights.
+"""
+import numpy as np
+from scipy.stats import norm
+
+
+def gi_measurement_likelihood_function(predicted_measurement, measurement, sigma_v):
+    # The measurement is the ninth state. predicted_measurement holds the measurement hypotheses of all particles
+    # Calculate the likelihood of each predicted measurement
+    likelihood = norm.pdf(predicted_measurement, measurement, sigma_v)
+
+    return likelihood
+
+
+def gi_particle_filter_state_function(particles, CHO, INS, time, sigma_u, mP, rng=None):
+    numberOfParticles, numberOfStates = particles.shape
+    if rng is None:
+        rng = np.random.default_rng()
+
+    # Time-propagate all particles at once using Euler integration
+    dt = mP.TS  # Sample time
+    particles += gi_state_function_continuous(particles, CHO, INS, time, mP) * dt
+
+    # Add Gaussian noise with specified variance processNoise
+    particles += rng.standard_normal((numberOfParticles, numberOfStates)) * sigma_u
+
+    return particles
+
+
+def gi_state_function_continuous(x, CHO, INS, time, mP):
+    # x is either one state of shape (9,) or the states of all particles with shape (particles, 9)
+    dxdt = np.empty_like(x)
+    Qsto1, Qsto2, Qgut, Isc1, Isc2, Ip, X, G, IG = np.moveaxis(x, -1, 0)
+
+    # Compute the basal plasmatic insulin
+    Ipb = (mP.ka1 / mP.ke) * (mP.u2ss) / (mP.ka1 + mP.kd) + (mP.ka2 / mP.ke) * (mP.kd / mP.ka2) * (mP.u2ss) / (
+            mP.ka1 + mP.kd)
+
+    # Calculate state derivatives
+    if time < 4 or time >= 17:
+        SI = mP.SI_D
+        kabs = mP.kabs_D
+    elif 4 <= time < 11:
+        SI = mP.SI_B
+        kabs = mP.kabs_B
+    else:
+        SI = mP.SI_L
+        kabs = mP.kabs_L
+
+    risk = compute_hypoglycemic_risk(G, mP)
+
+    rhoRisk = 1 + risk
+    Ra = mP.f * kabs * Qgut
+    dxdt[..., 0] = -mP.kgri * Qsto1 + CHO
+    dxdt[..., 1] = mP.kgri * Qsto1 - mP.kempt * Qsto2
+    dxdt[..., 2] = mP.kempt * Qsto2 - kabs * Qgut
+    dxdt[..., 3] = -mP.kd * Isc1 + INS
+    dxdt[..., 4] = mP.kd * Isc1 - mP.ka2 * Isc2
+    dxdt[..., 5] = mP.ka2 * Isc2 - mP.ke * Ip
+    dxdt[..., 6] = -mP.p2 * (X - (SI / mP.VI) * (Ip - Ipb))
+    dxdt[..., 7] = -((mP.SG + rhoRisk * X) * G) + mP.SG * mP.Gb + Ra / mP.VG
+    dxdt[..., 8] = -(1 / mP.alpha) * (IG - G)
+
+    return dxdt
+
+
+def compute_hypoglycemic_risk(G, mP):
+    # Function to compute hypoglycemic risk as described in Visentin et al., JDST, 2018.
+    # G can be a single glucose value or an array with the glucose of all particles.
+
+    # Setting the risk model threshold
+    Gth = 60
+
+    # For all values below the risk model threshold, the hypoglycemic risk will be the same.
+    # This redefinition of G avoid some output errors.
+    G = np.where(G < Gth, Gth - 1, G)
+
+    # Compute the risk
+    Gb = mP.Gb
+    risk = (10 * (np.log(G) ** mP.r2 - np.log(Gb) ** mP.r2) ** 2 * ((G < Gb) & (G >= Gth)) +
+            10 * (np.log(Gth) ** mP.r2 - np.log(Gb) ** mP.r2) ** 2 * (G < Gth))
+
+    return np.abs(risk)
+
+
+class ParticleFilter:
+    def __init__(self, state_transition_fn, measurement_fn, num_particles, x0, sigma0, seed=None):
+        # Forecasts get their own random stream, so that forking does not change the filter itself
+        seed_sequence, forecast_seed_sequence = np.random.SeedSequence(seed).spawn(2)
+        rng = np.random.default_rng(seed_sequence)
+
+        # Set state bounds
+        lower_bound = np.array(x0) - 0.03 * np.array(x0)  # Lower bound
+        upper_bound = np.array(x0) + 0.03 * np.array(x0)  # Upper bound
+
+        # Initialize particles uniformly within the bounds
+        particles = rng.uniform(low=lower_bound, high=upper_bound, size=(num_particles, len(x0)))
+        self._init_state(state_transition_fn, measurement_fn, particles, rng,
+                         np.random.default_rng(forecast_seed_sequence))
+        self.weights *= 1000
+
+    def _init_state(self, state_transition_fn, measurement_fn, particles, rng, forecast_rng):
+        self.num_particles = len(particles)
+        self.particles = particles
+        self.weights = np.ones(self.num_particles) / self.num_particles
+        self.state_transition_fn = state_transition_fn  # gi_particle_filter_state_function
+        self.measurement_fn = measurement_fn  # gi_measurement_likelihood_function
+        self.rng = rng
+        self.forecast_rng = forecast_rng
+        self.forecast = None
+
+    @classmethod
+    def _from_particles(cls, state_transition_fn, measurement_fn, particles, rng):
+        """
+        Returns a particle filter with the given particles, which draws its predictions and its own forks from `rng`.
+        Used by `fork`, where the fork shares the forecast stream of its parent.
+        """
+        pf = cls.__new__(cls)
+        pf._init_state(state_transition_fn, measurement_fn, particles, rng, rng)
+        return pf
+
+    def predict(self, carbs, insulin, time, sigma_u, model_parameters):
+        """Predict the next state of the particles."""
+
+        self.particles = self.state_transition_fn(self.particles, carbs, insulin, time, sigma_u, model_parameters,
+                                                  self.rng)
+
+        # Calculate the mean of the particles
+        mean_state = np.mean(self.particles, axis=0)
+
+        # Calculate the covariance matrix of the particles
+        cov_state = np.cov(self.particles, rowvar=False)  # rowvar=False to treat rows as variables
+
+        return mean_state, cov_state
+
+    def correct(self, measurement, sigma_v):
+        """
+        Correct/update the particle weights based on the measurement, and resample.
+
+        Parameters:
+            measurement (float): The new measurement.
+            sigma_v (float): Measurement noise standard deviation.
+
+        Returns:
+            tuple: Corrected state estimate and its covariance.
+        """
+        # Update weights based on the measurement likelihood of the interstitial glucose of all particles
+        self.weights *= self.measurement_fn(self.particles[:, 8], measurement, sigma_v)
+
+        # Normalize weights
+        self.weights += 1.e-300  # avoid division by zero
+        self.weights /= np.sum(self.weights)
+
+        # Resample particles to avoid degeneracy
+        indexes = self.resample_particles()
+        self.particles = self.particles[indexes]
+        self.weights = np.ones(self.num_particles) / self.num_particles  # Reset weights after resampling
+
+        # Calculate the new state estimate and covariance
+        mean_state = np.mean(self.particles, axis=0)
+        cov_state = np.cov(self.particles, rowvar=False)
+
+        return mean_state, cov_state
+
+    def fork(self, num_particles=None):
+        """
+        Returns a particle filter starting from the current particles, to predict ahead without changing this filter.
+
+        The forked filter and its particle buffer are allocated once and reused by every fork, so a fork is only valid
+        until the next call to fork.
+
+        Parameters:
+            num_particles (int): Number of particles of the fork, subsampled from the current particles. Default is
+                all particles.
+
+        Returns:
+            ParticleFilter: The forked particle filter.
+        """
+        if num_particles is None or num_particles > self.num_particles:
+            num_particles = self.num_particles
+
+        if self.forecast is None or self.forecast.num_particles != num_particles:
+            self.forecast = ParticleFilter._from_particles(self.state_transition_fn, self.measurement_fn,
+                                                           np.empty((num_particles, self.particles.shape[1])),
+                                                           self.forecast_rng)
+
+        if num_particles == self.num_particles:
+            np.copyto(self.forecast.particles, self.particles)
+        else:
+            # The weights are uniform after each correction, so a uniform subsample represents the same distribution
+            indexes = self.forecast_rng.choice(self.num_particles, size=num_particles, replace=False)
+            np.take(self.particles, indexes, axis=0, out=self.forecast.particles)
+
+        return self.forecast
+
+    def resample_particles(self):
+        """Resample particles proportionally to their weight."""
+        cumulative_sum = np.cumsum(self.weights)
+        cumulative_sum[-1] = 1.0  # ensure sum is exactly one
+        return np.searchsorted(cumulative_sum, self.rng.random(self.num_particles))
+
+
+class FrozenModelParameters:
+    """
+    Read-only copy of the model parameters.
+    """
+    def __init__(self, model_parameters):
+        self.__dict__.update(vars(model_parameters))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"Cannot set {name}, the model parameters are read-only")
+
+
+class MockModelParameters:
+    def __init__(self):
+        self.bw = 100
+        self.beta_B = 1.9210921467522486
+        self.beta_L = 7.227110102827593
+        self.beta_D = 22.740130507858265
+        self.beta = (self.beta_B + self.beta_L + self.beta_D) / 3
+        self.tau = 8
+        self.u2ss = 0.1291666666666666
+        self.ka1 = 0.0034
+        self.ka2 = 0.0004536788602030393
+        self.kd = 0.09433329008933948
+        self.kabs_D = 0.02161163589225169
+        self.kabs_B = 0.020427660145477033
+        self.kabs_L = 0.0012429702583311433
+        self.Xpb = 0.0
+        self.SI_D = 0.0007412325384855292
+        self.SI_B = 0.0007072567151272324
+        self.SI_L = 0.0007701611742637199
+        self.Gb = 140.98122622460085
+        self.r2 = 0.8124
+        self.ke = 0.127
+        self.kgri = 0.28500571715267026
+        self.kempt = 0.28500571715267026
+        self.f = 0.9
+        self.p2 = 0.012
+        self.VI = 0.126
+        self.SG = 0.018425998653797095
+        self.VG = 1.45
+        self.alpha = 7
+        self.TS = None
@@ -0,0 +1,91 @@
+"""
+Selection of the number of components of a partial least squares regression from one run of the NIPALS algorithm.
+
+The components of NIPALS do not depend on how many components are extracted, so a regression with k components uses
+the first k components of a run to the maximum number. The predictions of each number of components are therefore the
+cumulative sums of the contributions of the components, which are scored on a validation set while the components are
+extracted. Each component needs the x-rotation r_k = w_k - sum_{j<k} r_j (p_j^T w_k), which maps the centered and
+scaled inputs to the scores of the component, like the columns of `PLSRegression.x_rotations_`.
+"""
+import numpy as np
+
+
+def _center_scale(values, mean=None, std=None):
+    if mean is None:
+        mean = values.mean(axis=0)
+        std = values.std(axis=0, ddof=1)
+        std[std == 0.0] = 1.0
+    return (values - mean) / std, mean, std
+
+
+def get_pls_components(x_train, y_train, x_validation, y_validation, max_components=None, patience=None,
+                       tol=1e-3):
+    """
+    Returns the number of components of a partial least squares regression that minimizes the root mean squared error
+    on the validation set. The regression is like `sklearn.cross_decomposition.PLSRegression(scale=True)`.
+
+    Args:
+        x_train (np.ndarray): Training inputs of shape (samples, features).
+        y_train (np.ndarray): Training targets of shape (samples,) or (samples, outputs).
+        x_validation (np.ndarray): Validation inputs of shape (samples, features).
+        y_validation (np.ndarray): Validation targets of shape (samples,) or (samples, outputs).
+        max_components (int): The maximum number of components. Default is the number of features.
+        patience (int): Stop extracting components when the error has not improved by more than tol for this number of
+            components. If None, all the components are extracted.
+        tol (float): The relative improvement of the error that resets the patience.
+
+    Returns:
+        tuple: The number of components, and the validation error of each number of components that was extracted.
+    """
+    x, x_mean, x_std = _center_scale(np.asarray(x_train, dtype=float))
+    y, y_mean, y_std = _center_scale(np.asarray(y_train, dtype=float).reshape(len(x), -1))
+    x_validation = _center_scale(np.asarray(x_validation, dtype=float), x_mean, x_std)[0]
+    y_validation = np.asarray(y_validation, dtype=float).reshape(len(x_validation), -1)
+    if max_components is None:
+        max_components = x.shape[1]
+    max_components = min(max_components, x.shape[1])
+
+    rotations = np.empty((x.shape[1], 0))
+    x_loadings = np.empty((x.shape[1], 0))
+    y_pred = np.zeros(y_validation.shape)
+    errors = []
+    best_error = np.inf
+    n_without_improvement = 0
+    eps = np.finfo(x.dtype).eps
+    for _ in range(max_components):
+        # The x-weights are the first left singular vector of the cross-covariance, which NIPALS converges to
+        u, s, _ = np.linalg.svd(x.T @ y, full_matrices=False)
+        if s[0] < eps:
+            # The targets are fully explained
+            break
+        x_weights = u[:, 0]
+        x_scores = x @ x_weights
+        x_scores_norm = x_scores @ x_scores
+        if x_scores_norm < eps:
+            # The inputs are fully explained
+            break
+        x_loading = x.T @ x_scores / x_scores_norm
+        y_loading = y.T @ x_scores / x_scores_norm
+        x -= np.outer(x_scores, x_loading)
+        y -= np.outer(x_scores, y_loading)
+
+        rotation = x_weights - rotations @ (x_loadings.T @ x_weights)
+        rotations = np.column_stack([rotations, rotation])
+        x_loadings = np.column_stack([x_loadings, x_loading])
+
+        y_pred += np.outer(x_validation @ rotation, y_loading)
+        error = np.sqrt(np.mean((y_pred * y_std + y_mean - y_validation) ** 2))
+        errors += [error]
+
+        if error < best_error * (1 - tol):
+            n_without_improvement = 0
+        else:
+            n_without_improvement += 1
+        best_error = min(best_error, error)
+        if patience is not None and n_without_improvement >= patience:
+            break
+
+    if not errors:
+        return 1, errors
+    # In ties, the fewest components are chosen
+    return int(np.argmin(errors)) + 1, errors
@@ -0,0 +1,179 @@
+"""
+On-disk cache of processed data, shared by `train_model` and `evaluate_model`.
+
+The processed data of a model only depends on the raw data, the model configuration, the preprocessor and the
+`process_data` method of the model, so models that share these, like the scikit-learn models on one configuration,
+can reuse the data processed by the first of them. Entries are keyed by a fingerprint of all of these, where code is
+fingerprinted by its bytecode and the source of the package modules it uses, so that changes to the preprocessing
+invalidate the cache. The least recently used entries are removed when the cache grows larger than its maximum size.
+"""
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import tempfile
+from pathlib import Path
+from .dataset_store import get_dataset_path, is_dataset
+
+CACHE_DIR = Path('data') / 'cache'
+CACHE_EXTENSION = '.pkl'
+DEFAULT_MAX_CACHE_SIZE = 5 * 1024 ** 3
+
+
+def get_data_fingerprint(input_path, file_name):
+    """
+    Returns a fingerprint of the raw data, from the name, size and modification time of its files.
+    """
+    dataset_path = get_dataset_path(input_path, file_name)
+    if is_dataset(dataset_path):
+        files = sorted(path for path in dataset_path.rglob('*') if path.is_file())
+    else:
+        files = [Path(input_path) / file_name]
+    return [(str(path), path.stat().st_size, path.stat().st_mtime_ns) for path in files]
+
+
+def get_code_fingerprint(function):
+    """
+    Returns a fingerprint of a function from its bytecode, and of the source files of the functions and classes it uses
+    from this package. Functions with the same code, like model methods that delegate to the same helper, have the
+    same fingerprint.
+    """
+    function = getattr(function, '__func__', function)
+    fingerprint = get_bytecode_fingerprint(function.__code__)
+    for name in get_global_names(function.__code__):
+        fingerprint += get_object_fingerprint(name, function.__globals__.get(name))
+    return fingerprint
+
+
+def get_process_data_fingerprint(process_data):
+    """
+    Returns a fingerprint of the `process_data` method of a model. Models that wrap another model class, like
+    `PerSubjectModel`, process the data with the wrapped class, so its `process_data` method is fingerprinted as well.
+    """
+    fingerprint = get_code_fingerprint(process_data)
+    model_class = getattr(getattr(process_data, '__self__', None), 'model_class', None)
+    if model_class is not None:
+        fingerprint += [model_class.__module__, model_class.__qualname__]
+        fingerprint += get_code_fingerprint(model_class.process_data)
+    return fingerprint
+
+
+def get_module_fingerprint(module):
+    """
+    Returns a fingerprint of a module from its source file, and of the source files of the functions and classes it
+    imports from this package.
+    """
+    fingerprint = [get_file_hash(inspect.getsourcefile(module))]
+    for name, value in sorted(vars(module).items()):
+        if inspect.getmodule(value) is not module:
+            fingerprint += get_object_fingerprint(name, value)
+    return fingerprint
+
+
+def get_bytecode_fingerprint(code):
+    fingerprint = [code.co_code.hex(), repr(code.co_names)]
+    for const in code.co_consts:
+        # Nested code objects, like comprehensions, have a memory address in their representation
+        fingerprint += get_bytecode_fingerprint(const) if inspect.iscode(const) else [repr(const)]
+    return fingerprint
+
+
+def get_global_names(code):
+    names = list(code.co_names)
+    for const in code.co_consts:
+        if inspect.iscode(const):
+            names += get_global_names(const)
+    return names
+
+
+def get_object_fingerprint(name, value):
+    module = inspect.getmodule(value) if (inspect.isfunction(value) or inspect.isclass(value)) else None
+    if module is None or not module.__name__.startswith('glupredkit.'):
+        return []
+    return [name, module.__name__, get_file_hash(inspect.getsourcefile(module))]
+
+
+def get_file_hash(file_path):
+    with open(file_path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def get_cache_key(input_path, model_config_manager, preprocess, preprocessor_module, process_data, **params):
+    """
+    Returns the cache key of processed data.
+
+    Args:
+        input_path (str): The directory of the raw data.
+        model_config_manager (ModelConfigurationManager): The model configuration.
+        preprocess (callable): The function that runs the preprocessor.
+        preprocessor_module (module): The preprocessor module of the configuration.
+        process_data (callable): The `process_data` method of the model.
+        **params: Other parameters that the processed data depends on, like the train or test split.
+    """
+    fingerprint = {
+        'data': get_data_fingerprint(input_path, model_config_manager.get_data()),
+        'config': model_config_manager.config,
+        'preprocess': get_code_fingerprint(preprocess),
+        'preprocessor': get_module_fingerprint(preprocessor_module),
+        'process_data': get_process_data_fingerprint(process_data),
+        'params': params,
+    }
+    return hashlib.sha256(json.dumps(fingerprint, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def get_or_compute(key, compute, use_cache=True, rebuild=False, cache_dir=CACHE_DIR,
+                   max_size=DEFAULT_MAX_CACHE_SIZE):
+    """
+    Returns the cached value for the key, or computes, caches and returns it.
+
+    Args:
+        key (str): The cache key from `get_cache_key`.
+        compute (callable): Function without arguments that computes the value.
+        use_cache (bool): Whether to use the cache at all. If False, the value is computed and not stored.
+        rebuild (bool): Whether to compute and store the value even if it is cached.
+        cache_dir (Path): The cache directory.
+        max_size (int): The maximum total size of the cache in bytes.
+
+    Returns:
+        tuple: The value, and whether it was loaded from the cache.
+    """
+    if not use_cache:
+        return compute(), False
+
+    cache_dir = Path(cache_dir)
+    file_path = cache_dir / (key + CACHE_EXTENSION)
+    if file_path.exists() and not rebuild:
+        try:
+            with open(file_path, 'rb') as f:
+                value = pickle.load(f)
+            # The modification time marks when the entry was last used
+            os.utime(file_path)
+            return value, True
+        except (OSError, EOFError, pickle.UnpicklingError):
+            pass
+
+    value = compute()
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, file_path)
+
+    evict(cache_dir, max_size, keep=file_path)
+    return value, False
+
+
+def evict(cache_dir, max_size, keep=None):
+    """
+    Removes the least recently used entries until the cache is no larger than max_size, except the entry to keep.
+    """
+    entries = sorted(Path(cache_dir).glob('*' + CACHE_EXTENSION), key=lambda path: path.stat().st_mtime_ns)
+    total_size = sum(path.stat().st_size for path in entries)
+    for path in entries:
+        if total_size <= max_size:
+            break
+        if path != keep:
+            total_size -= path.stat().st_size
+            path.unlink()
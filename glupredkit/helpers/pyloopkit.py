@@ -0,0 +1,523 @@
+"""
+Batched prediction engine for the PyLoopKit implementation of the Loop algorithm.
+
+`pyloopkit.loop_data_manager.update` predicts one trajectory at a time, and most of its runtime is spent in the
+pure Python insulin effect timeline, which evaluates every dose at every effect date. This module precomputes the
+glucose, dose and carbohydrate event arrays of a subject once, computes the insulin effects as NumPy matrix operations,
+and computes the momentum and carbohydrate effects of many reference times together as array operations. The
+allocation of the observed carbohydrate absorption to the meals and the retrospective correction still run through
+PyLoopKit one reference time at a time.
+"""
+import datetime
+import numpy as np
+import pandas as pd
+from math import floor
+from pyloopkit.dose import DoseType
+from pyloopkit.dose_entry import net_basal_units
+from pyloopkit.dose_math import filter_date_range_for_doses
+from pyloopkit.dose_store import get_glucose_effects as get_glucose_effects_unbatched
+from pyloopkit.carb_math import carb_glucose_effects, filter_date_range_for_carbs, map_, simulation_date_range
+from pyloopkit.glucose_math import is_continuous
+from pyloopkit.glucose_store import get_counteraction_effects
+from pyloopkit.input_validation_tools import (
+    are_settings_valid, are_glucose_readings_valid, are_carb_readings_valid, is_insulin_sensitivity_schedule_valid,
+    are_carb_ratios_valid, are_basal_rates_valid, are_correction_ranges_valid, are_insulin_doses_valid)
+from pyloopkit.insulin_math import annotated, trim, reconciled, find_ratio_at_time
+from pyloopkit.loop_data_manager import (update_retrospective_glucose_effect,
+                                         update_predicted_glucose_and_recommended_basal_and_bolus)
+from pyloopkit.loop_math import filter_date_range, sort_dose_lists, simulation_date_range_for_samples
+
+
+def get_column_offsets(columns, column):
+    """
+    Returns the columns that start with the given name and their time offsets in minutes relative to the row date,
+    sorted by time. For example, `CGM_10` is at -10 minutes and `carbs_what_if_10` is at +10 minutes.
+    """
+    relevant_columns = [col for col in columns if col.startswith(column)]
+    offsets = []
+    for col in relevant_columns:
+        if col == column:
+            offsets.append(0)
+        elif "what_if" in col:
+            offsets.append(int(col.split("_")[-1]))
+        else:
+            offsets.append(-int(col.split("_")[-1]))
+
+    order = np.argsort(offsets, kind='stable')
+    return [relevant_columns[i] for i in order], [offsets[i] for i in order]
+
+
+class SubjectEvents:
+    """
+    Glucose, basal, bolus and carbohydrate events of one subject, as value matrices of shape (rows, offsets) with
+    the offsets in minutes relative to each row date. The matrices are computed once, so each prediction time gets
+    its inputs as a row of these arrays instead of re-deriving them from the column names.
+    """
+    def __init__(self, df):
+        if isinstance(df.index, pd.DatetimeIndex):
+            self.dates = list(df.index)
+        else:
+            self.dates = [datetime.datetime.now()] * len(df)
+
+        self.offsets = {}
+        self.values = {}
+        for column in ['CGM', 'basal', 'bolus', 'carbs']:
+            columns, offsets = get_column_offsets(df.columns, column)
+            self.offsets[column] = [datetime.timedelta(minutes=offset) for offset in offsets]
+            self.values[column] = df[columns].to_numpy()
+
+    def __len__(self):
+        return len(self.dates)
+
+    def get_dates_and_values(self, column, i, skip_zeros=False):
+        date = self.dates[i]
+        values = self.values[column][i]
+        indexes = np.flatnonzero(values != 0) if skip_zeros else range(len(values))
+        return [date + self.offsets[column][j] for j in indexes], [values[j] for j in indexes]
+
+    def get_input_dict(self, i, base_input_dict):
+        input_dict = dict(base_input_dict)
+        input_dict["time_to_calculate_at"] = self.dates[i]
+
+        input_dict["glucose_dates"], input_dict["glucose_values"] = self.get_dates_and_values("CGM", i)
+
+        # Basal doses are registered before boluses given at the same time, and all doses are sorted by start time
+        basal_dates, basal_values = self.get_dates_and_values("basal", i)
+        bolus_dates, bolus_values = self.get_dates_and_values("bolus", i, skip_zeros=True)
+        doses = ([(DoseType.basal, date, date + datetime.timedelta(minutes=5), value, None)
+                  for date, value in zip(basal_dates, basal_values)] +
+                 [(DoseType.bolus, date, date, value, None) for date, value in zip(bolus_dates, bolus_values)])
+        doses.sort(key=lambda x: x[1])
+        (input_dict["dose_types"], input_dict["dose_start_times"], input_dict["dose_end_times"],
+         input_dict["dose_values"], input_dict["dose_delivered_units"]) = [list(values) for values in zip(*doses)]
+
+        input_dict["carb_dates"], input_dict["carb_values"] = self.get_dates_and_values("carbs", i, skip_zeros=True)
+        # Adding the default carb absorption time because it is not available in data sources.
+        input_dict["carb_absorption_times"] = [180 for _ in input_dict["carb_values"]]
+
+        return input_dict
+
+
+def is_input_valid(input_dict):
+    settings = input_dict["settings_dictionary"]
+    return (are_settings_valid(settings)
+            and are_glucose_readings_valid(input_dict["glucose_dates"], input_dict["glucose_values"])
+            and are_carb_readings_valid(input_dict["carb_dates"], input_dict["carb_values"],
+                                        input_dict["carb_absorption_times"])
+            and are_insulin_doses_valid(input_dict["dose_types"], input_dict["dose_start_times"],
+                                        input_dict["dose_end_times"], input_dict["dose_values"])
+            and is_insulin_sensitivity_schedule_valid(input_dict["sensitivity_ratio_start_times"],
+                                                      input_dict["sensitivity_ratio_end_times"],
+                                                      input_dict["sensitivity_ratio_values"])
+            and are_carb_ratios_valid(input_dict["carb_ratio_start_times"], input_dict["carb_ratio_values"])
+            and are_basal_rates_valid(input_dict["basal_rate_start_times"], input_dict["basal_rate_values"],
+                                      input_dict["basal_rate_minutes"])
+            and are_correction_ranges_valid(input_dict["target_range_start_times"],
+                                            input_dict["target_range_end_times"],
+                                            input_dict.get("target_range_minimum_values") or [],
+                                            input_dict["target_range_maximum_values"]))
+
+
+def get_date_range(start, end, delta):
+    """
+    Returns the dates from start to end, both included, in steps of delta minutes.
+    """
+    dates = []
+    date = start
+    while date <= end:
+        dates.append(date)
+        date += datetime.timedelta(minutes=delta)
+    return dates
+
+
+def percent_effect_remaining(time, action_duration, peak_activity_time):
+    """
+    Array version of `pyloopkit.exponential_insulin_model.percent_effect_remaining`, with time in minutes.
+    """
+    tau = (peak_activity_time * (1 - peak_activity_time / action_duration) /
+           (1 - 2 * peak_activity_time / action_duration))
+    a = 2 * tau / action_duration
+    S = 1 / (1 - a + (1 + a) * np.exp(-action_duration / tau))
+
+    with np.errstate(over='ignore', invalid='ignore'):
+        remaining = 1 - S * (1 - a) * ((np.power(time, 2) / (tau * action_duration * (1 - a))
+                                        - time / tau - 1) * np.exp(-time / tau) + 1)
+    return np.where(time <= 0, 1, np.where(time > action_duration, 0, remaining))
+
+
+def glucose_effects(dose_types, dose_start_dates, dose_end_dates, dose_values, scheduled_basal_rates,
+                    delivered_units, model, sensitivity_start_times, sensitivity_end_times, sensitivity_values,
+                    delay=10, delta=5, start=None, end=None):
+    """
+    Array version of `pyloopkit.insulin_math.glucose_effects` for the exponential insulin model. The effect of every
+    dose at every effect date is computed as one (dates x doses) matrix and summed over the doses.
+    """
+    if not dose_types and not (start is not None and end is not None):
+        return [], []
+
+    start, end = simulation_date_range_for_samples(start_times=dose_start_dates, end_times=dose_end_dates,
+                                                   duration=model[0], delay=delay, delta=delta, start=start, end=end)
+    effect_dates = get_date_range(start, end, delta)
+
+    # Net insulin units of each dose, skipping doses without any glucose effect
+    units = np.array([net_basal_units(dose_types[i], dose_values[i], dose_start_dates[i], dose_end_dates[i],
+                                      scheduled_basal_rates[i], delivered_units[i])
+                      for i in range(len(dose_types))], dtype=float)
+    doses = np.flatnonzero(units != 0)
+    if len(doses) == 0 or not effect_dates:
+        return effect_dates, [0] * len(effect_dates)
+
+    sensitivities = np.array([find_ratio_at_time(sensitivity_start_times, sensitivity_end_times, sensitivity_values,
+                                                 dose_start_dates[i]) for i in doses], dtype=float)
+    dose_starts = np.array([(dose_start_dates[i] - start).total_seconds() for i in doses])
+    dose_durations = np.array([(dose_end_dates[i] - dose_start_dates[i]).total_seconds() for i in doses])
+
+    delay *= 60
+    delta *= 60
+    time = np.arange(len(effect_dates))[:, None] * delta - dose_starts[None, :]
+    scale = units[doses] * -sensitivities
+
+    # Doses within the delta time window are momentary, which will normally be boluses
+    is_momentary = dose_durations <= 1.05 * delta
+    activity = np.where(is_momentary, 1 - percent_effect_remaining((time - delay) / 60, model[0], model[1]), 0)
+
+    # Continuous delivery, which will normally be basals, is integrated in segments of delta
+    continuous = np.flatnonzero(~is_momentary & (dose_durations >= 0))
+    if len(continuous) > 0:
+        durations = dose_durations[continuous]
+        continuous_time = time[:, continuous]
+        last_dose_date = np.minimum(np.floor((continuous_time + delay) / delta) * delta, durations)
+        continuous_activity = np.zeros_like(continuous_time)
+        for dose_date in np.arange(0, floor(durations.max() / delta) + 1) * delta:
+            segment = np.where(durations > 0, np.maximum(0, np.minimum(dose_date + delta, durations) - dose_date)
+                               / np.where(durations > 0, durations, 1), 1)
+            continuous_activity += np.where(dose_date <= last_dose_date, segment * (
+                    1 - percent_effect_remaining((continuous_time - delay - dose_date) / 60, model[0], model[1])), 0)
+        activity[:, continuous] = continuous_activity
+
+    effects = np.where(time < 0, 0, scale * activity)
+    return effect_dates, effects.sum(axis=1).tolist()
+
+
+def get_glucose_effects(types, starts, ends, values, delivered_units, start_date, basal_starts, basal_rates,
+                        basal_minutes, sensitivity_starts, sensitivity_ends, sensitivity_values, insulin_model,
+                        delay=10, end_date=None):
+    """
+    Equivalent of `pyloopkit.dose_store.get_glucose_effects`, using the array version of the insulin effect timeline.
+    """
+    if len(insulin_model) == 1:
+        # The Walsh model is not batched
+        return get_glucose_effects_unbatched(types, starts, ends, values, delivered_units, start_date, basal_starts,
+                                             basal_rates, basal_minutes, sensitivity_starts, sensitivity_ends,
+                                             sensitivity_values, insulin_model, delay=delay, end_date=end_date)
+
+    # To properly know glucose effects at start_date, we need to go back another DIA
+    dose_start = start_date - datetime.timedelta(minutes=insulin_model[0])
+    filtered_doses = filter_date_range_for_doses(types, starts, ends, values, delivered_units, dose_start, end_date)
+    reconciled_doses = reconciled(*filtered_doses)
+    sorted_reconciled_doses = sort_dose_lists(*reconciled_doses)[0:5]
+
+    (a_types, a_starts, a_ends, a_values, a_scheduled_rates, a_delivered_units
+     ) = annotated(*sorted_reconciled_doses, basal_starts, basal_rates, basal_minutes, convert_to_units_hr=False)
+
+    for i in range(0, len(a_types)):
+        result = trim(a_types[i], a_starts[i], a_ends[i], a_values[i], a_delivered_units[i], a_scheduled_rates[i],
+                      start_interval=dose_start)
+        a_starts[i] = result[1]
+        a_ends[i] = result[2]
+
+    effect_dates, effect_values = glucose_effects(a_types, a_starts, a_ends, a_values, a_scheduled_rates,
+                                                  a_delivered_units, insulin_model, sensitivity_starts,
+                                                  sensitivity_ends, sensitivity_values, delay=delay,
+                                                  start=start_date, end=end_date)
+
+    filtered_starts, _, filtered_effect_values = filter_date_range(effect_dates, [], effect_values, start_date,
+                                                                   end_date)
+    return filtered_starts, filtered_effect_values
+
+
+def get_momentum_effects(glucose_inputs, delta=5):
+    """
+    Batched version of `pyloopkit.glucose_store.get_recent_momentum_effects`. Takes a list with the glucose dates,
+    glucose values, start date, date to calculate at and momentum data interval of each reference time, and fits the
+    linear regressions of all reference times with the same number of recent glucose values as one array operation.
+    """
+    effects = [([], []) for _ in glucose_inputs]
+
+    windows = {}
+    for k, (glucose_dates, glucose_values, start_date, now_date, momentum_data_interval) in enumerate(glucose_inputs):
+        if not glucose_dates or not start_date:
+            continue
+        dates, _, values = filter_date_range(glucose_dates, [], glucose_values,
+                                             now_date - datetime.timedelta(minutes=momentum_data_interval), None)
+        if len(dates) > 2 and is_continuous(dates):
+            windows.setdefault(len(dates), []).append((k, dates, values, momentum_data_interval))
+
+    for window in windows.values():
+        x = np.array([[abs((date - dates[0]).total_seconds()) for date in dates] for _, dates, _, _ in window])
+        y = np.array([values for _, _, values, _ in window], dtype=float)
+        count = x.shape[1]
+        sum_x = x.sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slopes = (count * (x * y).sum(axis=1) - sum_x * y.sum(axis=1)) / (count * (x * x).sum(axis=1) - sum_x ** 2)
+
+        for (k, dates, _, momentum_data_interval), slope in zip(window, slopes):
+            if not np.isfinite(slope):
+                continue
+            start, end = simulation_date_range_for_samples([dates[-1]], [], momentum_data_interval, delta)
+            effect_dates = get_date_range(start, end, delta)
+            effects[k] = effect_dates, [max(0, (date - dates[-1]).total_seconds()) * float(slope)
+                                        for date in effect_dates]
+    return effects
+
+
+def linear_percent_absorption(time, absorption_time):
+    """
+    Array version of `pyloopkit.carb_math.linear_percent_absorption_at_time`, with time in minutes.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(time <= 0, 0, np.where(time < absorption_time, time / absorption_time, 1))
+
+
+def parabolic_percent_absorption(time, absorption_time):
+    """
+    Array version of `pyloopkit.carb_math.parabolic_percent_absorption_at_time`, with time in minutes.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        first_half = 2 / np.power(absorption_time, 2) * np.power(time, 2)
+        second_half = -1 + 4 / absorption_time * (time - np.power(time, 2) / (2 * absorption_time))
+    return np.where(time < 0, 0, np.where(time <= absorption_time / 2, first_half,
+                                          np.where(time < absorption_time, second_half, 1)))
+
+
+def get_carb_glucose_effects(carb_inputs, absorption_time_overrun=1.5, delay=10, delta=5):
+    """
+    Batched version of `pyloopkit.carb_store.get_carb_glucose_effects`. Takes a list with the positional arguments of
+    `pyloopkit.carb_store.get_carb_glucose_effects` for each reference time, from the carb dates to the default
+    absorption times.
+
+    The observed absorption is allocated to the meals by `pyloopkit.carb_math.map_` one reference time at a time, as
+    each counteraction effect is shared between the meals in order. The absorbed carbohydrates of every meal at every
+    effect date of every reference time, as in `pyloopkit.carb_status.dynamic_absorbed_carbs`, are then computed as
+    one array operation. Times are integer microseconds relative to the first effect date of each reference time, so
+    that the comparisons between dates are exact.
+    """
+    effects = [([], []) for _ in carb_inputs]
+
+    effect_dates = []
+    carbs = []
+    timelines = []
+    for k, (carb_dates, carb_values, absorption_times, at_date, effect_starts, effect_ends, effect_values,
+            carb_ratio_starts, carb_ratios, sensitivity_starts, sensitivity_ends, sensitivity_values,
+            default_absorption_times) in enumerate(carb_inputs):
+        if not carb_dates:
+            continue
+
+        food_start = at_date - datetime.timedelta(minutes=default_absorption_times[2] * 2)
+        filtered_carbs = filter_date_range_for_carbs(carb_dates, carb_values, absorption_times, food_start, None)
+
+        if not (effect_starts and effect_starts[0]):
+            # The static model is not batched
+            effects[k] = carb_glucose_effects(*filtered_carbs, carb_ratio_starts, carb_ratios, sensitivity_starts,
+                                              sensitivity_ends, sensitivity_values, default_absorption_times[1],
+                                              delay, delta, at_date, None)
+            continue
+
+        absorptions, observed_timelines = map_(*filtered_carbs, effect_starts, effect_ends, effect_values,
+                                               carb_ratio_starts, carb_ratios, sensitivity_starts, sensitivity_ends,
+                                               sensitivity_values, absorption_time_overrun,
+                                               default_absorption_times[1], delay, delta)[0:2]
+        if not filtered_carbs[0] or not carb_ratio_starts or not sensitivity_starts or not absorptions:
+            continue
+
+        start, end = simulation_date_range(filtered_carbs[0], [], filtered_carbs[2], default_absorption_times[1],
+                                           delay=delay, delta=delta, start=at_date, end=None, scaler=1.7)
+        effects[k] = get_date_range(start, end, delta), None
+        effect_dates.append((k, len(effects[k][0])))
+
+        def microseconds(date):
+            return (date - start) // datetime.timedelta(microseconds=1)
+
+        for carb_start, quantity, absorption_time, absorption, timeline in zip(*filtered_carbs, absorptions,
+                                                                               observed_timelines):
+            csf = (find_ratio_at_time(sensitivity_starts, sensitivity_ends, sensitivity_values, carb_start) /
+                   find_ratio_at_time(carb_ratio_starts, [], carb_ratios, carb_start))
+            has_absorption = bool(absorption)
+            is_estimated = bool(timeline) and None in timeline[0]
+            is_observed = bool(timeline) and not is_estimated
+            absorption = absorption if has_absorption else [0] * 4 + [start] * 2 + [0]
+            carbs.append((len(effect_dates) - 1, microseconds(carb_start), quantity,
+                          absorption_time or default_absorption_times[1], csf, has_absorption, is_estimated,
+                          microseconds(timeline[-1][1]) if is_observed else -1, not is_observed,
+                          *absorption[0:4], microseconds(absorption[4]), microseconds(absorption[5]), absorption[6]))
+            if is_observed:
+                timelines.extend((len(carbs) - 1, microseconds(entry_start), microseconds(entry_end), value)
+                                 for entry_start, entry_end, value in timeline)
+
+    if not carbs:
+        return effects
+
+    (row, carb_start, quantity, absorption_time, csf, has_absorption, is_estimated, observed_end, is_unobserved,
+     observed, clamped, total, remaining, estimation_start, estimation_end, time_remaining
+     ) = [np.array(values) for values in zip(*carbs)]
+    n_dates = np.array([n for _, n in effect_dates])
+    date_offsets = np.cumsum(n_dates) - n_dates
+
+    # Each effect date of each meal, in microseconds since the first effect date of the reference time
+    n_carb_dates = n_dates[row]
+    carb = np.repeat(np.arange(len(carbs)), n_carb_dates)
+    date_index = np.arange(n_carb_dates.sum()) - np.repeat(np.cumsum(n_carb_dates) - n_carb_dates, n_carb_dates)
+    date = date_index * (delta * 60 * 10 ** 6)
+
+    def minutes_between(later, earlier):
+        return (later - earlier) / 10 ** 6 / 60
+
+    # The absorption observed before each date, where the last observation counts only if it has a duration
+    if timelines:
+        timeline_carb, timeline_start, timeline_end, timeline_value = [np.array(values) for values in zip(*timelines)]
+        order = np.lexsort((timeline_start, timeline_carb))
+        timeline_carb, timeline_start, timeline_end, timeline_value = (
+            timeline_carb[order], timeline_start[order], timeline_end[order], timeline_value[order])
+        observed_starts = timeline_start + delta * 60 * 10 ** 6
+        lowest = min(observed_starts.min(), 0)
+        span = max(observed_starts.max(), date.max()) - lowest + 1
+        n_observed = np.searchsorted(timeline_carb * span + observed_starts - lowest, carb * span + date - lowest,
+                                     side='right')
+        first_observed = np.searchsorted(timeline_carb, carb)
+        cumulative_value = np.concatenate([[0], np.cumsum(timeline_value)])
+        last = n_observed - 1
+        observed_sum = np.where(n_observed > first_observed, cumulative_value[n_observed] -
+                                cumulative_value[first_observed] -
+                                np.where(timeline_end[last] > timeline_start[last], 0, timeline_value[last]), 0)
+    else:
+        observed_sum = np.zeros(len(carb))
+
+    time = minutes_between(date, carb_start[carb]) - delay
+    absorbed = np.select(
+        [(date < carb_start[carb]) | ~has_absorption[carb],
+         is_estimated[carb],
+         is_unobserved[carb] | (date > observed_end[carb])],
+        [quantity[carb] * parabolic_percent_absorption(time, absorption_time[carb]),
+         total[carb] * linear_percent_absorption(
+             time, minutes_between(estimation_end, estimation_start)[carb] + time_remaining[carb]),
+         clamped[carb] + remaining[carb] * linear_percent_absorption(
+             minutes_between(date, estimation_end[carb]), time_remaining[carb])],
+        np.minimum(observed_sum, observed[carb]))
+
+    values = np.bincount(date_offsets[row][carb] + date_index, weights=csf[carb] * absorbed, minlength=n_dates.sum())
+    for (k, _), offset, n in zip(effect_dates, date_offsets, n_dates):
+        effects[k] = effects[k][0], values[offset:offset + n].tolist()
+    return effects
+
+
+def get_prediction_outputs(input_dicts):
+    """
+    Equivalent of `pyloopkit.loop_data_manager.update` for each of the input dictionaries, using the array versions
+    of the insulin, momentum and carbohydrate effects. Returns for each input the same dictionary of effects and
+    predicted glucose values, without the carbs on board timeline that the prediction does not use, or an empty list
+    if the input is invalid.
+
+    For correct predictions, at least 24 hours plus the duration of insulin action of data is needed, and no glucose
+    values after the time to calculate at can be included. See the PyLoopKit documentation:
+    https://github.com/miriamkw/PyLoopKit/blob/develop/pyloopkit/docs/pyloopkit_documentation.md
+    """
+    inputs = {}
+    for k, input_dict in enumerate(input_dicts):
+        if not is_input_valid(input_dict):
+            continue
+
+        settings = input_dict["settings_dictionary"]
+        time_to_calculate_at = input_dict["time_to_calculate_at"]
+        glucose_dates = input_dict["glucose_dates"]
+        glucose_values = input_dict["glucose_values"]
+        dose_inputs = [input_dict["dose_types"], input_dict["dose_start_times"], input_dict["dose_end_times"],
+                       input_dict["dose_values"], input_dict["dose_delivered_units"]]
+        basal_inputs = [input_dict["basal_rate_start_times"], input_dict["basal_rate_values"],
+                        input_dict["basal_rate_minutes"]]
+        sensitivity_inputs = [input_dict["sensitivity_ratio_start_times"],
+                              input_dict["sensitivity_ratio_end_times"], input_dict["sensitivity_ratio_values"]]
+        delay = settings.get("insulin_delay") or 10
+
+        retrospective_start = glucose_dates[-1] - datetime.timedelta(
+            minutes=settings.get("retrospective_correction_integration_interval") or 30)
+        next_effect_date = time_to_calculate_at - datetime.timedelta(hours=24)
+
+        # Previous insulin effects are used for the insulin counteraction effects, future effects for the prediction
+        insulin_effect_dates, insulin_effect_values = get_glucose_effects(
+            *dose_inputs, next_effect_date, *basal_inputs, *sensitivity_inputs, settings.get("model"), delay=delay)
+        insulin_effects = get_glucose_effects(
+            *dose_inputs, time_to_calculate_at, *basal_inputs, *sensitivity_inputs, settings.get("model"),
+            delay=delay)
+
+        if next_effect_date < glucose_dates[-1] and insulin_effect_dates:
+            counteraction_effects = get_counteraction_effects(glucose_dates, glucose_values, next_effect_date,
+                                                              insulin_effect_dates, insulin_effect_values)
+        else:
+            counteraction_effects = ([], [], [])
+
+        absorption_effects = (counteraction_effects if settings.get("dynamic_carb_absorption_enabled") is not False
+                              else ([], [], []))
+        inputs[k] = {
+            "insulin_effects": insulin_effects,
+            "counteraction_effects": counteraction_effects,
+            "momentum_inputs": (glucose_dates, glucose_values, next_effect_date, time_to_calculate_at,
+                                settings.get("momentum_data_interval") or 15),
+            "carb_inputs": (input_dict["carb_dates"], input_dict["carb_values"], input_dict["carb_absorption_times"],
+                            retrospective_start, *absorption_effects, input_dict["carb_ratio_start_times"],
+                            input_dict["carb_ratio_values"], *sensitivity_inputs,
+                            settings.get("default_absorption_times")),
+            "carb_delay": settings.get("carb_delay") or 10,
+        }
+
+    momentum_effects = dict(zip(inputs, get_momentum_effects([row["momentum_inputs"] for row in inputs.values()])))
+    carb_effects = {}
+    for carb_delay in set(row["carb_delay"] for row in inputs.values()):
+        indexes = [k for k, row in inputs.items() if row["carb_delay"] == carb_delay]
+        carb_effects.update(zip(indexes, get_carb_glucose_effects([inputs[k]["carb_inputs"] for k in indexes],
+                                                                  delay=carb_delay)))
+
+    outputs = [[] for _ in input_dicts]
+    for k, row in inputs.items():
+        input_dict = input_dicts[k]
+        settings = input_dict["settings_dictionary"]
+        time_to_calculate_at = input_dict["time_to_calculate_at"]
+        glucose_dates = input_dict["glucose_dates"]
+        glucose_values = input_dict["glucose_values"]
+        counteraction_effects = row["counteraction_effects"]
+
+        if settings.get("retrospective_correction_enabled"):
+            retrospective_effects = update_retrospective_glucose_effect(
+                glucose_dates, glucose_values, *carb_effects[k], *counteraction_effects,
+                settings.get("recency_interval") or 15,
+                settings.get("retrospective_correction_grouping_interval") or 30, time_to_calculate_at)
+        else:
+            retrospective_effects = ([], [])
+
+        output = update_predicted_glucose_and_recommended_basal_and_bolus(
+            time_to_calculate_at, glucose_dates, glucose_values, *momentum_effects[k], *carb_effects[k],
+            *row["insulin_effects"], *retrospective_effects, input_dict["target_range_start_times"],
+            input_dict["target_range_end_times"], input_dict.get("target_range_minimum_values") or [],
+            input_dict["target_range_maximum_values"], settings.get("suspend_threshold"),
+            input_dict["sensitivity_ratio_start_times"], input_dict["sensitivity_ratio_end_times"],
+            input_dict["sensitivity_ratio_values"], settings.get("model"), input_dict["basal_rate_start_times"],
+            input_dict["basal_rate_values"], input_dict["basal_rate_minutes"], settings.get("max_basal_rate"),
+            settings.get("max_bolus"), input_dict.get("last_temporary_basal"),
+            rate_rounder=settings.get("rate_rounder"))
+
+        output["insulin_effect_dates"], output["insulin_effect_values"] = row["insulin_effects"]
+        (output["counteraction_effect_start_times"], output["counteraction_effect_end_times"],
+         output["counteraction_effect_values"]) = counteraction_effects
+        output["momentum_effect_dates"], output["momentum_effect_values"] = momentum_effects[k]
+        output["carb_effect_dates"], output["carb_effect_values"] = carb_effects[k]
+        output["retrospective_effect_dates"] = retrospective_effects[0] or None
+        output["retrospective_effect_values"] = retrospective_effects[1] or None
+        output["input_data"] = input_dict
+        outputs[k] = output
+    return outputs
+
+
+def get_prediction_output(input_dict):
+    """
+    Equivalent of `pyloopkit.loop_data_manager.update` for one input dictionary, see `get_prediction_outputs`.
+    """
+    return get_prediction_outputs([input_dict])[0]
@@ -0,0 +1,218 @@
+"""
+Storage of the results of tested models in `data/tested_models/`.
+
+The results of a model are stored as an `.npz` bundle and a `.json` sidecar with the same name. The bundle holds the
+measured and predicted values as samples x prediction horizons float32 matrices, and the test inputs as typed columns.
+The sidecar holds the model configuration, the data description and the metrics. Loading the results gives the same
+one-row dataframe as the former CSV format, except that the values that used to be stringified lists are numeric
+arrays, and the non-scalar metrics are lists, so plots can use them without parsing.
+"""
+import ast
+import json
+import os
+import re
+import numpy as np
+import pandas as pd
+
+RESULTS_FORMAT_VERSION = 1
+RESULTS_EXTENSION = '.npz'
+METADATA_EXTENSION = '.json'
+LEGACY_RESULTS_EXTENSION = '.csv'
+
+
+def get_results_file_paths(file_path):
+    """
+    Returns the paths of the array bundle and metadata sidecar for a results file, with or without extension.
+    """
+    stem = os.path.splitext(file_path)[0]
+    return stem + RESULTS_EXTENSION, stem + METADATA_EXTENSION
+
+
+def list_results_files(directory_path):
+    """
+    Returns the results file names in the directory. Results in the legacy CSV format are only listed when they have
+    not been converted.
+    """
+    file_names = sorted(os.listdir(directory_path))
+    results_files = [file_name for file_name in file_names if file_name.endswith(RESULTS_EXTENSION)]
+    for file_name in file_names:
+        if (file_name.endswith(LEGACY_RESULTS_EXTENSION) and
+                os.path.splitext(file_name)[0] + RESULTS_EXTENSION not in results_files):
+            results_files.append(file_name)
+    return sorted(results_files)
+
+
+def get_prediction_horizons(columns):
+    return [int(col.split('_')[-1]) for col in columns if re.fullmatch(r'y_pred_\d+', col)]
+
+
+def save_results(results_df, file_path):
+    """
+    Stores a one-row results dataframe from `get_results_df` as an array bundle and a metadata sidecar.
+
+    Args:
+        results_df (pd.DataFrame): The results, where the targets, predictions and test inputs are arrays or lists.
+        file_path (str): The path of the results file. The extension is replaced by `.npz` and `.json`.
+
+    Returns:
+        str: The path of the array bundle.
+    """
+    columns = list(results_df.columns)
+    prediction_horizons = get_prediction_horizons(columns)
+    target_cols = [f'target_{ph}' for ph in prediction_horizons]
+    pred_cols = [f'y_pred_{ph}' for ph in prediction_horizons]
+    metric_pattern = re.compile(r'.+_(\d+)')
+
+    arrays = {
+        'targets': np.column_stack([np.asarray(results_df[col].iloc[0], dtype=np.float32) for col in target_cols]),
+        'predictions': np.column_stack([np.asarray(results_df[col].iloc[0], dtype=np.float32) for col in pred_cols]),
+    }
+    attributes = {}
+    metrics = {}
+    for col in columns:
+        if col in target_cols or col in pred_cols:
+            continue
+        value = results_df[col].iloc[0]
+        if col == 'test_input_date':
+            arrays[col] = get_date_column(value)
+        elif col.startswith('test_input_'):
+            arrays[col] = get_typed_column(value)
+        elif metric_pattern.fullmatch(col) and int(metric_pattern.fullmatch(col).group(1)) in prediction_horizons:
+            metrics[col] = to_json_value(value)
+        else:
+            attributes[col] = to_json_value(value)
+
+    metadata = {
+        'format_version': RESULTS_FORMAT_VERSION,
+        'columns': columns,
+        'prediction_horizons': prediction_horizons,
+        'attributes': attributes,
+        'metrics': metrics,
+    }
+
+    results_path, metadata_path = get_results_file_paths(file_path)
+    np.savez_compressed(results_path, **arrays)
+    with open(metadata_path, 'w') as f:
+        json.dump(metadata, f, indent=2)
+    return results_path
+
+
+def load_results(file_path):
+    """
+    Loads the results of a tested model as a one-row dataframe.
+
+    Args:
+        file_path (str): The path of the results file. A `.csv` path is read with the legacy CSV format if the file
+            exists and has not been converted.
+
+    Returns:
+        pd.DataFrame: The results, where `target_{ph}` and `y_pred_{ph}` are float32 arrays, `test_input_{feature}`
+        are typed arrays, `test_input_date` is a datetime64 array, and the other values are scalars or lists.
+    """
+    results_path, metadata_path = get_results_file_paths(file_path)
+    if file_path.endswith(LEGACY_RESULTS_EXTENSION) and not os.path.exists(results_path):
+        return read_legacy_results_csv(file_path)
+
+    with open(metadata_path) as f:
+        metadata = json.load(f)
+
+    with np.load(results_path) as bundle:
+        arrays = {name: bundle[name] for name in bundle.files}
+
+    values = {**metadata['attributes'], **metadata['metrics']}
+    for i, ph in enumerate(metadata['prediction_horizons']):
+        values[f'target_{ph}'] = arrays['targets'][:, i]
+        values[f'y_pred_{ph}'] = arrays['predictions'][:, i]
+    for name, array in arrays.items():
+        if name.startswith('test_input_'):
+            values[name] = array
+    return pd.DataFrame({col: [values[col]] for col in metadata['columns']})
+
+
+def read_legacy_results_csv(file_path):
+    """
+    Reads results stored in the legacy CSV format, where lists are stored as strings, into the same dataframe as
+    `load_results`.
+    """
+    df = pd.read_csv(file_path)
+    values = {}
+    for col in df.columns:
+        value = df[col].iloc[0]
+        if col == 'test_input_date':
+            value = get_date_column(re.findall(r"Timestamp\('(.*?)'", value) or re.findall(r"'(.*?)'", value))
+        elif re.fullmatch(r'(target|y_pred)_\d+', col):
+            value = np.asarray(parse_legacy_list(value), dtype=np.float32)
+        elif col.startswith('test_input_'):
+            value = get_typed_column(parse_legacy_list(value))
+        elif isinstance(value, str) and value.startswith(('[', '{')):
+            value = parse_legacy_list(value)
+        values[col] = value
+    return pd.DataFrame({col: [value] for col, value in values.items()})
+
+
+def convert_legacy_results_csv(file_path):
+    """
+    Converts results stored in the legacy CSV format to an array bundle and metadata sidecar next to it.
+
+    Returns:
+        str: The path of the array bundle.
+    """
+    return save_results(read_legacy_results_csv(file_path), file_path)
+
+
+def parse_legacy_list(value):
+    """
+    Parses a list or dict that was stringified in the legacy CSV format, where missing values are written as nan.
+    """
+    return none_to_nan(ast.literal_eval(re.sub(r'\bnan\b', 'None', value)))
+
+
+def none_to_nan(value):
+    if value is None:
+        return np.nan
+    if isinstance(value, list):
+        return [none_to_nan(val) for val in value]
+    if isinstance(value, dict):
+        return {key: none_to_nan(val) for key, val in value.items()}
+    return value
+
+
+def get_typed_column(values):
+    """
+    Returns the values of a test input column as an array with its natural type. Columns of strings or mixed types are
+    stored as strings, so that the bundle can be loaded without pickle.
+    """
+    array = np.asarray(values)
+    if array.dtype == object:
+        try:
+            array = np.asarray(values, dtype=float)
+        except (TypeError, ValueError):
+            array = array.astype(str)
+    return array
+
+
+def get_date_column(values):
+    """
+    Returns the test dates as a datetime64 array. Timezone-aware dates keep their local time.
+    """
+    try:
+        dates = pd.DatetimeIndex(pd.to_datetime(values))
+    except ValueError:
+        # Dates across daylight saving time changes have mixed UTC offsets
+        dates = pd.DatetimeIndex([pd.Timestamp(date).tz_localize(None) if pd.Timestamp(date).tz else pd.Timestamp(date)
+                                  for date in values])
+    if dates.tz is not None:
+        dates = dates.tz_localize(None)
+    return dates.to_numpy()
+
+
+def to_json_value(value):
+    if isinstance(value, np.ndarray):
+        return to_json_value(value.tolist())
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (list, tuple)):
+        return [to_json_value(val) for val in value]
+    if isinstance(value, dict):
+        return {key: to_json_value(val) for key, val in value.items()}
+    return value
@@ -0,0 +1,99 @@
+"""
+Closed-form ridge regression for all outputs and all candidate alphas from singular value decompositions.
+
+With the centered inputs factorized as X = U diag(s) V^T, the coefficients for a regularization strength alpha are
+V diag(s / (s^2 + alpha)) U^T y, so every alpha and every output is solved from the same factorization. The alpha of
+each output is chosen by cross-validation on contiguous folds of the samples, which are ordered in time. Leave-one-out
+residuals would also follow from U and s, but the lagged features of neighbouring samples overlap, so each left-out
+sample is nearly repeated in the training data, which favours small alphas.
+
+Ridge regressions with a weight for each sample and output are solved from the weighted normal equations of each output.
+"""
+import numpy as np
+
+
+def _factorize(x, y):
+    x_mean = x.mean(axis=0)
+    y_mean = y.mean(axis=0)
+    u, s, vt = np.linalg.svd(x - x_mean, full_matrices=False)
+    return x_mean, y_mean, s, vt, u.T @ (y - y_mean)
+
+
+def _get_factors(s, alphas):
+    # The coefficients of a factorization are V (factors * U^T y), with a factor of zero for singular directions
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(s[:, np.newaxis] > 0, s[:, np.newaxis] / (s[:, np.newaxis] ** 2 + alphas), 0.0)
+
+
+def fit_ridge(x, y, alphas, n_folds=5):
+    """
+    Fits a ridge regression with an intercept for each output, choosing the alpha of each output by cross-validation
+    on contiguous folds, like `GridSearchCV(Ridge(), cv=n_folds)` for each output.
+
+    Args:
+        x (np.ndarray): Inputs of shape (samples, features), ordered in time.
+        y (np.ndarray): Targets of shape (samples, outputs).
+        alphas (list): The candidate regularization strengths.
+        n_folds (int): The number of contiguous folds of the cross-validation.
+
+    Returns:
+        tuple: The coefficients of shape (features, outputs), the intercepts of shape (outputs,), the chosen alpha of
+        each output, and the mean squared validation error of each alpha and output over the folds, of shape
+        (alphas, outputs).
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    alphas = np.asarray(alphas, dtype=float)
+    if len(x) < n_folds:
+        raise ValueError(f"Cannot choose the alpha by {n_folds}-fold cross-validation with {len(x)} samples.")
+
+    cv_errors = np.zeros((len(alphas), y.shape[1]))
+    for fold in np.array_split(np.arange(len(x)), n_folds):
+        is_train = np.ones(len(x), dtype=bool)
+        is_train[fold] = False
+        x_mean, y_mean, s, vt, uty = _factorize(x[is_train], y[is_train])
+        # The validation inputs in the basis of the right singular vectors, shared by all alphas
+        projected = (x[fold] - x_mean) @ vt.T
+        for i, alpha in enumerate(alphas):
+            predictions = projected @ (_get_factors(s, alpha) * uty) + y_mean
+            cv_errors[i] += np.mean((y[fold] - predictions) ** 2, axis=0) / n_folds
+
+    # In ties, the first alpha is chosen, like in a grid search
+    best_alphas = alphas[np.argmin(cv_errors, axis=0)]
+    x_mean, y_mean, s, vt, uty = _factorize(x, y)
+    coefficients = vt.T @ (_get_factors(s, best_alphas) * uty)
+    intercepts = y_mean - x_mean @ coefficients
+    return coefficients, intercepts, best_alphas, cv_errors
+
+
+def fit_weighted_ridge(x, y, weights, alpha):
+    """
+    Fits a ridge regression with an intercept for each output, where each sample of each output has its own weight in
+    the squared error, like `sklearn.linear_model.Ridge` with `sample_weight` for each output.
+
+    Args:
+        x (np.ndarray): Inputs of shape (samples, features).
+        y (np.ndarray): Targets of shape (samples, outputs).
+        weights (np.ndarray): Non-negative weights of the squared errors, of shape (samples, outputs).
+        alpha (float): The regularization strength of the coefficients. The intercepts are not regularized.
+
+    Returns:
+        tuple: The coefficients of shape (features, outputs) and the intercepts of shape (outputs,).
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+
+    coefficients = np.empty((x.shape[1], y.shape[1]))
+    intercepts = np.empty(y.shape[1])
+    for i in range(y.shape[1]):
+        # The weighted means are subtracted, so that the intercept is not regularized
+        x_mean = weights[:, i] @ x / weights[:, i].sum()
+        y_mean = weights[:, i] @ y[:, i] / weights[:, i].sum()
+        sqrt_weights = np.sqrt(weights[:, i])[:, np.newaxis]
+        x_weighted = sqrt_weights * (x - x_mean)
+        y_weighted = sqrt_weights[:, 0] * (y[:, i] - y_mean)
+        gram = x_weighted.T @ x_weighted + alpha * np.eye(x.shape[1])
+        coefficients[:, i] = np.linalg.solve(gram, x_weighted.T @ y_weighted)
+        intercepts[i] = y_mean - x_mean @ coefficients[:, i]
+    return coefficients, intercepts
@@ -1,29 +1,103 @@
 import pandas as pd
+from sklearn.model_selection import GridSearchCV, ParameterGrid
 from glupredkit.helpers.model_config_manager import ModelConfigurationManager
 import numpy as np
 
 
-def add_time_lagged_features(df, lagged_cols, num_lagged_features):
-    lagged_df = pd.DataFrame()
-    indexes = list(range(1, num_lagged_features + 1))
+def get_feature_names(lagged_cols, num_lagged_features, what_if_cols, prediction_horizon):
+    lagged_names = [col + "_" + str(i * 5) for col in lagged_cols for i in range(1, num_lagged_features + 1)]
+    what_if_names = [col + "_what_if_" + str(i * 5) for col in what_if_cols
+                     for i in range(1, prediction_horizon // 5 + 1)]
+    return lagged_names + what_if_names
+
+
+def build_feature_matrix(df, lagged_cols, num_lagged_features, what_if_cols, prediction_horizon, groups=None):
+    """
+    Builds the time-lagged and "what if" features of a dataframe into one preallocated array.
+
+    Args:
+        df (DataFrame): Input data, ordered in time within each group.
+        lagged_cols (list): Columns to add `num_lagged_features` lags of (`CGM_5`, `CGM_10`...).
+        num_lagged_features (int): Number of time-lagged features for each column.
+        what_if_cols (list): Columns to add future values of (`carbs_what_if_5`, `carbs_what_if_10`...).
+        prediction_horizon (int): The prediction horizon in minutes, deciding the number of "what if" features.
+        groups (array-like): Group label of each row, so that values are never shifted across groups. Rows must be
+            contiguous within each group. If None, the whole dataframe is treated as one group.
+
+    Returns:
+        DataFrame: The features, with the same index as df.
+    """
+    n_what_if = prediction_horizon // 5
+    columns = get_feature_names(lagged_cols, num_lagged_features, what_if_cols, prediction_horizon)
+    features = np.full((len(df), len(columns)), np.nan, order='F')
+
+    # Position of each row within its group, and the number of rows left in the group
+    if groups is None:
+        position = np.arange(len(df))
+        remaining = len(df) - position - 1
+    else:
+        groups = np.asarray(groups)
+        is_new_group = np.ones(len(df), dtype=bool)
+        is_new_group[1:] = groups[1:] != groups[:-1]
+        group_starts = np.flatnonzero(is_new_group)
+        group_ends = np.append(group_starts[1:], len(df))
+        group_sizes = group_ends - group_starts
+        position = np.arange(len(df)) - np.repeat(group_starts, group_sizes)
+        remaining = np.repeat(group_sizes, group_sizes) - position - 1
+
+    offset = 0
+    for cols, shifts in [(lagged_cols, range(1, num_lagged_features + 1)),
+                         (what_if_cols, range(-1, -n_what_if - 1, -1))]:
+        values = df[cols].to_numpy(dtype=float)
+        for j in range(len(cols)):
+            for shift in shifts:
+                # Shifted view of the column, masking the rows where the shift would cross a group boundary
+                feature = features[:, offset]
+                if shift > 0:
+                    feature[shift:] = values[:-shift, j]
+                    feature[position < shift] = np.nan
+                else:
+                    feature[:shift] = values[-shift:, j]
+                    feature[remaining < -shift] = np.nan
+                offset += 1
+
+    return pd.DataFrame(features, index=df.index, columns=columns)
+
+
+def fit_parameter_grid(estimator, param_grid, x_train, y_train):
+    """
+    Fits an estimator with the parameters of a grid. Cross-validation only runs when there are several parameter
+    combinations to choose between, and otherwise the estimator is fitted once with the single combination.
+
+    Args:
+        estimator: The scikit-learn estimator, pipeline or meta-estimator to fit.
+        param_grid (dict): The candidate values of each parameter, named like in `estimator.set_params`.
+        x_train (DataFrame): The training features.
+        y_train (DataFrame): The training targets.
+
+    Returns:
+        tuple: The fitted estimator, and the chosen parameters without the prefixes of their pipeline step or wrapped
+            estimator.
+    """
+    candidates = list(ParameterGrid(param_grid))
+    if len(candidates) == 1:
+        params = candidates[0]
+        model = estimator.set_params(**params)
+        model.fit(x_train, y_train)
+    else:
+        grid_search = GridSearchCV(estimator, param_grid, cv=5, scoring='neg_mean_squared_error')
+        grid_search.fit(x_train, y_train)
+        params = grid_search.best_params_
+        model = grid_search.best_estimator_
+    return model, {key.split('__')[-1]: value for key, value in params.items()}
 
-    for col in lagged_cols:
-        for i in indexes:
-            new_col_name = col + "_" + str(i * 5)
-            lagged_df = pd.concat([lagged_df, df[col].shift(i).rename(new_col_name)], axis=1)
-    return lagged_df
 
+def add_time_lagged_features(df, lagged_cols, num_lagged_features):
+    return build_feature_matrix(df, lagged_cols, num_lagged_features, [], 0)
 
-def add_what_if_features(df, what_if_cols, prediction_horizon):
-    what_if_df = pd.DataFrame()
-    prediction_index = prediction_horizon // 5
-    indexes = list(range(1, prediction_index + 1))
 
-    for col in what_if_cols:
-        for i in indexes:
-            new_col_name = col + "_what_if_" + str(i * 5)
-            what_if_df = pd.concat([what_if_df, df[col].shift(-i).rename(new_col_name)], axis=1)
-    return what_if_df
+def add_what_if_features(df, what_if_cols, prediction_horizon):
+    return build_feature_matrix(df, [], 0, what_if_cols, prediction_horizon)
 
 
 def process_data(df, model_config_manager: ModelConfigurationManager, real_time=False):
@@ -34,28 +108,18 @@ def process_data(df, model_config_manager: ModelConfigurationManager, real_time=
         df.loc[df['imputed'] == 1.0, :] = np.nan
         df = df.drop(columns=['imputed'])
 
-    subject_ids = df['id'].unique()
-    subject_ids = list(filter(lambda x: not np.isnan(x), subject_ids))
-
-    processed_df = pd.DataFrame()
-
-    for subject_id in subject_ids:
-        # Identify the subset of the DataFrame for the current subject ID
-        subset_df = df[df['id'] == subject_id]
-
-        # Add time-lagged features directly to the subset
-        lagged_features = add_time_lagged_features(subset_df, model_config_manager.get_num_features(),
-                                                   model_config_manager.get_num_lagged_features())
-        # Add what-if features
-        what_if_df = add_what_if_features(subset_df, model_config_manager.get_what_if_features(),
-                                          model_config_manager.get_prediction_horizon())
-
-        # Update the subset DataFrame with the new time-lagged features
-        subset_df = pd.concat([subset_df, lagged_features], axis=1)
-        subset_df = pd.concat([subset_df, what_if_df], axis=1)
-
-        # Adding new rows to the processed_df for this subset of the df
-        processed_df = pd.concat([processed_df, subset_df], axis=0)
+    # Order the rows by subject, in order of appearance, skipping rows without a subject id
+    subject_codes, _ = pd.factorize(df['id'])
+    order = np.argsort(subject_codes, kind='stable')
+    order = order[subject_codes[order] >= 0]
+    subject_df = df.iloc[order]
+
+    # Add time-lagged and what-if features for all subjects in one matrix
+    features = build_feature_matrix(subject_df, model_config_manager.get_num_features(),
+                                    model_config_manager.get_num_lagged_features(),
+                                    model_config_manager.get_what_if_features(),
+                                    model_config_manager.get_prediction_horizon(), groups=subject_codes[order])
+    processed_df = pd.concat([subject_df, features], axis=1)
 
     if real_time:
         processed_df = processed_df.dropna(subset=processed_df.columns.difference(['target']))
@@ -0,0 +1,212 @@
+"""
+Processed datasets in shared memory, for training and evaluation in several processes.
+
+A `SharedDataset` places the feature matrix, the targets, the subject of each row and the dates of the rows in one
+`multiprocessing.shared_memory` segment. Pickling the dataset only pickles the name and layout of the segment, so
+sending it to a worker process, for example through a `ProcessPoolExecutor`, does not copy the data. In the worker, the
+arrays are read-only NumPy views of the segment.
+
+The process that creates the dataset owns the segment, and removes it when the dataset is closed, garbage collected or
+when the process exits. Other processes only detach from it.
+"""
+import weakref
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+
+# The arrays in the segment start at multiples of this number of bytes
+ALIGNMENT = 64
+ARRAYS = ('x', 'y', 'ids', 'dates')
+
+
+def _release(shm, unlink):
+    try:
+        shm.close()
+    except BufferError:
+        # Views of the segment are still in use, and the memory is freed when they are garbage collected
+        pass
+    if unlink:
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class SharedDataset:
+    """
+    A processed dataset in shared memory.
+
+    Args:
+        x (np.ndarray): The features, of shape (samples, features), or (samples, window, features) for sequences.
+        y (np.ndarray): The targets of shape (samples, outputs), or None.
+        ids (array-like): The subject of each sample, or None.
+        dates (pd.DatetimeIndex): The date of each sample, or None.
+        feature_names (list): The names of the features.
+        target_names (list): The names of the targets.
+        columns (list): The order of the feature columns and `id` in `to_frame`. Default is `id` after the features.
+        feature_dtypes (list): The type of each feature in `to_frame`, if it differs from the type of x.
+    """
+    def __init__(self, x, y=None, ids=None, dates=None, feature_names=None, target_names=None, columns=None,
+                 feature_dtypes=None):
+        x = np.asarray(x)
+        arrays = {'x': x}
+        if y is not None:
+            arrays['y'] = np.asarray(y)
+        if ids is not None:
+            codes, subject_ids = pd.factorize(np.asarray(ids), sort=False)
+            if (codes < 0).any():
+                raise ValueError("The subject ids must not be missing.")
+            arrays['ids'] = codes.astype(np.int32)
+            subject_ids = [value.item() if isinstance(value, np.generic) else value for value in subject_ids]
+        else:
+            subject_ids = None
+        timezone, index_unit, index_name = None, None, None
+        if dates is not None:
+            dates = pd.DatetimeIndex(dates)
+            timezone, index_unit, index_name = dates.tz, dates.unit, dates.name
+            # Nanoseconds since the epoch in UTC, or in local time for dates without a timezone
+            arrays['dates'] = dates.as_unit('ns').asi8
+        for name, values in arrays.items():
+            if len(values) != len(x):
+                raise ValueError(f"Expected {len(x)} samples in {name}, got {len(values)}.")
+            if values.dtype == object:
+                raise TypeError(f"The values of {name} must be numeric.")
+
+        layout = {}
+        size = 0
+        for name, values in arrays.items():
+            layout[name] = (size, values.shape, values.dtype.str)
+            size += -(-values.nbytes // ALIGNMENT) * ALIGNMENT
+
+        self._shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        self._finalizer = weakref.finalize(self, _release, self._shm, True)
+        self._state = {
+            'name': self._shm.name,
+            'layout': layout,
+            'subject_ids': subject_ids,
+            'timezone': timezone,
+            'index_unit': index_unit,
+            'index_name': index_name,
+            'feature_names': list(feature_names) if feature_names is not None else None,
+            'target_names': list(target_names) if target_names is not None else None,
+            'columns': list(columns) if columns is not None else None,
+            'feature_dtypes': [np.dtype(dtype).str for dtype in feature_dtypes] if feature_dtypes is not None else None,
+        }
+        for name, values in arrays.items():
+            offset, shape, dtype = layout[name]
+            np.ndarray(shape, dtype=dtype, buffer=self._shm.buf, offset=offset)[...] = values
+        self._set_views()
+
+    @classmethod
+    def from_frame(cls, x, y=None):
+        """
+        Creates a shared dataset from processed data in a DataFrame.
+
+        Args:
+            x (pd.DataFrame): The numerical features, with an `id` column, indexed by date. The features are stored with
+                the common type of their columns, like float64 for integer, boolean and float columns, and `to_frame`
+                converts them back to the type of their column. Integers that a float64 cannot represent exactly,
+                above 2**53, are therefore not preserved.
+            y (pd.DataFrame): The targets, or None.
+        """
+        features = [col for col in x.columns if col != 'id']
+        values = x[features]
+        dtype = np.result_type(*values.dtypes) if features else np.float64
+        if not np.issubdtype(dtype, np.number):
+            raise TypeError(f"The features must be numeric, got {dtype}.")
+        return cls(values.to_numpy(dtype=dtype),
+                   y=y.to_numpy() if y is not None else None,
+                   ids=x['id'].to_numpy() if 'id' in x.columns else None,
+                   dates=x.index if isinstance(x.index, pd.DatetimeIndex) else None,
+                   feature_names=features,
+                   target_names=list(y.columns) if y is not None else None,
+                   columns=list(x.columns),
+                   feature_dtypes=list(values.dtypes))
+
+    def _set_views(self):
+        self.x = self.y = self.ids = self.dates = None
+        for name, (offset, shape, dtype) in self._state['layout'].items():
+            view = np.ndarray(shape, dtype=dtype, buffer=self._shm.buf, offset=offset)
+            view.flags.writeable = False
+            setattr(self, name, view)
+        self.subject_ids = self._state['subject_ids']
+        self.feature_names = self._state['feature_names']
+        self.target_names = self._state['target_names']
+
+    def __getstate__(self):
+        return self._state
+
+    def __setstate__(self, state):
+        self._state = state
+        self._shm = shared_memory.SharedMemory(name=state['name'])
+        self._finalizer = weakref.finalize(self, _release, self._shm, False)
+        self._set_views()
+
+    def __len__(self):
+        return len(self.x)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Detaches from the segment, and removes it if this process created the dataset. The arrays must not be used
+        afterwards.
+        """
+        for name in ARRAYS:
+            setattr(self, name, None)
+        self._finalizer()
+
+    def get_subject_rows(self):
+        """
+        Returns the positions of the rows of each subject, in the order that the subjects first appear.
+        """
+        if self.ids is None:
+            return {}
+        order = np.argsort(self.ids, kind='stable')
+        starts = np.searchsorted(self.ids[order], np.arange(len(self.subject_ids) + 1))
+        return {subject_id: order[starts[code]:starts[code + 1]] for code, subject_id in enumerate(self.subject_ids)}
+
+    def get_dates(self, rows=None):
+        """
+        Returns the dates of the given rows, or of all rows, as a DatetimeIndex.
+        """
+        if self.dates is None:
+            return None
+        timestamps = self.dates if rows is None else self.dates[rows]
+        dates = pd.DatetimeIndex(timestamps.view('datetime64[ns]'), name=self._state['index_name'])
+        dates = dates.as_unit(self._state['index_unit'])
+        if self._state['timezone'] is not None:
+            dates = dates.tz_localize('UTC').tz_convert(self._state['timezone'])
+        return dates
+
+    def to_frame(self, rows=None):
+        """
+        Returns the features and targets of the given rows, or of all rows, as DataFrames like the ones that
+        `from_frame` was created from, for features of shape (samples, features). All rows are returned without
+        copying the targets and the features that have the common type.
+
+        Returns:
+            tuple: The features with `id`, and the targets or None.
+        """
+        rows = slice(None) if rows is None else rows
+        index = self.get_dates(rows)
+        feature_names = self.feature_names or [f'feature_{i}' for i in range(self.x.shape[1])]
+        x = pd.DataFrame(self.x[rows], columns=feature_names, index=index, copy=False)
+        if self._state['feature_dtypes'] is not None:
+            # The features that were stored with the common type get the type of their column back
+            converted_dtypes = {name: dtype for name, dtype in zip(feature_names, self._state['feature_dtypes'])
+                                if np.dtype(dtype) != self.x.dtype}
+            if converted_dtypes:
+                x = x.astype(converted_dtypes)
+        if self.ids is not None:
+            x['id'] = pd.Index(self.subject_ids)[self.ids[rows]]
+            x = x[self._state['columns'] or feature_names + ['id']]
+
+        y = None
+        if self.y is not None:
+            y = pd.DataFrame(self.y[rows], columns=self.target_names, index=index, copy=False)
+        return x, y
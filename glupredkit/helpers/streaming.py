@@ -0,0 +1,203 @@
+"""
+Streaming inference for trained models, for real-time use where one new sample arrives every five minutes.
+
+`process_data(..., real_time=True)` builds the features of every row in the history to predict the newest one. The
+`StreamingPredictor` instead keeps the last samples of each subject in a ring buffer, and builds the model input of the
+newest sample from the buffer, so that the cost of each sample does not grow with the history. The model inputs are
+identical to the rows that `process_data` of `glupredkit.helpers.scikit_learn` and `glupredkit.helpers.tf_keras` gives
+for the same samples.
+"""
+import numpy as np
+import pandas as pd
+from glupredkit.helpers import scikit_learn, tf_keras
+from glupredkit.helpers.model_config_manager import ModelConfigurationManager
+
+TABULAR, SEQUENCE = 'tabular', 'sequence'
+
+
+def get_input_layout(model):
+    """
+    Returns whether a model takes the lagged feature rows of `glupredkit.helpers.scikit_learn` or the sequences of
+    `glupredkit.helpers.tf_keras`, from the helper that its `process_data` method delegates to.
+    """
+    process_data = getattr(model.process_data, '__func__', model.process_data)
+    helper = process_data.__globals__.get('process_data') if 'process_data' in process_data.__code__.co_names else None
+    if helper is scikit_learn.process_data:
+        return TABULAR
+    if helper is tf_keras.process_data:
+        return SEQUENCE
+    raise ValueError(f"Streaming is only supported for models that process data with glupredkit.helpers.scikit_learn "
+                     f"or glupredkit.helpers.tf_keras, not {type(model).__module__}.")
+
+
+class RingBuffer:
+    """
+    The last `capacity` rows of a subject, where each new row overwrites the oldest one.
+    """
+    def __init__(self, capacity, n_columns):
+        self.values = np.full((capacity, n_columns), np.nan)
+        self.position = 0
+        self.count = 0
+
+    def append(self, row):
+        self.values[self.position] = row
+        self.position = (self.position + 1) % len(self.values)
+        self.count += 1
+
+    def get_rows(self, lags):
+        """
+        Returns the rows that were appended `lags` rows before the newest one, where lag 0 is the newest row. Rows
+        before the first appended row are NaN.
+        """
+        lags = np.asarray(lags)
+        rows = self.values[(self.position - 1 - lags) % len(self.values)]
+        rows[lags >= self.count] = np.nan
+        return rows
+
+
+class StreamingPredictor:
+    """
+    Predicts with a trained model from one new preprocessed sample at a time.
+
+    Args:
+        model (BaseModel): The trained model. Its `process_data` must delegate to `glupredkit.helpers.scikit_learn` or
+            `glupredkit.helpers.tf_keras`.
+        model_config_manager (ModelConfigurationManager): The configuration that the model was trained with.
+        columns (list): The columns of the preprocessed data without targets, in the order of the training data, like
+            ['CGM', 'carbs', 'id']. If None, the columns of the first sample are used.
+    """
+    def __init__(self, model, model_config_manager: ModelConfigurationManager, columns=None):
+        self.model = model
+        self.layout = get_input_layout(model)
+        self.num_features = model_config_manager.get_num_features()
+        self.num_lagged_features = model_config_manager.get_num_lagged_features()
+        self.what_if_features = model_config_manager.get_what_if_features()
+        self.prediction_horizon = model_config_manager.get_prediction_horizon()
+        self.n_what_if = self.prediction_horizon // 5
+        self.buffers = {}
+        self.last_samples = {}
+        self.columns = None
+        if columns is not None:
+            self._set_columns(columns)
+
+    def _set_columns(self, columns):
+        self.columns = [col for col in columns if not col.startswith('target') and col != 'imputed']
+        if self.layout == TABULAR:
+            self.feature_names = scikit_learn.get_feature_names(self.num_features, self.num_lagged_features,
+                                                                self.what_if_features, self.prediction_horizon)
+            # The lagged values of the numerical features
+            self.buffer_columns = self.num_features
+            self.capacity = self.num_lagged_features + 1
+        else:
+            self.feature_names = tf_keras.get_sequence_columns(pd.DataFrame(columns=self.columns), pd.DataFrame())
+            # The sequence columns of the samples in the window, followed by whether any input column was missing and
+            # whether the sample was imputed
+            self.buffer_columns = self.feature_names
+            self.capacity = self.num_lagged_features
+
+    def reset(self, subject_id=None):
+        """
+        Removes the samples of a subject, or of all subjects if subject_id is None.
+        """
+        if subject_id is None:
+            self.buffers = {}
+            self.last_samples = {}
+        else:
+            self.buffers.pop(subject_id, None)
+            self.last_samples.pop(subject_id, None)
+
+    def add_sample(self, sample):
+        """
+        Adds the newest sample of a subject.
+
+        Args:
+            sample (dict or pd.Series): The preprocessed values of the sample, including `id`. Samples where `imputed`
+                is true are skipped, like in `process_data`.
+
+        Returns:
+            bool: Whether the sample was added.
+        """
+        if self.columns is None:
+            self._set_columns(list(sample.keys()))
+        if self.layout == TABULAR and sample.get('imputed', False):
+            return False
+
+        subject_id = sample['id']
+        if subject_id not in self.buffers:
+            self.buffers[subject_id] = RingBuffer(self.capacity, len(self.buffer_columns) + 2)
+        row = [float(sample[col]) for col in self.buffer_columns]
+        row += [float(any(pd.isna(sample[col]) for col in self.columns)), float(sample.get('imputed', False))]
+        self.buffers[subject_id].append(row)
+        self.last_samples[subject_id] = sample
+        return True
+
+    def get_model_input(self, subject_id, date=None, what_if=None):
+        """
+        Returns the model input for the newest sample of a subject, or None if there are not enough valid samples yet.
+
+        Args:
+            subject_id: The subject.
+            date (pd.Timestamp): The date of the newest sample, used as the index of the input.
+            what_if (dict): The planned values of the "what if" features for each five minutes in the prediction
+                horizon, like {'carbs': [0, 0, 30, ...]}. Features and values that are not given are missing.
+
+        Returns:
+            pd.DataFrame or SequenceDataset: One row of model input, like a row of `process_data`.
+        """
+        buffer = self.buffers.get(subject_id)
+        if buffer is None:
+            return None
+        what_if_values = np.full((len(self.what_if_features), self.n_what_if), np.nan)
+        for i, col in enumerate(self.what_if_features):
+            if what_if and col in what_if:
+                values = np.asarray(what_if[col], dtype=float)[:self.n_what_if]
+                what_if_values[i, :len(values)] = values
+
+        if self.layout == TABULAR:
+            return self._get_feature_row(buffer, subject_id, date, what_if_values)
+        return self._get_sequence(buffer, date, what_if_values)
+
+    def _get_feature_row(self, buffer, subject_id, date, what_if_values):
+        # Lags of each feature in order (CGM_5, CGM_10, ..., insulin_5, ...), like build_feature_matrix
+        lagged = buffer.get_rows(np.arange(1, self.num_lagged_features + 1))[:, :len(self.num_features)]
+        features = np.concatenate([lagged.T.ravel(), what_if_values.ravel()])
+        sample = self.last_samples[subject_id]
+        values = [sample[col] for col in self.columns]
+        if np.isnan(features).any() or any(pd.isna(value) for value in values):
+            return None
+        index = pd.DatetimeIndex([date], name='date') if date is not None else None
+        return pd.DataFrame([values + features.tolist()], columns=self.columns + self.feature_names, index=index)
+
+    def _get_sequence(self, buffer, date, what_if_values):
+        if buffer.count < self.capacity:
+            return None
+        window = buffer.get_rows(np.arange(self.capacity - 1, -1, -1))
+        n_sequence_columns = len(self.feature_names)
+        # Windows with a missing value, or where the newest sample was imputed, are skipped like in prepare_sequences
+        if window[:, n_sequence_columns].any() or window[-1, n_sequence_columns + 1]:
+            return None
+
+        # "What if" columns extend into the prediction horizon, the other columns are padded with -1
+        future = np.full((self.n_what_if, n_sequence_columns), -1.0)
+        for i, col in enumerate(self.what_if_features):
+            if col in self.feature_names:
+                future[:, self.feature_names.index(col)] = what_if_values[i]
+        if np.isnan(future).any():
+            return None
+        sequence = np.concatenate([window[:, :n_sequence_columns], future])
+        return tf_keras.SequenceDataset(sequences=sequence[np.newaxis], dates=[date],
+                                        feature_names=self.feature_names)
+
+    def predict(self, sample, date=None, what_if=None):
+        """
+        Adds the newest sample of a subject and predicts from it.
+
+        Returns:
+            list: The predicted trajectory, or None if there are not enough valid samples to predict.
+        """
+        if not self.add_sample(sample):
+            return None
+        model_input = self.get_model_input(sample['id'], date, what_if)
+        if model_input is None:
+            return None
+        return list(self.model.predict(model_input)[0])
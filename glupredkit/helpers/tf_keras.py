@@ -1,70 +1,170 @@
+import os
 import pandas as pd
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 from glupredkit.helpers.model_config_manager import ModelConfigurationManager
 
 
+def get_sequence_columns(df_X, df_y):
+    exclude_list = list(df_y.columns) + ["imputed", "iob", "cob", "carbs"]
+    return [item for item in df_X.columns if item not in exclude_list]
+
+
 def prepare_sequences(df_X, df_y, window_size, what_if_columns, prediction_horizon, real_time, step_size=1):
-    X, y, dates = [], [], []
-    target_columns = df_y.columns
-    exclude_list = list(target_columns) + ["imputed", "iob", "cob", "carbs"]
-    sequence_columns = [item for item in df_X.columns if item not in exclude_list]
+    sequence_columns = get_sequence_columns(df_X, df_y)
     n_what_if = prediction_horizon // 5
+    sequence_length = window_size + n_what_if
 
     print("Preparing sequences...")
 
-    for i in range(0, len(df_X) - window_size - n_what_if, step_size):
-        label = df_y.iloc[i + window_size - 1]
-
-        if df_X.iloc[i:i + window_size + n_what_if].isnull().any().any():
-            continue  # Skip this sequence if there are NaN values in the input data
-
-        if 'imputed' in df_X.columns:
-            imputed = df_X['imputed'].iloc[i + window_size - 1]
-            if imputed:
-                continue  # Skip this sequence
-
-        if not real_time:
-            if pd.isna(label).any():
-                continue  # Skip this sequence
-
-        # sequence = df_X[sequence_columns][i:i + window_size]
-        date = df_y.index[i + window_size - 1]
-
-        # Initialize an empty DataFrame for mixed_sequence with the same columns as sequence
-        mixed_sequence = pd.DataFrame(index=df_X[i:i + window_size + n_what_if].index, columns=sequence_columns).iloc[0:window_size + n_what_if]
-
-        for col in sequence_columns:
-            if col in what_if_columns:
-                # For "what if" columns, extend the sequence
-                mixed_sequence[col] = df_X[col][i:i + window_size + n_what_if]
-            else:
-                # Slice the original window size for other columns
-                original_sequence = df_X[col][i:i + window_size]
-                # Create a padding series with -1 values and the appropriate date index
-                padding_index = df_X.index[i + window_size:i + window_size + n_what_if]
-                padding_series = pd.Series([-1] * n_what_if, index=padding_index)
-                # Concatenate the original sequence with the padding series
-                full_sequence = pd.concat([original_sequence, padding_series])
-                mixed_sequence[col] = full_sequence
-
-        X.append(mixed_sequence)
-        y.append(label.values.tolist())
-        dates.append(date)
-
-    return np.array(X), np.array(y), dates
-
-
-def create_dataframe(sequences, targets, dates):
-    # Convert sequences to lists
-    sequences_as_strings = [str(list(map(list, seq))) for seq in sequences]
-    targets_as_strings = [','.join(map(str, target)) for target in targets]
-
-    dataset_df = pd.DataFrame({
-        'date': dates,
-        'sequence': sequences_as_strings,  # sequences_as_lists
-        'target': targets_as_strings
-    })
-    return dataset_df.set_index('date')
+    # Start index of each window, and the index of the last measured sample in the window
+    starts = np.arange(0, max(len(df_X) - sequence_length, 0), step_size)
+    last_indices = starts + window_size - 1
+    labels = df_y.to_numpy(dtype=float)[last_indices]
+
+    # Skip sequences with NaN values in the input data, counted over each window using a cumulative sum
+    nan_counts = np.concatenate([[0], np.cumsum(df_X.isnull().to_numpy().any(axis=1))])
+    is_valid = nan_counts[starts + sequence_length] == nan_counts[starts]
+
+    if 'imputed' in df_X.columns:
+        is_valid &= df_X['imputed'].to_numpy(dtype=float)[last_indices] == 0
+
+    if not real_time:
+        is_valid &= ~np.isnan(labels).any(axis=1)
+
+    starts = starts[is_valid]
+    dates = list(df_y.index[last_indices[is_valid]])
+
+    if len(starts) == 0:
+        return np.empty((0, sequence_length, len(sequence_columns))), np.empty((0, df_y.shape[1])), dates
+
+    # Windows of shape (samples, sequence_length, features)
+    values = df_X[sequence_columns].to_numpy(dtype=float)
+    X = sliding_window_view(values, sequence_length, axis=0)[starts].transpose(0, 2, 1)
+
+    # "What if" columns extend into the prediction horizon, the other columns are padded with -1
+    padded_columns = [i for i, col in enumerate(sequence_columns) if col not in what_if_columns]
+    X[:, window_size:, padded_columns] = -1
+
+    return X, labels[is_valid], dates
+
+
+class SequenceDataset:
+    """
+    Container for sliding-window datasets used by the sequence (tf_keras/pytorch) models.
+
+    The input windows are stored as one contiguous float32 array of shape (samples, window, features) and the targets
+    as a float32 array of shape (samples, outputs), indexed by the date of the last measured sample in each window.
+    The container supports the small part of the DataFrame interface that the CLI uses (`columns`, `drop`, column
+    lookup and row slicing), so `dataset['sequence']` and `dataset['target']` return NumPy arrays directly.
+    """
+    SEQUENCE = 'sequence'
+    TARGET = 'target'
+
+    def __init__(self, sequences=None, targets=None, dates=None, feature_names=None):
+        self.sequences = None if sequences is None else np.ascontiguousarray(sequences, dtype=np.float32)
+        self.targets = None if targets is None else np.ascontiguousarray(targets, dtype=np.float32)
+        self.index = pd.DatetimeIndex(dates if dates is not None else [], name='date')
+        self.feature_names = list(feature_names) if feature_names is not None else []
+
+        for values in [self.sequences, self.targets]:
+            if values is not None and len(values) != len(self.index):
+                raise ValueError(f"Expected {len(self.index)} samples, got {len(values)}.")
+
+    @property
+    def columns(self):
+        columns = []
+        if self.sequences is not None:
+            columns += [self.SEQUENCE]
+        if self.targets is not None:
+            columns += [self.TARGET]
+        return pd.Index(columns)
+
+    @property
+    def shape(self):
+        return len(self.index), len(self.columns)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        return iter(self.columns)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            if key == self.SEQUENCE and self.sequences is not None:
+                return self.sequences
+            if key == self.TARGET and self.targets is not None:
+                return self.targets
+            raise KeyError(key)
+        if isinstance(key, (list, pd.Index)) and all(isinstance(col, str) for col in key):
+            missing = [col for col in key if col not in self.columns]
+            if missing:
+                raise KeyError(missing)
+            return self._subset(self.SEQUENCE in key, self.TARGET in key, slice(None))
+        return self._subset(True, True, key)
+
+    @property
+    def iloc(self):
+        return _SequenceDatasetIndexer(self)
+
+    def drop(self, labels=None, axis=1, columns=None):
+        labels = columns if columns is not None else labels
+        labels = [labels] if isinstance(labels, str) else list(labels)
+        return self[[col for col in self.columns if col not in labels]]
+
+    def _subset(self, keep_sequences, keep_targets, rows):
+        if isinstance(rows, pd.Series):
+            rows = rows.to_numpy()
+        return SequenceDataset(sequences=self.sequences[rows] if keep_sequences and self.sequences is not None else None,
+                               targets=self.targets[rows] if keep_targets and self.targets is not None else None,
+                               dates=self.index[rows], feature_names=self.feature_names)
+
+    def save(self, path, mmap=False):
+        """
+        Stores the dataset on disk. By default, a single uncompressed `.npz` file is written. With `mmap=True`, `path`
+        is a directory with one `.npy` file per array, which `load` can memory-map instead of reading into memory.
+        """
+        tz = '' if self.index.tz is None else str(self.index.tz)
+        dates = self.index.tz_convert('UTC').tz_localize(None) if tz else self.index
+        arrays = {'dates': dates.to_numpy(dtype='datetime64[ns]'), 'tz': np.array(tz),
+                  'feature_names': np.array(self.feature_names, dtype=str)}
+        if self.sequences is not None:
+            arrays['sequences'] = self.sequences
+        if self.targets is not None:
+            arrays['targets'] = self.targets
+
+        if mmap:
+            os.makedirs(path, exist_ok=True)
+            for name, values in arrays.items():
+                np.save(os.path.join(path, f'{name}.npy'), values)
+        else:
+            np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path, mmap=False):
+        if os.path.isdir(path):
+            mmap_mode = 'r' if mmap else None
+            arrays = {os.path.splitext(file_name)[0]: np.load(os.path.join(path, file_name), mmap_mode=mmap_mode)
+                      for file_name in os.listdir(path) if file_name.endswith('.npy')}
+        else:
+            with np.load(path) as npz_file:
+                arrays = {name: npz_file[name] for name in npz_file.files}
+
+        dates = pd.DatetimeIndex(np.asarray(arrays['dates']))
+        tz = str(arrays['tz'])
+        if tz:
+            dates = dates.tz_localize('UTC').tz_convert(tz)
+        return cls(sequences=arrays.get('sequences'), targets=arrays.get('targets'), dates=dates,
+                   feature_names=arrays['feature_names'].tolist())
+
+
+class _SequenceDatasetIndexer:
+    def __init__(self, dataset):
+        self.dataset = dataset
+
+    def __getitem__(self, rows):
+        return self.dataset._subset(True, True, rows)
 
 
 def process_data(df, model_config_manager: ModelConfigurationManager, real_time=False):
@@ -77,8 +177,49 @@ def process_data(df, model_config_manager: ModelConfigurationManager, real_time=
                                                   prediction_horizon=model_config_manager.get_prediction_horizon(),
                                                   real_time=real_time)
 
-    # Store as a dataframe with two columns: targets and sequences
-    df = create_dataframe(sequences, targets, dates)
-
-    return df
-
+    # Store as a dataset with contiguous sequence and target arrays
+    return SequenceDataset(sequences=sequences, targets=targets, dates=dates,
+                           feature_names=get_sequence_columns(df_X, df_y))
+
+
+class KerasPredictor:
+    """
+    A Keras model that is loaded once, with a compiled predict function.
+
+    `model.predict` builds a new prediction loop and dataset on every call, which dominates the run time for small
+    batches like a single real-time sample. The compiled function is traced once for the input shapes of the model,
+    and large inputs are predicted in batches of `batch_size` samples.
+    """
+    def __init__(self, model, batch_size=1024):
+        import tensorflow as tf
+
+        self.model = model
+        self.batch_size = batch_size
+        specs = [tf.TensorSpec(tensor.shape, tf.float32) for tensor in (getattr(model, 'inputs', None) or [])]
+        if specs:
+            input_signature = [specs] if len(specs) > 1 else specs
+            self.predict_function = tf.function(lambda inputs: model(inputs, training=False),
+                                                input_signature=input_signature)
+        else:
+            self.predict_function = tf.function(lambda inputs: model(inputs, training=False), reduce_retracing=True)
+
+    @classmethod
+    def load(cls, model_path):
+        import tensorflow as tf
+
+        model = tf.keras.models.load_model(model_path, custom_objects={"Adam": tf.keras.optimizers.legacy.Adam})
+        return cls(model)
+
+    def predict(self, inputs):
+        """
+        Returns the predictions of the model as an array, for an input array or a list of input arrays.
+        """
+        is_list = isinstance(inputs, (list, tuple))
+        inputs = [np.asarray(values, dtype=np.float32) for values in (inputs if is_list else [inputs])]
+        predictions = []
+        for start in range(0, len(inputs[0]), self.batch_size):
+            batch = [values[start:start + self.batch_size] for values in inputs]
+            predictions += [self.predict_function(batch if is_list else batch[0]).numpy()]
+        if not predictions:
+            return np.empty((0,) + tuple(self.model.outputs[0].shape[1:]), dtype=np.float32)
+        return np.concatenate(predictions)
@@ -30,5 +30,31 @@ class BaseMetric(ABC):
     def _calculate_metric(self, y_true: List[float], y_pred: List[float], *args, **kwargs) -> any:
         raise NotImplementedError("Metric not implemented!")
 
+    def calculate_matrix(self, y_true, y_pred, prediction_horizons: List[int]) -> List[any]:
+        """
+        Calculates the metric for all prediction horizons at once.
+
+        Args:
+            y_true (array-like): Measured values with shape (samples, horizons).
+            y_pred (array-like): Predicted values with shape (samples, horizons).
+            prediction_horizons (list of int): The prediction horizon in minutes of each column.
+
+        Returns:
+            list: The metric of each prediction horizon.
+        """
+        y_true = np.asarray(y_true, dtype=float)
+        y_pred = np.asarray(y_pred, dtype=float)
+        if y_true.shape != y_pred.shape or y_true.ndim != 2 or y_true.shape[1] != len(prediction_horizons):
+            raise ValueError("y_true and y_pred must have the same shape, with one column per prediction horizon")
+
+        return list(self._calculate_metric_matrix(y_true, y_pred, prediction_horizons))
+
+    def _calculate_metric_matrix(self, y_true: np.ndarray, y_pred: np.ndarray, prediction_horizons: List[int]):
+        # By default, _calculate_metric is called with the list of values of each prediction horizon in turn. Metrics
+        # can override this method with a vectorized implementation for all prediction horizons, which gives the same
+        # sums as this loop when it reduces over the rows of the transposed, contiguous matrices.
+        return [self._calculate_metric(y_true[:, i].tolist(), y_pred[:, i].tolist(), prediction_horizon=minutes)
+                for i, minutes in enumerate(prediction_horizons)]
+
     def __repr__(self):
         return self.name
@@ -13,7 +13,7 @@ class Metric(BaseMetric):
         y_true = np.array(y_true)
         y_pred = np.array(y_pred)
 
-        pen = [penalty(true_val, pred_val) for true_val, pred_val in zip(y_true, y_pred)]
+        pen = penalty(y_true, y_pred)
         se = np.square(y_true - y_pred)
         gMSE = np.nanmean(se * pen)
         gRMSE = np.sqrt(gMSE)
@@ -23,34 +23,46 @@ class Metric(BaseMetric):
         else:
             return unit_config_manager.convert_value(gRMSE)
 
+    def _calculate_metric_matrix(self, y_true, y_pred, prediction_horizons):
+        y_true = np.ascontiguousarray(y_true.T)
+        y_pred = np.ascontiguousarray(y_pred.T)
+
+        se = np.square(y_true - y_pred)
+        gMSE = np.nanmean(se * penalty(y_true, y_pred), axis=1)
+        gRMSE = np.sqrt(gMSE)
+
+        if unit_config_manager.use_mgdl:
+            return gRMSE
+        else:
+            return unit_config_manager.convert_value(gRMSE)
+
 
 def sigmoid(x, a, epsilon):
-    # The xi function is defined wrongly in the paper, with 2 / epsilon in the end
-    xi = (2 / epsilon) * (x - a - (epsilon / 2))
-    if x <= a:
-        return 0
-    elif a < x <= a + (epsilon / 2):
-        return -0.5 * xi ** 4 - xi ** 3 + xi + 0.5
-    elif a + (epsilon / 2) < x <= a + epsilon:
-        return 0.5 * xi ** 4 - xi ** 3 + xi + 0.5
-    else:  # x > a + epsilon
-        return 1
+    # x and a can be scalars or arrays. The polynomial is only evaluated for the values in the transition bands.
+    x, a = np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(a, dtype=float))
+    result = np.where(x <= a, 0.0, 1.0)  # 1 for x > a + epsilon
+    for sign, band in [(-0.5, (a < x) & (x <= a + (epsilon / 2))),
+                       (0.5, (a + (epsilon / 2) < x) & (x <= a + epsilon))]:
+        # The xi function is defined wrongly in the paper, with 2 / epsilon in the end
+        xi = (2 / epsilon) * (x[band] - a[band] - (epsilon / 2))
+        result[band] = sign * xi ** 4 - xi ** 3 + xi + 0.5
+    return result
 
 
 def sigmoid_hat(x, a, epsilon):
-    # The xi function is defined wrongly in the paper, with 2 / epsilon in the end
-    xi_hat = - (2 / epsilon) * (x - a + (epsilon / 2))
-    if x <= a - epsilon:
-        return 1
-    elif a - epsilon < x <= a - (epsilon / 2):
-        return 0.5 * xi_hat ** 4 - xi_hat ** 3 + xi_hat + 0.5
-    elif a - (epsilon / 2) < x <= a:
-        return -0.5 * xi_hat ** 4 - xi_hat ** 3 + xi_hat + 0.5
-    else:  # a <= x
-        return 0
+    # x and a can be scalars or arrays. The polynomial is only evaluated for the values in the transition bands.
+    x, a = np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(a, dtype=float))
+    result = np.where(x <= a - epsilon, 1.0, 0.0)  # 0 for a <= x
+    for sign, band in [(0.5, (a - epsilon < x) & (x <= a - (epsilon / 2))),
+                       (-0.5, (a - (epsilon / 2) < x) & (x <= a))]:
+        # The xi function is defined wrongly in the paper, with 2 / epsilon in the end
+        xi_hat = - (2 / epsilon) * (x[band] - a[band] + (epsilon / 2))
+        result[band] = sign * xi_hat ** 4 - xi_hat ** 3 + xi_hat + 0.5
+    return result
 
 
 def penalty(g, g_hat):
+    # g and g_hat can be scalars or arrays of the same shape
     # Constants from the table
     alpha_L = 1.5
     alpha_H = 1
@@ -72,7 +84,6 @@ def penalty(g, g_hat):
     return pen
 
 
-"""
 def plot_penalty():
     # Create a grid for g and g_hat
     g_values = np.linspace(0, 400, 400)
@@ -80,7 +91,7 @@ def plot_penalty():
     g_grid, g_hat_grid = np.meshgrid(g_values, g_hat_values)
 
     # Compute the penalty over the grid
-    penalty_values = np.vectorize(penalty)(g_grid, g_hat_grid)
+    penalty_values = penalty(g_grid, g_hat_grid)
 
     # Define a custom color map
     colors = [(0, 1, 0), (1, 1, 0), (1, 0.5, 0), (1, 0, 0)]  # Green -> Yellow -> Orange -> Red
@@ -102,7 +113,7 @@ def plot_penalty():
 def plot_sigmoid(a, epsilon):
     # Create a grid for g and g_hat
     x_values = np.linspace(0, 400, 400)
-    sigmoid_values = [sigmoid(x, a, epsilon) for x in x_values]
+    sigmoid_values = sigmoid(x_values, a, epsilon)
 
     plt.figure(figsize=(10, 5))
     plt.plot(x_values, sigmoid_values, label='Sigmoid Function')
@@ -116,7 +127,7 @@ def plot_sigmoid(a, epsilon):
 def plot_sigmoid_hat(a, epsilon):
     # Create a grid for g and g_hat
     x_values = np.linspace(0, 400, 400)
-    sigmoid_values = [sigmoid_hat(x, a, epsilon) for x in x_values]
+    sigmoid_values = sigmoid_hat(x_values, a, epsilon)
 
     plt.figure(figsize=(10, 5))
     plt.plot(x_values, sigmoid_values, label='Sigmoid Function')
@@ -125,4 +136,3 @@ def plot_sigmoid_hat(a, epsilon):
     plt.ylabel('Sigmoid(x)')
     plt.legend()
     plt.show()
-"""
@@ -16,4 +16,13 @@ class Metric(BaseMetric):
         if unit_config_manager.use_mgdl:
             return mae
         else:
-            return unit_config_manager.convert_value(mae)
\ No newline at end of file
+            return unit_config_manager.convert_value(mae)
+
+    def _calculate_metric_matrix(self, y_true, y_pred, prediction_horizons):
+        absolute_errors = np.ascontiguousarray(np.abs(y_true - y_pred).T)
+
+        mae = np.nanmean(absolute_errors, axis=1)
+        if unit_config_manager.use_mgdl:
+            return mae
+        else:
+            return unit_config_manager.convert_value(mae)
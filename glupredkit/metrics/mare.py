@@ -14,3 +14,11 @@ class Metric(BaseMetric):
         mare = mare * 100
 
         return mare
+
+    def _calculate_metric_matrix(self, y_true, y_pred, prediction_horizons):
+        relative_errors = np.ascontiguousarray(np.abs((y_true - y_pred) / y_true).T)
+
+        mare = np.nanmean(relative_errors, axis=1)
+        mare = mare * 100
+
+        return mare
@@ -3,6 +3,7 @@ Matthews Correlation Coefficient (MCC).
 """
 from .base_metric import BaseMetric
 from sklearn.metrics import matthews_corrcoef
+import numpy as np
 
 
 class Metric(BaseMetric):
@@ -18,3 +19,27 @@ class Metric(BaseMetric):
         mcc = matthews_corrcoef(y_true, y_pred)
 
         return mcc
+
+    def _calculate_metric_matrix(self, y_true, y_pred, prediction_horizons):
+        hyper_threshold = 180
+
+        return matthews_corrcoef_matrix(y_true > hyper_threshold, y_pred > hyper_threshold)
+
+
+def matthews_corrcoef_matrix(y_true, y_pred):
+    """
+    Computes sklearn.metrics.matthews_corrcoef of each column of two boolean matrices, with the same formula.
+    """
+    n_samples = float(y_true.shape[0])
+    n_correct = np.sum(y_true == y_pred, axis=0, dtype=np.float64)
+    t_sum = np.stack([np.sum(~y_true, axis=0, dtype=np.float64), np.sum(y_true, axis=0, dtype=np.float64)])
+    p_sum = np.stack([np.sum(~y_pred, axis=0, dtype=np.float64), np.sum(y_pred, axis=0, dtype=np.float64)])
+
+    cov_ytyp = n_correct * n_samples - np.sum(t_sum * p_sum, axis=0)
+    cov_ypyp = n_samples ** 2 - np.sum(p_sum * p_sum, axis=0)
+    cov_ytyt = n_samples ** 2 - np.sum(t_sum * t_sum, axis=0)
+
+    cov_ypyp_ytyt = cov_ypyp * cov_ytyt
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mcc = cov_ytyp / np.sqrt(cov_ypyp_ytyt)
+    return [0.0 if cov == 0 else float(value) for cov, value in zip(cov_ypyp_ytyt, mcc)]
@@ -3,6 +3,7 @@ Matthews Correlation Coefficient (MCC).
 """
 from .base_metric import BaseMetric
 from sklearn.metrics import matthews_corrcoef
+from .mcc_hyper import matthews_corrcoef_matrix
 
 
 class Metric(BaseMetric):
@@ -18,3 +19,8 @@ class Metric(BaseMetric):
         mcc = matthews_corrcoef(y_true, y_pred)
 
         return mcc
+
+    def _calculate_metric_matrix(self, y_true, y_pred, prediction_horizons):
+        hypo_threshold = 70
+
+        return matthews_corrcoef_matrix(y_true < hypo_threshold, y_pred < hypo_threshold)
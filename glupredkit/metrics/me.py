@@ -17,3 +17,12 @@ class Metric(BaseMetric):
             return me
         else:
             return unit_config_manager.convert_value(me)
+
+    def _calculate_metric_matrix(self, y_true, y_pred, prediction_horizons):
+        errors = np.ascontiguousarray((y_pred - y_true).T)
+
+        me = np.nanmean(errors, axis=1)
+        if unit_config_manager.use_mgdl:
+            return me
+        else:
+            return unit_config_manager.convert_value(me)
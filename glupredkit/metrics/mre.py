@@ -13,3 +13,10 @@ class Metric(BaseMetric):
         mre = np.nanmean((y_pred - y_true) / y_true)
 
         return mre
+
+    def _calculate_metric_matrix(self, y_true, y_pred, prediction_horizons):
+        relative_errors = np.ascontiguousarray(((y_pred - y_true) / y_true).T)
+
+        mre = np.nanmean(relative_errors, axis=1)
+
+        return mre
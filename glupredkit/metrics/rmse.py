@@ -16,3 +16,12 @@ class Metric(BaseMetric):
             return rmse
         else:
             return unit_config_manager.convert_value(rmse)
+
+    def _calculate_metric_matrix(self, y_true, y_pred, prediction_horizons):
+        squared_errors = np.ascontiguousarray(np.square(y_true - y_pred).T)
+
+        rmse = np.sqrt(np.nanmean(squared_errors, axis=1))
+        if unit_config_manager.use_mgdl:
+            return rmse
+        else:
+            return unit_config_manager.convert_value(rmse)
@@ -16,6 +16,7 @@ LoopV2 = safe_import(".loop_v2", "Model")
 LSTM = safe_import(".lstm", "Model")
 MTL = safe_import(".mtl", "Model")
 NaiveLinearRegressor = safe_import(".naive_linear_regressor", "Model")
+PerSubjectModel = safe_import(".per_subject", "PerSubjectModel")
 RandomForest = safe_import(".random_forest", "Model")
 Ridge = safe_import(".ridge", "Model")
 StackedPLSR = safe_import(".stacked_plsr", "Model")
@@ -25,6 +25,8 @@ class BaseModel(BaseEstimator, TransformerMixin, ABC):
             self: The fitted model instance.
         """
         self.is_fitted = True
+        # A new fit replaces the stored model, so the resident copy of the previous one is stale
+        self.release_resident()
         return self._fit_model(x_train, y_train, *args, **kwargs)
 
     @abstractmethod
@@ -52,6 +54,32 @@ class BaseModel(BaseEstimator, TransformerMixin, ABC):
     def _predict_model(self, x_test):
         raise NotImplementedError("Model has not implemented predict method!")
 
+    def get_resident(self, name, load):
+        """
+        Returns a backend object that is expensive to create, like a deep learning model loaded from disk. It is
+        created with `load` on first use and kept by this instance for the next calls, so that repeated predictions
+        do not load it again. Resident objects are not pickled, and are loaded again after unpickling.
+
+        Args:
+            name (str): The name of the object.
+            load (callable): Function without arguments that creates the object.
+        """
+        resident = self.__dict__.setdefault('_resident', {})
+        if name not in resident:
+            resident[name] = load()
+        return resident[name]
+
+    def release_resident(self):
+        """
+        Releases the resident objects, so that they are loaded again on next use.
+        """
+        self.__dict__.pop('_resident', None)
+
+    def __getstate__(self):
+        state = dict(super().__getstate__())
+        state.pop('_resident', None)
+        return state
+
     def best_params(self):
         # Return the best parameters found by GridSearchCV
         raise NotImplementedError("Model has not implemented best_params method!")
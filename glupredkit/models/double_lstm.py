@@ -2,14 +2,12 @@
 Double lstm, from: https://ieeexplore.ieee.org/document/8856940
 Open code: http://smarthealth.cs.ohio.edu/nih.html
 """
-import numpy as np
 import tensorflow as tf
-import ast
 from datetime import datetime
 from tensorflow.keras.layers import LSTM, Dense, concatenate, Input
 from tensorflow.keras.callbacks import EarlyStopping
 from .base_model import BaseModel
-from glupredkit.helpers.tf_keras import process_data
+from glupredkit.helpers.tf_keras import process_data, KerasPredictor
 
 
 class Model(BaseModel):
@@ -58,11 +56,8 @@ class Model(BaseModel):
         return model
 
     def _fit_model(self, x_train, y_train, epochs=10, *args):
-        sequences = [np.array(ast.literal_eval(seq_str)) for seq_str in x_train['sequence']]
-        targets = [np.array(ast.literal_eval(target_str)) for target_str in y_train['target']]
-
-        sequences = np.array(sequences)
-        targets = np.array(targets)
+        sequences = x_train['sequence']
+        targets = y_train['target']
 
         x_train1 = sequences[:, :, 0:1]  # BGL data, keep the third dimension by using 0:1
         x_train2 = sequences[:, :, 1:]  # all data without BGL data
@@ -80,14 +75,13 @@ class Model(BaseModel):
         return self
 
     def _predict_model(self, x_test):
-        sequences = [np.array(ast.literal_eval(seq_str)) for seq_str in x_test['sequence']]
-        sequences = np.array(sequences)
+        sequences = x_test['sequence']
 
         x_test1 = sequences[:, :, 0:1]
         x_test2 = sequences[:, :, 1:]
         x_test = [x_test1, x_test2]
 
-        model = tf.keras.models.load_model(self.model_path, custom_objects={"Adam": tf.keras.optimizers.legacy.Adam})
+        model = self.get_resident('keras_model', lambda: KerasPredictor.load(self.model_path))
         predictions = model.predict(x_test)
 
         return predictions
@@ -1,10 +1,11 @@
 from glupredkit.models.base_model import BaseModel
 from glupredkit.helpers.scikit_learn import process_data
+from glupredkit.helpers.pyloopkit import SubjectEvents, get_prediction_outputs
+from glupredkit.helpers.grid_search import grid_search
+from functools import partial
 import datetime
 import pandas as pd
 import numpy as np
-from pyloopkit.dose import DoseType
-from pyloopkit.loop_data_manager import update
 
 
 class Model(BaseModel):
@@ -17,7 +18,13 @@ class Model(BaseModel):
         self.insulin_sensitivity_factor = []
         self.carb_ratio = []
 
-    def _fit_model(self, x_train, y_train, n_cross_val_samples=1000, *args):
+    def _fit_model(self, x_train, y_train, n_cross_val_samples=1000, *args, n_workers=1, early_abandon=False):
+        """
+        Finds the insulin sensitivity factor and carbohydrate ratio of each subject with a grid search over factors of
+        the 1800 and 500 rules, using n_workers processes. With early_abandon, the evaluation of a grid point stops as
+        soon as its RMSE is known to be higher than the best so far, which gives the same settings as the exhaustive
+        search.
+        """
         required_columns = ['CGM', 'carbs', 'basal', 'bolus']
         missing_columns = [col for col in required_columns if col not in x_train.columns]
         if missing_columns:
@@ -29,6 +36,8 @@ class Model(BaseModel):
         x_train['insulin'] = x_train['bolus'] + (x_train['basal'] / 12)
         target_col = 'target_' + str(self.prediction_horizon)
 
+        mult_factors = [0.6, 0.7, 0.8, 0.9, 1.0, 1.1, 1.2, 1.3, 1.4]
+        subject_data = {}
         for subject_id in self.subject_ids:
             x_train_filtered = x_train[x_train['id'] == subject_id]
             y_train_filtered = y_train[x_train['id'] == subject_id]
@@ -51,33 +60,48 @@ class Model(BaseModel):
             # basal = daily_avg_insulin * 0.45 / 24  # Basal 45% of TDI
             basal = daily_avg_insulin * 0.45 / 24  # Basal 45% of TDI
 
-            mult_factors = [0.6, 0.7, 0.8, 0.9, 1.0, 1.1, 1.2, 1.3, 1.4]
-            y_true = subset_df_y[target_col]
-            rmse = lambda actual, predicted: np.sqrt(np.mean((np.array(actual) - np.array(predicted)) ** 2))
-
-            best_rmse = np.inf
-            best_isf = isf
-            best_cr = cr
-            for i in mult_factors:
-                for j in mult_factors:
-                    y_pred = self.get_current_predictions(df_subset=subset_df_x,
-                                                          insulin_sensitivity_factor=isf*i,
-                                                          carb_ratio=cr*j, basal=basal)
-                    last_y_pred = [val[-1] for val in y_pred]
-                    print(f'Factors {i} and {j}')
-                    print("RMSE: ", int(rmse(y_true, last_y_pred)))
-                    # print("Distribution difference: ", int(np.std(last_y_pred) - std_target))
-                    if rmse(y_true, last_y_pred) < best_rmse:
-                        best_isf = isf*i
-                        best_cr = cr*j
-                        best_rmse = rmse(y_true, last_y_pred)
-
-            self.insulin_sensitivity_factor += [best_isf]
-            self.carb_ratio += [best_cr]
+            # The events are the same for all the therapy settings in the grid search, so they are only parsed once
+            subject_data[subject_id] = (SubjectEvents(subset_df_x), subset_df_y[target_col].to_numpy(), isf, cr, basal)
+
+        def print_rmse(subject_id, factors, rmse):
+            print(f'Factors {factors[0]} and {factors[1]} for subject {subject_id}')
+            print("RMSE: ", int(rmse) if np.isfinite(rmse) else "abandoned")
+
+        candidates = {subject_id: [(i, j) for i in mult_factors for j in mult_factors]
+                      for subject_id in self.subject_ids}
+        results = grid_search(partial(self.get_therapy_settings_rmse, subject_data), candidates, n_workers=n_workers,
+                              early_abandon=early_abandon, callback=print_rmse)
+
+        for subject_id in self.subject_ids:
+            _, _, isf, cr, _ = subject_data[subject_id]
+            best_factors, _ = results[subject_id]
+            if best_factors is None:
+                best_factors = (1, 1)
+            self.insulin_sensitivity_factor += [isf*best_factors[0]]
+            self.carb_ratio += [cr*best_factors[1]]
 
         print(f"Therapy settings: ISF {self.insulin_sensitivity_factor}, CR: {self.carb_ratio}, basal: {self.basal}")
         return self
 
+    def get_therapy_settings_rmse(self, subject_data, subject_id, factors, max_rmse=np.inf):
+        """
+        Returns the RMSE of the predictions at the prediction horizon for the given factors of the insulin sensitivity
+        factor and carbohydrate ratio of the subject, or np.inf if it exceeds max_rmse.
+        """
+        subject_events, y_true, isf, cr, basal = subject_data[subject_id]
+
+        # The sum of squared errors only grows, so we can stop once it is higher than max_rmse allows
+        max_squared_error = max_rmse ** 2 * len(y_true) * (1 + 1e-9)
+        squared_errors = []
+        squared_error_sum = 0
+        for i, predictions in self.iterate_current_predictions(subject_events, isf*factors[0], cr*factors[1], basal):
+            squared_errors.append((y_true[i] - predictions[-1]) ** 2)
+            squared_error_sum += squared_errors[-1]
+            if squared_error_sum > max_squared_error:
+                return np.inf
+
+        return np.sqrt(np.mean(squared_errors))
+
     def _predict_model(self, x_test):
         """
         Return:
@@ -97,15 +121,12 @@ class Model(BaseModel):
         y_pred = []
 
         for index, subject_id in enumerate(self.subject_ids):
-            df_subset = x_test[x_test['id'] == subject_id]
-            n_predictions = df_subset.shape[0]
+            subject_events = SubjectEvents(x_test[x_test['id'] == subject_id])
+            n_predictions = len(subject_events)
             input_dict = self.get_input_dict(self.insulin_sensitivity_factor[index], self.carb_ratio[index],
                                              self.basal[index][0])
 
-            for i in range(0, n_predictions):
-                current_data = df_subset.iloc[i]
-                output_dict = self.get_prediction_output(current_data, input_dict)
-
+            for i, output_dict in self.iterate_prediction_outputs(subject_events, input_dict):
                 if i % 50 == 0 and i != 0:  # Check if i is a multiple of 50 and not 0
                     print(f"Prediction number {i} of {n_predictions} for {subject_id}")
 
@@ -119,17 +140,21 @@ class Model(BaseModel):
 
         return np.array(y_pred)
 
-    def get_current_predictions(self, df_subset, insulin_sensitivity_factor, carb_ratio, basal):
-        y_pred = []
-        n_predictions = df_subset.shape[0]
+    def get_current_predictions(self, subject_events, insulin_sensitivity_factor, carb_ratio, basal):
+        return [predictions for _, predictions in self.iterate_current_predictions(
+            subject_events, insulin_sensitivity_factor, carb_ratio, basal)]
+
+    def iterate_current_predictions(self, subject_events, insulin_sensitivity_factor, carb_ratio, basal):
+        """
+        Yields the row index and predicted trajectory of each row of the subject events, skipping rows without a
+        complete prediction.
+        """
+        n_predictions = len(subject_events)
         input_dict = self.get_input_dict(insulin_sensitivity_factor, carb_ratio, basal)
         # Note that the prediction output starts at the reference value, so element 1 is the first prediction
         prediction_index = int(self.prediction_horizon / 5)
 
-        for i in range(0, n_predictions):
-            current_data = df_subset.iloc[i]
-            output_dict = self.get_prediction_output(current_data, input_dict)
-
+        for i, output_dict in self.iterate_prediction_outputs(subject_events, input_dict):
             if i % 50 == 0 and i != 0:  # Check if i is a multiple of 50 and not 0
                 print(f"Prediction number {i} of {n_predictions}")
 
@@ -143,152 +168,18 @@ class Model(BaseModel):
                 # TODO: Here we should just repeat the last predicted value until enough predictions
                 continue
             else:
-                current_predictions = output_dict.get("predicted_glucose_values")[1:prediction_index + 1]
-                y_pred.append(current_predictions)
-
-        return y_pred
-
-
-    def get_prediction_output(self, df_row, input_dict, time_to_calculate=None):
-        # Important docs: https://github.com/miriamkw/PyLoopKit/blob/develop/pyloopkit/docs/pyloopkit_documentation.md
-        # For correct predictions, at least 24 hours + duration of insulin absorption (DIA) of data is needed
-        # NOTE: Not filtering away future glucose values will lead to erroneous prediction results!
-        if not time_to_calculate:
-            time_to_calculate = df_row.name
-
-        if isinstance(time_to_calculate, np.int64):
-            time_to_calculate = datetime.datetime.now()
-
-        input_dict["time_to_calculate_at"] = time_to_calculate
-
-        def get_dates_and_values(column, data):
-            relevant_columns = [val for val in data.index if val.startswith(column)]
-            dates = []
-            values = []
-
-            date = data.name
-            if isinstance(date, np.int64):
-                date = datetime.datetime.now()
-
-            for col in relevant_columns:
-                if col == column:
-                    values.append(data[col])
-                    dates.append(date)
-                elif "what_if" in col:
-                    values.append(data[col])
-                    new_date = date + datetime.timedelta(minutes=int(col.split("_")[-1]))
-                    dates.append(new_date)
-                else:
-                    values.append(data[col])
-                    new_date = date - datetime.timedelta(minutes=int(col.split("_")[-1]))
-                    dates.append(new_date)
-
-            if not dates or not values:
-                # Handle the case where one or both lists are empty
-                pass
-            else:
-                # Sorting
-                combined = list(zip(dates, values))
-                # Sort by the dates (first element of each tuple)
-                combined.sort(key=lambda x: x[0])
-                # Separate into individual lists
-                dates, values = zip(*combined)
-
-            return dates, values
-
-        glucose_dates, glucose_values = get_dates_and_values("CGM", df_row)
-        input_dict["glucose_dates"] = glucose_dates
-        input_dict["glucose_values"] = glucose_values
+                yield i, output_dict.get("predicted_glucose_values")[1:prediction_index + 1]
 
-        dose_types, start_times, end_times, dose_values, dose_delivered_units = self.get_insulin_data(df_row)
-
-        input_dict["dose_types"] = dose_types
-        input_dict["dose_start_times"] = start_times
-        input_dict["dose_end_times"] = end_times
-        input_dict["dose_values"] = dose_values
-        input_dict["dose_delivered_units"] = dose_delivered_units
-
-        carb_data = df_row[df_row.index.str.startswith('carbs') & (df_row != 0)]
-        carb_dates, carb_values = get_dates_and_values("carbs", carb_data)
-        input_dict["carb_dates"] = carb_dates
-        input_dict["carb_values"] = carb_values
-
-        # Adding the default carb absorption time because it is not available in data sources.
-        input_dict["carb_absorption_times"] = [180 for _ in carb_values]
-
-        return update(input_dict)
-
-
-    def get_insulin_data(self, df_row):
-        def get_dose_type(x):
-            if x == 'temp':
-                return DoseType.from_str("tempbasal")
-            elif x == 'bolus':
-                return DoseType.from_str("bolus")
-            else:
-                return DoseType.from_str("basal")
-
-        def get_dates_and_values(column, data):
-            relevant_columns = [val for val in data.index if val.startswith(column)]
-            dates = []
-            values = []
-
-            date = data.name
-            if isinstance(date, np.int64):
-                date = datetime.datetime.now()
-
-            for col in relevant_columns:
-                if col == column:
-                    values.append(data[col])
-                    dates.append(date)
-                elif "what_if" in col:
-                    values.append(data[col])
-                    new_date = date + datetime.timedelta(minutes=int(col.split("_")[-1]))
-                    dates.append(new_date)
-                else:
-                    values.append(data[col])
-                    new_date = date - datetime.timedelta(minutes=int(col.split("_")[-1]))
-                    dates.append(new_date)
-            return dates, values
-
-        basal_dates, basal_values = get_dates_and_values("basal", df_row)
-        # Using tempbasal as default, assuming that users are using
-        basal_dose_types = [get_dose_type("tempbasal") for _ in basal_dates]
-        basal_start_times = basal_dates
-        basal_end_times = [val + pd.Timedelta(minutes=5) for val in basal_dates]
-        # TODO: Are basals in U or U/hr in dataframe? PyLoopKit is expecting U/hr
-        # basal_values = [value / 5 * 60 for value in df.basal.tolist()]
-        basal_values = basal_values
-        basal_units = [None for _ in basal_values]
-
-        bolus_data = df_row[df_row.index.str.startswith('bolus') & (df_row != 0)]
-        bolus_dates, bolus_values = get_dates_and_values("bolus", bolus_data)
-        bolus_dose_types = [get_dose_type("bolus") for _ in bolus_values]
-        bolus_start_times = bolus_dates
-        bolus_end_times = bolus_dates
-        bolus_units = [None for _ in bolus_values]
-
-        # Step 1: Combine into tuples
-        combined_basal = list(zip(basal_dose_types, basal_start_times, basal_end_times, basal_values, basal_units))
-        combined_bolus = list(zip(bolus_dose_types, bolus_start_times, bolus_end_times, bolus_values, bolus_units))
-
-        # Step 2: Merge lists
-        combined = combined_basal + combined_bolus
-
-        # Step 3: Sort by the start times (second element of each tuple)
-        combined.sort(key=lambda x: x[1])
-
-        # Step 4: Separate into individual lists
-        dose_types, start_times, end_times, values, units = zip(*combined)
-
-        # Convert the tuples back to lists if needed
-        dose_types = list(dose_types)
-        start_times = list(start_times)
-        end_times = list(end_times)
-        values = list(values)
-        units = list(units)
-
-        return dose_types, start_times, end_times, values, units
+    def iterate_prediction_outputs(self, subject_events, input_dict, batch_size=50):
+        """
+        Yields the row index and PyLoopKit output of each row of the subject events. The rows are predicted in batches,
+        so that the momentum and carbohydrate effects of a batch are computed together, while a caller that stops
+        early does not pay for more than one batch of unused predictions.
+        """
+        for start in range(0, len(subject_events), batch_size):
+            indexes = range(start, min(start + batch_size, len(subject_events)))
+            output_dicts = get_prediction_outputs([subject_events.get_input_dict(i, input_dict) for i in indexes])
+            yield from zip(indexes, output_dicts)
 
     def get_input_dict(self, insulin_sensitivity, carb_ratio, basal):
         return ({
@@ -1,7 +1,10 @@
 from .base_model import BaseModel
 from glupredkit.helpers.scikit_learn import process_data
+from glupredkit.helpers.grid_search import grid_search
+from glupredkit.helpers.unit_config_manager import unit_config_manager
 from glupredkit.metrics.rmse import Metric
 from loop_to_python_api.api import get_prediction_values_and_dates
+from functools import partial
 
 import datetime
 import numpy as np
@@ -16,7 +19,12 @@ class Model(BaseModel):
         self.insulin_sensitivites = []
         self.carb_ratios = []
 
-    def _fit_model(self, x_train, y_train, n_cross_val_samples=200, *args):
+    def _fit_model(self, x_train, y_train, n_cross_val_samples=200, *args, n_workers=1, early_abandon=False):
+        """
+        Finds the basal rate, insulin sensitivity factor and carbohydrate ratio of each subject with a grid search,
+        using n_workers processes. With early_abandon, the evaluation of a grid point stops as soon as its RMSE is
+        known to be higher than the best so far, which gives the same settings as the exhaustive search.
+        """
         required_columns = ['CGM', 'carbs', 'basal', 'bolus']
         missing_columns = [col for col in required_columns if col not in x_train.columns]
         if missing_columns:
@@ -27,8 +35,9 @@ class Model(BaseModel):
         self.subject_ids = x_train['id'].unique()
         x_train['insulin'] = x_train['bolus'] + (x_train['basal'] / 12)
 
-        rmse = Metric()
-
+        mult_factors = [0.6, 0.7, 0.8, 0.9, 1.0, 1.1, 1.2, 1.3, 1.4]
+        basal_rate_factors = [0.3, 0.4, 0.5, 0.6]
+        subject_data = {}
         for subject_id in self.subject_ids:
 
             x_train_filtered = x_train[x_train['id'] == subject_id]
@@ -37,9 +46,6 @@ class Model(BaseModel):
             subset_df_x = x_train_filtered.sample(n=n_cross_val_samples, random_state=42)
             subset_df_y = y_train_filtered.sample(n=n_cross_val_samples, random_state=42)
 
-            # Flattened list of measured values across trajectory
-            y_true = subset_df_y.to_numpy().ravel().tolist()
-
             # Calculate total daily insulin
             daily_avg_insulin = np.mean(x_train_filtered.groupby(pd.Grouper(freq='D')).agg({'insulin': 'sum'}))[0]
             print(f"Daily average insulin for subject {subject_id}: ", daily_avg_insulin)
@@ -49,47 +55,35 @@ class Model(BaseModel):
             print(f"daily average basal is {daily_avg_basal}, while 45% of TDD is {computed_basal}")
 
             basal = (daily_avg_basal + computed_basal) / 2  # Average between 45% and their original setting
-            #self.basal_rates += [basal]  # Basal average of the daily basal rate of the person
             print(f"Basal for subject {subject_id}: ", basal)
 
             isf = 1800 / daily_avg_insulin  # ISF 1800 rule
             cr = 500 / daily_avg_insulin  # CR 500 rule
 
-            mult_factors = [0.6, 0.7, 0.8, 0.9, 1.0, 1.1, 1.2, 1.3, 1.4]
-
-            best_rmse = np.inf
-            best_basal = basal
-            best_isf = isf
-            best_cr = cr
-            for i in mult_factors:
-                for j in mult_factors:
-                    for basal_rate_factor in [0.3, 0.4, 0.5, 0.6]:
-                        current_basal = daily_avg_insulin * basal_rate_factor / 24
-                        y_pred = self._predict_model(subset_df_x, basal=current_basal, isf=isf*i, cr=cr*j)
-
-                        # Flatten y_pred
-                        if isinstance(y_pred, list) and any(isinstance(i, list) for i in y_pred):
-                            y_pred = [item for sublist in y_pred for item in sublist]  # Flattening y_pred
-                        else:
-                            y_pred = y_pred  # Use as is if it's already flat
-
-                        print(f'Factors {i} and {j}, basal {basal_rate_factor}')
-
-                        iteration_result = rmse(y_true, y_pred)
-                        print("RMSE: ", iteration_result)
-                        # print("Distribution difference: ", int(np.std(last_y_pred) - std_target))
-                        if iteration_result < best_rmse:
-                            best_basal = current_basal
-                            best_isf = isf*i
-                            best_cr = cr*j
-                            best_rmse = iteration_result
-
-            self.basal_rates += [best_basal]
-            self.insulin_sensitivites += [best_isf]
-            self.carb_ratios += [best_cr]
-
-            #self.insulin_sensitivites += [isf]
-            #self.carb_ratios += [cr]
+            subject_data[subject_id] = (subset_df_x, subset_df_y.to_numpy(), daily_avg_insulin, basal, isf, cr)
+
+        def print_rmse(subject_id, factors, rmse):
+            print(f'Factors {factors[0]} and {factors[1]}, basal {factors[2]} for subject {subject_id}')
+            print("RMSE: ", rmse if np.isfinite(rmse) else "abandoned")
+
+        candidates = {subject_id: [(i, j, basal_rate_factor) for i in mult_factors for j in mult_factors
+                                   for basal_rate_factor in basal_rate_factors]
+                      for subject_id in self.subject_ids}
+        results = grid_search(partial(self.get_therapy_settings_rmse, subject_data), candidates, n_workers=n_workers,
+                              early_abandon=early_abandon, callback=print_rmse)
+
+        for subject_id in self.subject_ids:
+            _, _, daily_avg_insulin, basal, isf, cr = subject_data[subject_id]
+            best_factors, _ = results[subject_id]
+            if best_factors is None:
+                self.basal_rates += [basal]
+                self.insulin_sensitivites += [isf]
+                self.carb_ratios += [cr]
+            else:
+                i, j, basal_rate_factor = best_factors
+                self.basal_rates += [daily_avg_insulin * basal_rate_factor / 24]
+                self.insulin_sensitivites += [isf*i]
+                self.carb_ratios += [cr*j]
 
         """
         # TODO: Remove. but we know from loop 1 the therapy settings
@@ -104,9 +98,36 @@ class Model(BaseModel):
         """
         return self
 
+    def get_therapy_settings_rmse(self, subject_data, subject_id, factors, max_rmse=np.inf):
+        """
+        Returns the RMSE of the predicted trajectories for the given factors of the therapy settings of the subject, or
+        np.inf if it exceeds max_rmse.
+        """
+        subset_df_x, y_true, daily_avg_insulin, _, isf, cr = subject_data[subject_id]
+        i, j, basal_rate_factor = factors
+        current_basal = daily_avg_insulin * basal_rate_factor / 24
+
+        # The sum of squared errors only grows, and the RMSE is at least the square root of this sum divided by the
+        # number of measured values, so we can stop once that is higher than max_rmse
+        n_measured_values = np.count_nonzero(~np.isnan(y_true))
+        squared_error_sum = 0
+        y_pred = []
+        for row_index, predictions in enumerate(self.iterate_predictions(subset_df_x, basal=current_basal,
+                                                                         isf=isf*i, cr=cr*j)):
+            y_pred += predictions
+            squared_error_sum += np.nansum(np.square(y_true[row_index] - np.array(predictions)))
+            if unit_config_manager.convert_value(np.sqrt(squared_error_sum / n_measured_values)) > \
+                    max_rmse * (1 + 1e-9):
+                return np.inf
+
+        # Flattened list of measured values across trajectory
+        return Metric()(y_true.ravel().tolist(), y_pred)
+
     def _predict_model(self, x_test, basal=None, isf=None, cr=None):
+        return list(self.iterate_predictions(x_test, basal=basal, isf=isf, cr=cr))
+
+    def iterate_predictions(self, x_test, basal=None, isf=None, cr=None):
         n_predictions = self.prediction_horizon // 5
-        y_pred = []
 
         for subject_idx, subject_id in enumerate(self.subject_ids):
             df_subset = x_test[x_test['id'] == subject_id]
@@ -117,9 +138,7 @@ class Model(BaseModel):
                 predictions = [1 if val < 1 else 600 if val > 600 else val for val in predictions]
 
                 # Skipping first predicted sample because it is repeating the reference value
-                y_pred += [predictions[1:n_predictions + 1]]
-
-        return y_pred
+                yield predictions[1:n_predictions + 1]
 
     def best_params(self):
         best_params = [{
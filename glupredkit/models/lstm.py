@@ -1,12 +1,11 @@
 import numpy as np
 import tensorflow as tf
-import ast
 from datetime import datetime
 from tensorflow.keras.layers import LSTM, Dense, Embedding, Flatten, concatenate, Input, Masking, Dropout, Bidirectional
 from tensorflow.keras.callbacks import EarlyStopping, ReduceLROnPlateau, Callback
 from sklearn.model_selection import TimeSeriesSplit
 from .base_model import BaseModel
-from glupredkit.helpers.tf_keras import process_data
+from glupredkit.helpers.tf_keras import process_data, KerasPredictor
 
 
 class Model(BaseModel):
@@ -23,11 +22,8 @@ class Model(BaseModel):
         self.num_outputs = None
 
     def _fit_model(self, x_train, y_train, epochs=20, *args):
-        sequences = [np.array(ast.literal_eval(seq_str)) for seq_str in x_train['sequence']]
-        targets = [np.array(ast.literal_eval(target_str)) for target_str in y_train['target']]
-
-        sequences = np.array(sequences)
-        targets = np.array(targets)
+        sequences = x_train['sequence']
+        targets = y_train['target']
 
         # Determine the number of outputs
         self.input_shape = (sequences.shape[1], sequences.shape[2])
@@ -73,10 +69,9 @@ class Model(BaseModel):
         return self
 
     def _predict_model(self, x_test):
-        sequences = [np.array(ast.literal_eval(seq_str)) for seq_str in x_test['sequence']]
-        sequences = np.array(sequences)
+        sequences = x_test['sequence']
 
-        model = tf.keras.models.load_model(self.model_path, custom_objects={"Adam": tf.keras.optimizers.legacy.Adam})
+        model = self.get_resident('keras_model', lambda: KerasPredictor.load(self.model_path))
         predictions = model.predict(sequences)
         predictions = predictions.tolist()
 
@@ -2,15 +2,13 @@
 Multitask learning (CRNN), from: https://ceur-ws.org/Vol-2675/paper19.pdf
 GitHub: https://github.com/jsmdaniels/ecai-bglp-challenge
 """
-import numpy as np
 import tensorflow as tf
-import ast
 from datetime import datetime
 from keras.models import Model as KerasModel
 from keras.layers import Input, Convolution1D, MaxPooling1D, Dense, Dropout
 from keras.layers import LSTM
 from .base_model import BaseModel
-from glupredkit.helpers.tf_keras import process_data
+from glupredkit.helpers.tf_keras import process_data, KerasPredictor
 
 
 class Model(BaseModel):
@@ -26,11 +24,8 @@ class Model(BaseModel):
 
     def _fit_model(self, x_train, y_train, epochs=20, *args):
         # TODO: Implement transfer learning on population to personalization
-        sequences = [np.array(ast.literal_eval(seq_str)) for seq_str in x_train['sequence']]
-        targets = [np.array(ast.literal_eval(target_str)) for target_str in y_train['target']]
-
-        sequences = np.array(sequences)
-        targets = np.array(targets)
+        sequences = x_train['sequence']
+        targets = y_train['target']
 
         dropout_conv = 0.1
         dropout_lstm = 0.2
@@ -83,10 +78,9 @@ class Model(BaseModel):
         return self
 
     def _predict_model(self, x_test):
-        sequences = [np.array(ast.literal_eval(seq_str)) for seq_str in x_test['sequence']]
-        sequences = np.array(sequences)
+        sequences = x_test['sequence']
 
-        model = tf.keras.models.load_model(self.model_path, custom_objects={"Adam": tf.keras.optimizers.legacy.Adam})
+        model = self.get_resident('keras_model', lambda: KerasPredictor.load(self.model_path))
         predictions = model.predict(sequences)
 
         return predictions
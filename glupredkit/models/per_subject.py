@@ -0,0 +1,135 @@
+"""
+Personalized models, where one copy of a model is fitted on the data of each subject.
+"""
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+from glupredkit.helpers.shared_dataset import SharedDataset
+from .base_model import BaseModel
+
+
+def _fit_subject(model, x_train, y_train, args, kwargs):
+    return model.fit(x_train, y_train, *args, **kwargs)
+
+
+def _predict_subject(model, x_test):
+    y_pred = np.asarray(model.predict(x_test), dtype=float)
+    return y_pred.reshape(len(y_pred), -1)
+
+
+def _fit_shared_subject(model, dataset, rows, args, kwargs):
+    x_train, y_train = dataset.to_frame(rows)
+    return _fit_subject(model, x_train, y_train, args, kwargs)
+
+
+def _predict_shared_subject(model, dataset, rows):
+    x_test, _ = dataset.to_frame(rows)
+    return _predict_subject(model, x_test)
+
+
+class PerSubjectModel(BaseModel):
+    """
+    Wraps a model, so that one instance of it is fitted on the rows of each subject, and each row is predicted by the
+    instance of its subject. The rows are partitioned by the `id` column once, and the subjects are fitted and predicted
+    concurrently. The predictions are returned in the order of the input rows.
+
+    Args:
+        model_class (type): The model to fit for each subject, created as model_class(prediction_horizon), like the
+            `Model` class of a module in `glupredkit.models`. Its data must be processed into a DataFrame with `id`.
+        prediction_horizon (int): The prediction horizon in minutes.
+        fallback (BaseModel): A model that is fitted on the rows of all subjects, and that predicts the rows of subjects
+            that were not in the training data. If None, predicting those rows raises a ValueError.
+        n_workers (int): Number of workers that fit and predict subjects. With one worker, the subjects are fitted and
+            predicted in this process.
+        use_threads (bool): Whether the workers are threads instead of processes. Threads avoid copying the models to
+            the workers, which is faster for models whose computations release the GIL, like NumPy. Worker processes
+            read numerical data from shared memory, and other data is copied to them. In shared memory, the features
+            are stored with their common type, and the workers convert them back to the type of their column, so
+            they get the same data types as with threads.
+    """
+    def __init__(self, model_class, prediction_horizon, fallback=None, n_workers=1, use_threads=False):
+        super().__init__(prediction_horizon)
+        self.model_class = model_class
+        self.fallback = fallback
+        self.n_workers = n_workers
+        self.use_threads = use_threads
+        self.subject_ids = []
+        self.models = {}
+
+    def _map(self, function, *iterables):
+        if self.n_workers is None or self.n_workers <= 1:
+            return list(map(function, *iterables))
+        executor_class = ThreadPoolExecutor if self.use_threads else ProcessPoolExecutor
+        with executor_class(max_workers=self.n_workers) as executor:
+            return list(executor.map(function, *iterables))
+
+    def _get_shared_dataset(self, x, y=None):
+        # Worker processes get the data in shared memory, instead of a copy of the rows of their subject
+        if self.n_workers is None or self.n_workers <= 1 or self.use_threads:
+            return None
+        try:
+            return SharedDataset.from_frame(x, y)
+        except TypeError:
+            return None
+
+    def _fit_model(self, x_train, y_train, *args, **kwargs):
+        if 'id' not in getattr(x_train, 'columns', []):
+            raise ValueError(f"The model must process the data into a DataFrame with an `id` column to be fitted per "
+                             f"subject, got {type(x_train).__name__}.")
+        # The positions of the rows of each subject, in the order that the subjects first appear
+        subject_rows = x_train.groupby('id', sort=False).indices
+        self.subject_ids = list(subject_rows)
+
+        models = [self.model_class(self.prediction_horizon) for _ in self.subject_ids]
+        n_subjects = len(self.subject_ids)
+        dataset = self._get_shared_dataset(x_train, y_train)
+        if dataset is not None:
+            with dataset:
+                models = self._map(_fit_shared_subject, models, [dataset] * n_subjects, subject_rows.values(),
+                                   [args] * n_subjects, [kwargs] * n_subjects)
+        else:
+            models = self._map(_fit_subject, models,
+                               [x_train.iloc[rows] for rows in subject_rows.values()],
+                               [y_train.iloc[rows] for rows in subject_rows.values()],
+                               [args] * n_subjects, [kwargs] * n_subjects)
+        self.models = dict(zip(self.subject_ids, models))
+
+        if self.fallback is not None:
+            self.fallback = _fit_subject(self.fallback, x_train, y_train, args, kwargs)
+        return self
+
+    def _predict_model(self, x_test):
+        subject_rows = x_test.groupby('id', sort=False).indices
+        subject_ids = [subject_id for subject_id in subject_rows if subject_id in self.models]
+        unseen_ids = [subject_id for subject_id in subject_rows if subject_id not in self.models]
+
+        models = [self.models[subject_id] for subject_id in subject_ids]
+        dataset = self._get_shared_dataset(x_test) if subject_ids else None
+        if dataset is not None:
+            with dataset:
+                predictions = self._map(_predict_shared_subject, models, [dataset] * len(subject_ids),
+                                        [subject_rows[subject_id] for subject_id in subject_ids])
+        else:
+            predictions = self._map(_predict_subject, models,
+                                    [x_test.iloc[subject_rows[subject_id]] for subject_id in subject_ids])
+        groups = [(subject_rows[subject_id], y_pred) for subject_id, y_pred in zip(subject_ids, predictions)]
+
+        if unseen_ids:
+            if self.fallback is None:
+                raise ValueError(f"The subjects {unseen_ids} were not in the training data, and there is no fallback "
+                                 f"model to predict them.")
+            rows = np.sort(np.concatenate([subject_rows[subject_id] for subject_id in unseen_ids]))
+            groups += [(rows, _predict_subject(self.fallback, x_test.iloc[rows]))]
+
+        y_pred = np.full((len(x_test), groups[0][1].shape[1] if groups else self.prediction_horizon // 5), np.nan)
+        for rows, subject_y_pred in groups:
+            if len(subject_y_pred) != len(rows):
+                raise ValueError(f"Expected {len(rows)} predictions for a subject, got {len(subject_y_pred)}.")
+            y_pred[rows] = subject_y_pred
+        return y_pred
+
+    def best_params(self):
+        # The parameters of the model of each subject
+        return {subject_id: model.best_params() for subject_id, model in self.models.items()}
+
+    def process_data(self, df, model_config_manager, real_time):
+        return self.model_class(self.prediction_horizon).process_data(df, model_config_manager, real_time)
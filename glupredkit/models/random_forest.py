@@ -1,8 +1,8 @@
-from sklearn.model_selection import GridSearchCV
-from sklearn.multioutput import MultiOutputRegressor
 from sklearn.ensemble import RandomForestRegressor
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import KBinsDiscretizer
 from .base_model import BaseModel
-from glupredkit.helpers.scikit_learn import process_data
+from glupredkit.helpers.scikit_learn import fit_parameter_grid, process_data
 
 
 class Model(BaseModel):
@@ -10,33 +10,34 @@ class Model(BaseModel):
         super().__init__(prediction_horizon)
 
         self.model = None
+        self.params = None
 
-    def _fit_model(self, x_train, y_train, *args):
-        # Define the base regressor
-        base_regressor = RandomForestRegressor()
-
-        # Wrap the base regressor with MultiOutputRegressor
-        multi_output_regressor = MultiOutputRegressor(base_regressor)
+    def _fit_model(self, x_train, y_train, *args, n_jobs=None, n_bins=None):
+        # One forest predicts all the outputs, with its trees built in n_jobs threads. If n_bins is given, the
+        # features are binned into that many quantile bins before training, which reduces the split candidates.
+        base_regressor = RandomForestRegressor(n_jobs=n_jobs)
 
         # Define the parameter grid
         param_grid = {
-            'estimator__n_estimators': [300],
-            'estimator__min_samples_split': [80],
+            'n_estimators': [300],
+            'min_samples_split': [80],
         }
 
-        # Define GridSearchCV
-        self.model = GridSearchCV(multi_output_regressor, param_grid, cv=5, scoring='neg_mean_squared_error')
-        self.model.fit(x_train, y_train)
+        if n_bins:
+            base_regressor = make_pipeline(KBinsDiscretizer(n_bins=n_bins, encode='ordinal', strategy='quantile',
+                                                            subsample=200000), base_regressor)
+            param_grid = {f'randomforestregressor__{key}': values for key, values in param_grid.items()}
+
+        self.model, self.params = fit_parameter_grid(base_regressor, param_grid, x_train, y_train)
         return self
 
     def _predict_model(self, x_test):
-        # Use the best estimator found by GridSearchCV to make predictions
-        y_pred = self.model.best_estimator_.predict(x_test)
+        y_pred = self.model.predict(x_test)
         return y_pred
 
     def best_params(self):
-        # Return the best parameters found by GridSearchCV
-        return self.model.best_params_
+        # Return the chosen parameters of the forest
+        return self.params
 
     def process_data(self, df, model_config_manager, real_time):
         return process_data(df, model_config_manager, real_time)
@@ -3,13 +3,12 @@ Stacked PLSR, from: https://ceur-ws.org/Vol-2675/paper21.pdf
 GitHub: https://gitlab.com/Hoda-Nemat/data-fusion-stacking
 """
 from sklearn.neural_network import MLPRegressor
-from sklearn.metrics import mean_squared_error
-from glupredkit.helpers.tf_keras import process_data
+from glupredkit.helpers.pls_solver import get_pls_components
+from glupredkit.helpers.tf_keras import process_data, KerasPredictor
 from .base_model import BaseModel
 from keras.models import Sequential
 import numpy as np
 import tensorflow as tf
-import ast
 from datetime import datetime
 from sklearn.cross_decomposition import PLSRegression
 from keras.layers import LSTM, Dense
@@ -27,14 +26,13 @@ class Model(BaseModel):
         self.stacked_model = None
 
     def _fit_model(self, x_train, y_train, *args):
-        x_train = x_train['sequence'].apply(ast.literal_eval)
-        x_train = np.array(x_train.tolist())
+        dates = x_train.index
+        x_train = x_train['sequence']
         x_train_flat = x_train.reshape(x_train.shape[0], -1)  # Flatten each sample
 
-        y_train = [np.array(ast.literal_eval(target_str)) for target_str in y_train['target']]
-        y_train = np.array(y_train)
+        y_train = y_train['target']
 
-        n_components = self._get_plsr_components(x_train_flat, y_train)
+        n_components = self._get_plsr_components(x_train_flat, y_train, dates)
         self.first_plsr_model = PLSRegression(n_components)
         self.mlp_model = self._create_mlp()
         lstm_model = self._create_lstm(x_train)
@@ -56,12 +54,10 @@ class Model(BaseModel):
         return self
 
     def _predict_model(self, x_test):
-        x_test = x_test['sequence'].apply(ast.literal_eval)
-        x_test = np.array(x_test.tolist())
+        x_test = x_test['sequence']
         x_test_flat = x_test.reshape(x_test.shape[0], -1)
 
-        lstm_model = tf.keras.models.load_model(self.lstm_model_path,
-                                                custom_objects={"Adam": tf.keras.optimizers.legacy.Adam})
+        lstm_model = self.get_resident('lstm_model', lambda: KerasPredictor.load(self.lstm_model_path))
 
         first_level_1 = self.mlp_model.predict(x_test_flat)
         first_level_2 = self.first_plsr_model.predict(x_test_flat)
@@ -83,27 +79,15 @@ class Model(BaseModel):
                             solver='adam', random_state=42, shuffle=False,
                             early_stopping=True)
 
-    def _get_plsr_components(self, X_train, Y_train):
-        # maximum number of components based on the number of features
-        componentmax = X_train.shape[1]
-        component = np.arange(1, componentmax)
-        rmse = []
-
-        # loop over different numbers of components to find the best amount of components
-        for i in component:
-            pls = PLSRegression(n_components=i)
-            pls.fit(X_train, Y_train)
-            Y_pred_train = pls.predict(X_train)
-            msecv = mean_squared_error(Y_train, Y_pred_train)
-            rmsecv = np.sqrt(msecv)
-            rmse.append(rmsecv)
-
-        # find the number of components that minimizes RMSE
-        msemin = np.argmin(rmse)
-        # set the optimal number of components
-        n_components = msemin + 1
-
-        # create a new PLS Regression model with the optimal number of components
+    def _get_plsr_components(self, X_train, Y_train, dates, validation_size=0.2, patience=10):
+        # The number of components is chosen on the latest samples, from one PLS run to the maximum number of
+        # components based on the number of features, and the run stops once the validation error has flattened
+        order = np.argsort(np.asarray(dates), kind='stable')
+        n_validation = max(1, int(len(order) * validation_size))
+        train_indices, validation_indices = order[:-n_validation], order[-n_validation:]
+        n_components, _ = get_pls_components(X_train[train_indices], Y_train[train_indices],
+                                             X_train[validation_indices], Y_train[validation_indices],
+                                             max_components=X_train.shape[1] - 1, patience=patience)
         return n_components
 
     def _create_lstm(self, x_train):
@@ -1,8 +1,9 @@
-from sklearn.model_selection import GridSearchCV
+from sklearn.kernel_approximation import RBFSampler
 from sklearn.multioutput import MultiOutputRegressor
-from sklearn.svm import SVR
+from sklearn.pipeline import make_pipeline
+from sklearn.svm import SVR, LinearSVR
 from .base_model import BaseModel
-from glupredkit.helpers.scikit_learn import process_data
+from glupredkit.helpers.scikit_learn import fit_parameter_grid, process_data
 
 
 class Model(BaseModel):
@@ -10,34 +11,42 @@ class Model(BaseModel):
         super().__init__(prediction_horizon)
 
         self.model = None
+        self.params = None
 
-    def _fit_model(self, x_train, y_train, *args):
-        # Define the base regressor
-        base_regressor = SVR(tol=1, kernel='rbf')
-
-        # Wrap the base regressor with MultiOutputRegressor
-        multi_output_regressor = MultiOutputRegressor(base_regressor)
-
+    def _fit_model(self, x_train, y_train, *args, n_components=None):
         # Define the parameter grid
         param_grid = {
-            'estimator__C': [100],
-            'estimator__epsilon': [0.03],
-            'estimator__gamma': [0.008],
+            'C': [100],
+            'epsilon': [0.03],
+            'gamma': [0.008],
         }
 
-        # Define GridSearchCV
-        self.model = GridSearchCV(multi_output_regressor, param_grid, cv=5, scoring='neg_mean_squared_error')
-        self.model.fit(x_train, y_train)
+        if n_components:
+            # The rbf kernel is approximated with n_components random Fourier features, which are computed once for
+            # all the outputs. A linear support vector regressor for each output is trained on these features, so the
+            # training time grows linearly with the number of samples instead of quadratically.
+            base_regressor = make_pipeline(RBFSampler(n_components=n_components, random_state=42),
+                                           MultiOutputRegressor(LinearSVR(tol=0.01, random_state=42)))
+            param_grid = {
+                'rbfsampler__gamma': param_grid['gamma'],
+                'multioutputregressor__estimator__C': param_grid['C'],
+                'multioutputregressor__estimator__epsilon': param_grid['epsilon'],
+            }
+        else:
+            # One exact rbf support vector regressor for each output
+            base_regressor = MultiOutputRegressor(SVR(tol=1, kernel='rbf'))
+            param_grid = {f'estimator__{key}': values for key, values in param_grid.items()}
+
+        self.model, self.params = fit_parameter_grid(base_regressor, param_grid, x_train, y_train)
         return self
 
     def _predict_model(self, x_test):
-        # Use the best estimator found by GridSearchCV to make predictions
-        y_pred = self.model.best_estimator_.predict(x_test)
+        y_pred = self.model.predict(x_test)
         return y_pred
 
     def best_params(self):
-        # Return the best parameters found by GridSearchCV
-        return self.model.best_params_
+        # Return the chosen parameters of the support vector regressors
+        return self.params
 
     def process_data(self, df, model_config_manager, real_time):
         return process_data(df, model_config_manager, real_time)
@@ -3,10 +3,8 @@ import torch.nn as nn
 import torch.optim as optim
 from torch.nn.utils.parametrizations import weight_norm
 from .base_model import BaseModel
-import numpy as np
 import os
 from datetime import datetime
-import ast
 from torch.utils.data import DataLoader, TensorDataset, Dataset
 from glupredkit.helpers.tf_keras import process_data
 
@@ -32,12 +30,8 @@ class Model(BaseModel):
             os.makedirs(model_dir)
 
     def _fit_model(self, x_train, y_train, epochs=20, *args):
-        # Convert the 'sequence' column from strings to NumPy arrays
-        sequences = [np.array(ast.literal_eval(seq_str)) for seq_str in x_train['sequence']]
-        targets = [np.array(ast.literal_eval(target_str)) for target_str in y_train['target']]
-
-        sequences = np.array(sequences)
-        targets = np.array(targets)
+        sequences = x_train['sequence']
+        targets = y_train['target']
 
         dataset = TimeSeriesDataset(sequences, targets)
         dataloader = DataLoader(dataset, batch_size=10, shuffle=True)
@@ -77,18 +71,22 @@ class Model(BaseModel):
         torch.save(model.state_dict(), self.model_path)
         return self
 
-    def _predict_model(self, x_test):
+    def _load_model(self):
         model = TCN(input_size=self.num_inputs, output_size=self.num_outputs, num_channels=self.n_channels,
                     kernel_size=self.kernel_size, dropout=self.dropout)
         model.load_state_dict(torch.load(self.model_path))
         model.eval()
+        return model
+
+    def _predict_model(self, x_test):
+        # The network is loaded on the first prediction and kept for the next ones
+        model = self.get_resident('tcn_model', self._load_model)
 
-        sequences = [np.array(ast.literal_eval(seq_str)) for seq_str in x_test['sequence']]
-        sequences = np.array(sequences)
+        sequences = x_test['sequence']
 
         inputs = torch.from_numpy(sequences).float()
 
-        with torch.no_grad():
+        with torch.inference_mode():
             predictions = model(inputs)
         return predictions.numpy()
 
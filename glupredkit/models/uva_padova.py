@@ -1,66 +1,93 @@
 from glupredkit.models.base_model import BaseModel
-from py_replay_bg.py_replay_bg import ReplayBG
-from scipy.stats import norm
-import copy
+from glupredkit.helpers.particle_filter import (ParticleFilter, FrozenModelParameters, gi_particle_filter_state_function,
+                                              gi_measurement_likelihood_function)
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import dill
+import hashlib
 import numpy as np
+import os
 import pandas as pd
 import shutil
+import tempfile
 
 
 class Model(BaseModel):
-    def __init__(self, prediction_horizon):
+    def __init__(self, prediction_horizon, n_forecast_particles=None):
         super().__init__(prediction_horizon)
 
+        # Number of particles used for the ahead-predictions. The filter itself always uses all particles.
+        self.n_forecast_particles = n_forecast_particles
         self.models = []
         self.subject_ids = []
 
-    def _fit_model(self, x_train, y_train, n_steps=100000, training_samples_per_subject=4320, *args):
+    def _fit_model(self, x_train, y_train, n_steps=100000, training_samples_per_subject=4320, *args, n_workers=1,
+                   checkpoint_dir=None, n_forecast_particles=None):
         # n_steps is the number of steps that will be used for identification
         # (for multi-meal it should be at least 100k)
         # Note that this class will not work if the dataset does not have five-minute intervals between measurements
+        # The subjects are identified in n_workers processes. If checkpoint_dir is given, each identified subject is
+        # stored there, and subjects that are already stored are loaded instead of identified again.
+        # n_forecast_particles replaces the number of particles of the ahead-predictions given to the constructor.
         required_columns = ['CGM', 'carbs', 'basal', 'bolus']
         missing_columns = [col for col in required_columns if col not in x_train.columns]
         if missing_columns:
             raise ValueError(
                 f"The input DataFrame is missing the following required columns: {', '.join(missing_columns)}")
 
-        x_train = self.process_input_data(x_train)
+        if n_forecast_particles is not None:
+            self.n_forecast_particles = n_forecast_particles
 
-        # Fit parameters of ReplayBG object
-        modality = 'identification'  # set modality as 'identification'
-        bw = 80  # Placeholder body weight
-        scenario = 'multi-meal'
-        cgm_model = 'CGM'
+        x_train = self.process_input_data(x_train)
         self.subject_ids = x_train['id'].unique()
 
+        if checkpoint_dir:
+            os.makedirs(checkpoint_dir, exist_ok=True)
+
+        models = {}
+        subsets = {}
+        checkpoint_paths = {}
         for subject_id in self.subject_ids:
             x_train_filtered = x_train[x_train['id'] == subject_id].copy()
             subset_df = x_train_filtered[-training_samples_per_subject:].reset_index()
-
-            rbg = ReplayBG(modality=modality, data=subset_df, bw=bw, scenario=scenario,
-                           save_name='', save_folder='', n_steps=n_steps,
-                           cgm_model=cgm_model,
-                           seed=1,
-                           plot_mode=False,
-                           verbose=True,  # Turn of when training in server
-                           analyze_results=False,)
-
-            # Run identification
-            rbg.run(data=subset_df, bw=bw)
-
-            # Initialize some default model parameters that for some reason are commented out in ReplayBG
-            rbg.model.model_parameters.ka1 = 0.0034  # 1/min (virtually 0 in 77% of the cases)
-            mp = rbg.model.model_parameters
-            rbg.model.model_parameters.beta = (mp.beta_B + mp.beta_L + mp.beta_D) / 3
-            self.models += [rbg]
-
-        # Delete the automatically stored draws after run
-        shutil.rmtree('results')
+            if checkpoint_dir:
+                # The checkpoint is only reused for the same training data and identification settings
+                checkpoint_paths[subject_id] = os.path.join(
+                    checkpoint_dir, f'{subject_id}__{n_steps}__{training_samples_per_subject}__'
+                                    f'{get_data_hash(subset_df)}.pkl')
+            if checkpoint_dir and os.path.exists(checkpoint_paths[subject_id]):
+                print(f'Loading identified model for subject {subject_id} from checkpoint...')
+                with open(checkpoint_paths[subject_id], 'rb') as f:
+                    models[subject_id] = dill.load(f)
+            else:
+                subsets[subject_id] = subset_df
+
+        def add_model(subject_id, serialized_model):
+            models[subject_id] = dill.loads(serialized_model)
+            if checkpoint_dir:
+                # Writing to a temporary file first, so that an interrupted run never leaves a corrupt checkpoint
+                tmp_path = checkpoint_paths[subject_id] + '.tmp'
+                with open(tmp_path, 'wb') as f:
+                    f.write(serialized_model)
+                os.replace(tmp_path, checkpoint_paths[subject_id])
+
+        if n_workers is None or n_workers <= 1:
+            for subject_id, subset_df in subsets.items():
+                add_model(subject_id, identify_subject(subset_df, n_steps))
+        else:
+            with ProcessPoolExecutor(max_workers=n_workers) as executor:
+                futures = {executor.submit(identify_subject, subset_df, n_steps): subject_id
+                           for subject_id, subset_df in subsets.items()}
+                for future in as_completed(futures):
+                    add_model(futures[future], future.result())
+
+        self.models = [models[subject_id] for subject_id in self.subject_ids]
 
         return self
 
     def _predict_model(self, x_test):
         x_test = self.process_input_data(x_test)
+        # Models that were stored before the option was added use all particles
+        n_forecast_particles = getattr(self, 'n_forecast_particles', None)
 
         prediction_result = []
         for index, subject_id in enumerate(self.subject_ids):
@@ -70,11 +97,12 @@ class Model(BaseModel):
                 print(f'No test samples for subject {subject_id}, proceeding to next subject...')
             else:
                 model_parameters = self.models[index].model.model_parameters
-                prediction_result += self.get_phy_prediction(model_parameters, x_test_filtered, self.prediction_horizon)
+                prediction_result += self.get_phy_prediction(model_parameters, x_test_filtered, self.prediction_horizon,
+                                                             n_forecast_particles=n_forecast_particles)
 
         return prediction_result
 
-    def get_phy_prediction(self, model_parameters, data, prediction_horizon):
+    def get_phy_prediction(self, model_parameters, data, prediction_horizon, n_forecast_particles=None):
         """
         This function is translated from MatLab: https://github.com/checoisback/phy-predict/blob/main/getPhyPrediction.m.
 
@@ -86,6 +114,7 @@ class Model(BaseModel):
         - test_data: a DataFrame containing the following columns: Time, glucose, CHO, bolus_insulin, and basal_insulin.
         The measurement units must be consistent with the ones described in the provided link.
         - PH: the prediction horizon (in minutes).
+        - n_forecast_particles: the number of particles used for the ahead-predictions (default: all particles).
 
         Output:
         - prediction_results: a dictionary containing the test data (prediction_results['data']) and the predicted profile
@@ -137,13 +166,14 @@ class Model(BaseModel):
 
         # Initialize the particle filter
         pf_v0 = ParticleFilter(gi_particle_filter_state_function, gi_measurement_likelihood_function, n_particles, x0,
-                               np.diag(sigma0))
+                               np.diag(sigma0), seed=1)
 
         last_best_guess, last_best_cov, G_hat, IG_hat, VarG_hat, VarIG_hat = self.apply_pf(pf_v0, time_data,
                                                                                            data['glucose'], meal,
                                                                                            total_ins, x0, sigma_u0,
                                                                                            sigma_v, model_parameters,
-                                                                                           prediction_horizon)
+                                                                                           prediction_horizon,
+                                                                                           n_forecast_particles)
 
         # Get all the predicted values in 5-minute intervals
         predicted_trajectories = IG_hat[:, Ts - 1::Ts]
@@ -233,7 +263,7 @@ class Model(BaseModel):
         return meal, meal_delayed
 
     def apply_pf(self, pf, time, noisy_measure, meal, total_ins, x0, sigma_u0, sigma_v, model_parameters,
-                 prediction_horizon):
+                 prediction_horizon, n_forecast_particles=None):
         """
         Applies a particle filter to perform real-time filtering.
 
@@ -250,6 +280,7 @@ class Model(BaseModel):
                 - measurementNoiseVariance: measurement noise variance
                 - parameterStructure: structure containing model parameters
                 - predictionHorizon: prediction horizon (default: 30)
+            - n_forecast_particles: number of particles used for the k-step ahead predictions (default: all particles)
 
         Outputs:
             - lastBestGuess: matrix containing the last best guess of state variables
@@ -275,6 +306,9 @@ class Model(BaseModel):
         state_corrected = np.zeros(len(x0))
         cov_corrected = np.zeros((len(x0), len(x0)))
 
+        # The predictions do not change the model parameters, so all forecasts share one read-only copy
+        mP_pred = FrozenModelParameters(model_parameters)
+
         print_progress_bar(1, len(time), prefix='Progress:', suffix='Complete', length=50)
 
         for k in range(len(time)):
@@ -305,8 +339,7 @@ class Model(BaseModel):
 
             # k-step ahead prediction
             if (k + prediction_horizon <= len(time)) and ((k % int(5 / model_parameters.TS)) == 0):
-                pf_pred = copy.deepcopy(pf)
-                mP_pred = copy.deepcopy(model_parameters)
+                pf_pred = pf.fork(n_forecast_particles)
 
                 for p in range(prediction_horizon):
                     # This function assumes that future meals and insulin injections are known
@@ -384,181 +417,53 @@ class Model(BaseModel):
             print("alpha:", mp.alpha)  # Rate constant or conversion factor
 
 
-def gi_measurement_likelihood_function(predicted_measurement, measurement, sigma_v):
-    # The measurement is the ninth state. Extract all measurement hypotheses from particles
-    # Calculate the likelihood of each predicted measurement
-    likelihood = norm.pdf(predicted_measurement, measurement, sigma_v)
-
-    return likelihood
-
-
-def gi_particle_filter_state_function(particles, CHO, INS, time, sigma_u, mP):
-    numberOfParticles, numberOfStates = particles.shape
-
-    # Time-propagate each particle using Euler integration
-    dt = mP.TS  # Sample time
-    for kk in range(numberOfParticles):
-        particles[kk, :] = particles[kk, :] + gi_state_function_continuous(particles[kk, :], CHO, INS, time, mP) * dt
-
-    # Add Gaussian noise with specified variance processNoise
-    process_noise = np.diag(sigma_u)
-    noise = np.dot(process_noise, np.random.randn(numberOfStates, numberOfParticles)).T  # Transpose to fit particles
-    particles += noise
-
-    return particles
-
-
-def gi_state_function_continuous(x, CHO, INS, time, mP):
-    dxdt = np.zeros_like(x)
-    Qsto1, Qsto2, Qgut, Isc1, Isc2, Ip, X, G, IG = x
-
-    # Compute the basal plasmatic insulin
-    Ipb = (mP.ka1 / mP.ke) * (mP.u2ss) / (mP.ka1 + mP.kd) + (mP.ka2 / mP.ke) * (mP.kd / mP.ka2) * (mP.u2ss) / (
-            mP.ka1 + mP.kd)
-
-    # Calculate state derivatives
-    if time < 4 or time >= 17:
-        SI = mP.SI_D
-        kabs = mP.kabs_D
-    elif 4 <= time < 11:
-        SI = mP.SI_B
-        kabs = mP.kabs_B
-    else:
-        SI = mP.SI_L
-        kabs = mP.kabs_L
-
-    risk = compute_hypoglycemic_risk(x[7], mP)  # Assuming G is x[7]
-
-    rhoRisk = 1 + risk
-    Ra = mP.f * kabs * Qgut
-    dxdt[0] = -mP.kgri * Qsto1 + CHO
-    dxdt[1] = mP.kgri * Qsto1 - mP.kempt * Qsto2
-    dxdt[2] = mP.kempt * Qsto2 - kabs * Qgut
-    dxdt[3] = -mP.kd * Isc1 + INS
-    dxdt[4] = mP.kd * Isc1 - mP.ka2 * Isc2
-    dxdt[5] = mP.ka2 * Isc2 - mP.ke * Ip
-    dxdt[6] = -mP.p2 * (X - (SI / mP.VI) * (Ip - Ipb))
-    dxdt[7] = -((mP.SG + rhoRisk * X) * G) + mP.SG * mP.Gb + Ra / mP.VG
-    dxdt[8] = -(1 / mP.alpha) * (IG - G)
-
-    return dxdt
-
-
-def compute_hypoglycemic_risk(G, mP):
-    # Function to compute hypoglycemic risk as described in Visentin et al., JDST, 2018.
-
-    # Setting the risk model threshold
-    Gth = 60
-
-    # For all values below the risk model threshold, the hypoglycemic risk will be the same.
-    # This redefinition of G avoid some output errors.
-    if G < Gth:
-        G = Gth - 1
-
-    # Compute the risk
-    Gb = mP.Gb
-    risk = (10 * (np.log(G) ** mP.r2 - np.log(Gb) ** mP.r2) ** 2 * ((G < Gb) & (G >= Gth)) +
-            10 * (np.log(Gth) ** mP.r2 - np.log(Gb) ** mP.r2) ** 2 * (G < Gth))
-
-    return abs(risk)
-
-
-class ParticleFilter:
-    def __init__(self, state_transition_fn, measurement_fn, num_particles, x0, sigma0):
-        self.num_particles = num_particles
-
-        # Set state bounds
-        lower_bound = np.array(x0) - 0.03 * np.array(x0)  # Lower bound
-        upper_bound = np.array(x0) + 0.03 * np.array(x0)  # Upper bound
-
-        # Initialize particles uniformly within the bounds
-        self.particles = np.random.uniform(low=lower_bound, high=upper_bound, size=(num_particles, len(x0)))
-        self.weights = np.ones(num_particles) / num_particles * 1000
-        self.state_transition_fn = state_transition_fn  # gi_particle_filter_state_function
-        self.measurement_fn = measurement_fn  # gi_measurement_likelihood_function
-
-    def predict(self, carbs, insulin, time, sigma_u, model_parameters):
-        """Predict the next state of the particles."""
-
-        self.particles = self.state_transition_fn(self.particles, carbs, insulin, time, sigma_u, model_parameters)
-
-        # Calculate the mean of the particles
-        mean_state = np.mean(self.particles, axis=0)
+def identify_subject(subset_df, n_steps):
+    """
+    Identifies the model parameters of one subject with ReplayBG, in a separate working directory so that several
+    subjects can be identified in parallel.
 
-        # Calculate the covariance matrix of the particles
-        cov_state = np.cov(self.particles, rowvar=False)  # rowvar=False to treat rows as variables
+    Returns:
+        bytes: The identified ReplayBG object serialized with dill, so that it can be returned from a worker process.
+    """
+    from py_replay_bg.py_replay_bg import ReplayBG
+
+    # Fit parameters of ReplayBG object
+    modality = 'identification'  # set modality as 'identification'
+    bw = 80  # Placeholder body weight
+    scenario = 'multi-meal'
+    cgm_model = 'CGM'
+    working_dir = tempfile.mkdtemp(prefix='replay_bg_')
+
+    try:
+        rbg = ReplayBG(modality=modality, data=subset_df, bw=bw, scenario=scenario,
+                       save_name='', save_folder=working_dir, n_steps=n_steps,
+                       cgm_model=cgm_model,
+                       seed=1,
+                       plot_mode=False,
+                       verbose=True,  # Turn of when training in server
+                       analyze_results=False,)
+
+        # Run identification
+        rbg.run(data=subset_df, bw=bw)
+    finally:
+        # Delete the automatically stored draws after run
+        shutil.rmtree(working_dir, ignore_errors=True)
 
-        return mean_state, cov_state
+    # Initialize some default model parameters that for some reason are commented out in ReplayBG
+    rbg.model.model_parameters.ka1 = 0.0034  # 1/min (virtually 0 in 77% of the cases)
+    mp = rbg.model.model_parameters
+    rbg.model.model_parameters.beta = (mp.beta_B + mp.beta_L + mp.beta_D) / 3
 
-    def correct(self, measurement, sigma_v):
-        """
-        Correct/update the particle weights based on the measurement, and resample.
+    return dill.dumps(rbg)
 
-        Parameters:
-            measurement (float): The new measurement.
-            sigma_v (float): Measurement noise standard deviation.
 
-        Returns:
-            tuple: Corrected state estimate and its covariance.
-        """
-        # Update weights based on measurement likelihood
-        for i in range(self.num_particles):
-            expected_measurement = self.measurement_fn(self.particles[i][8], measurement, sigma_v)
-            self.weights[i] *= expected_measurement
-
-        # Normalize weights
-        self.weights += 1.e-300  # avoid division by zero
-        self.weights /= np.sum(self.weights)
-
-        # Resample particles to avoid degeneracy
-        indexes = self.resample_particles()
-        self.particles = self.particles[indexes]
-        self.weights = np.ones(self.num_particles) / self.num_particles  # Reset weights after resampling
-
-        # Calculate the new state estimate and covariance
-        mean_state = np.mean(self.particles, axis=0)
-        cov_state = np.cov(self.particles, rowvar=False)
-
-        return mean_state, cov_state
-
-    def resample_particles(self):
-        """Resample particles proportionally to their weight."""
-        cumulative_sum = np.cumsum(self.weights)
-        cumulative_sum[-1] = 1.0  # ensure sum is exactly one
-        return np.searchsorted(cumulative_sum, np.random.random(self.num_particles))
-
-
-class MockModelParameters:
-    def __init__(self):
-        self.bw = 100
-        self.beta_B = 1.9210921467522486
-        self.beta_L = 7.227110102827593
-        self.beta_D = 22.740130507858265
-        self.beta = (self.beta_B + self.beta_L + self.beta_D) / 3
-        self.tau = 8
-        self.u2ss = 0.1291666666666666
-        self.ka1 = 0.0034
-        self.ka2 = 0.0004536788602030393
-        self.kd = 0.09433329008933948
-        self.kabs_D = 0.02161163589225169
-        self.kabs_B = 0.020427660145477033
-        self.kabs_L = 0.0012429702583311433
-        self.Xpb = 0.0
-        self.SI_D = 0.0007412325384855292
-        self.SI_B = 0.0007072567151272324
-        self.SI_L = 0.0007701611742637199
-        self.Gb = 140.98122622460085
-        self.r2 = 0.8124
-        self.ke = 0.127
-        self.kgri = 0.28500571715267026
-        self.kempt = 0.28500571715267026
-        self.f = 0.9
-        self.p2 = 0.012
-        self.VI = 0.126
-        self.SG = 0.018425998653797095
-        self.VG = 1.45
-        self.alpha = 7
-        self.TS = None
+def get_data_hash(df):
+    """
+    Returns a hash of the columns and values of a dataframe, to tell whether a checkpoint was identified from it.
+    """
+    data_hash = hashlib.sha256(str(list(df.columns)).encode())
+    data_hash.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return data_hash.hexdigest()[:16]
 
 
 def print_progress_bar(iteration, total, prefix='Progress:', suffix='Complete', decimals=1, length=50, fill='█',
@@ -1,3 +1,4 @@
+from glupredkit.helpers.ridge_solver import fit_weighted_ridge
 from glupredkit.helpers.scikit_learn import process_data
 from .base_model import BaseModel
 from sklearn.preprocessing import StandardScaler
@@ -18,8 +19,9 @@ class Model(BaseModel):
         # Simple linear model with multiple outputs
         self.model = None
         # TODO: Make this adjustable on input, to decide which loss function to use
-        #self.criterion = nn.MSELoss()
-        self.criterion = CustomLoss(alpha=0.1)
+        # The weighted squared error is solved in closed form, other losses like CustomLoss(alpha=0.1) are trained
+        # iteratively
+        self.criterion = WeightedMSELoss()
 
         self.scaler = None
         self.y_scaler = None
@@ -39,37 +41,37 @@ class Model(BaseModel):
 
         # Dataframe with delta bg
         df_delta_bg = y_train.diff().fillna(0.0)
-
-        # Convert DataFrames to lists of lists and compute weights
-        y_train_list = y_train.to_numpy().tolist()
-        df_delta_bg_list = df_delta_bg.to_numpy().tolist()
-        weights = [
-            [self.get_weight(bg, delta_bg) for bg, delta_bg in zip(row_y, row_delta)]
-            for row_y, row_delta in zip(y_train_list, df_delta_bg_list)
-        ]
-
-        #weights = y_train.applymap(self.get_weight)
-        weights = torch.tensor(weights, dtype=torch.float32).to(self.device)
+        weights = self.get_weight(y_train.to_numpy(), df_delta_bg.to_numpy())
 
         y_scaler = StandardScaler()
         y_train = y_scaler.fit_transform(y_train.values)
         self.y_scaler = y_scaler
 
+        if isinstance(self.criterion, WeightedMSELoss):
+            # The loss is quadratic, so the coefficients where the iterative training converges are solved directly.
+            # The loss is a mean over the samples, so the L2 penalty is scaled by the number of samples.
+            coefficients, intercepts = fit_weighted_ridge(x_train, y_train, weights, self.alpha * len(x_train))
+            with torch.no_grad():
+                self.model.weight.copy_(torch.tensor(coefficients.T, dtype=torch.float32))
+                self.model.bias.copy_(torch.tensor(intercepts, dtype=torch.float32))
+            return self
+
+        weights = torch.tensor(weights, dtype=torch.float32).to(self.device)
+
         # Convert DataFrame to PyTorch tensors
         X_train = torch.tensor(x_train, dtype=torch.float32).to(self.device)
         y_train = torch.tensor(y_train, dtype=torch.float32).to(self.device)
         X_train, y_train = X_train.to(self.device), y_train.to(self.device)
 
-        # Optimizer with L2 penalty (Ridge regularization)
-        # optimizer = optim.SGD(self.model.parameters(), lr=learning_rate, weight_decay=self.alpha)
-        optimizer = optim.Adam(self.model.parameters(), lr=learning_rate) #, weight_decay=self.alpha)
+        optimizer = optim.Adam(self.model.parameters(), lr=learning_rate)
 
         for epoch in range(epochs):
             self.model.train()
 
-            # Forward pass
+            # Forward pass, with the L2 penalty (Ridge regularization) of the coefficients of each output
             y_pred = self.model(X_train)
             loss = self.criterion.forward(y_pred, y_train, weights)
+            loss = loss + self.alpha * torch.sum(self.model.weight ** 2) / self.output_dim
 
             # Backward pass
             optimizer.zero_grad()
@@ -107,10 +109,7 @@ class Model(BaseModel):
         return weight
 
     def zone_cost(self, bg, target=105):
-        if bg < 1:
-            bg = 1
-        if bg > 600:
-            bg = 600
+        bg = np.clip(bg, 1, 600)
 
         # This function assumes BG in mg / dL
         constant = 32.9170208165394
@@ -119,10 +118,8 @@ class Model(BaseModel):
         left_weight = 19.0
         right_weight = 1.0
 
-        if bg < target:
-            risk = constant * left_weight * (np.log(bg) - np.log(target)) ** 2
-        else:
-            risk = constant * right_weight * (np.log(bg) - np.log(target)) ** 2
+        weight = np.where(bg < target, left_weight, right_weight)
+        risk = constant * weight * (np.log(bg) - np.log(target)) ** 2
 
         return risk
 
@@ -133,20 +130,21 @@ class Model(BaseModel):
 
         k = 18.0182
         # This function assumes mmol/L
-        bg = bg / k
-        delta_bg = delta_bg / k
+        bg = np.asarray(bg) / k
+        delta_bg = np.asarray(delta_bg) / k
 
-        a = bg
-        b = 15 - bg
-        if b < 0:
-            b = 0
-        if a > 15:
-            a = 15
+        a = np.minimum(bg, 15)
+        b = np.maximum(15 - bg, 0)
 
         cost = (np.sign(delta_bg) + 1) / 2 * a * (delta_bg ** 2) - 2 * (np.sign(delta_bg) - 1) / 2 * b * (delta_bg ** 2)
         return cost
 
 
+class WeightedMSELoss(nn.Module):
+    def forward(self, y_pred, y_true, weights):
+        return torch.mean(weights * (y_pred - y_true) ** 2)
+
+
 class CustomLoss(nn.Module):
     def __init__(self, alpha=0.1, target=105):
         super(CustomLoss, self).__init__()
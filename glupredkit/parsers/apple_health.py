@@ -3,6 +3,7 @@ The Apple Health parser is processing the raw .xml data from Apple Health export
 the same time grid in a dataframe.
 """
 from .base_parser import BaseParser
+from .intervals import expand_to_grid
 import xml.etree.ElementTree as ET
 import pandas as pd
 
@@ -35,11 +36,11 @@ def get_data_frame_for_type(data, type, name):
     return df
 
 
-def add_activity_states(df, start_date, end_date, workout_type):
-    start_date = pd.to_datetime(start_date).tz_localize(df.index.tz)
-    end_date = pd.to_datetime(end_date).tz_localize(df.index.tz)
-    date_mask = df.index.to_series().between(start_date, end_date)
-    df.loc[date_mask, 'activity_state'] = workout_type
+def add_activity_states(df, start_dates, end_dates, workout_types):
+    start_dates = pd.DatetimeIndex(start_dates).tz_localize(df.index.tz)
+    end_dates = pd.DatetimeIndex(end_dates).tz_localize(df.index.tz)
+    df['activity_state'] = expand_to_grid(df.index, start_dates, end_dates, workout_types, mode='label',
+                                          base=df['activity_state'].to_numpy(), closed='both')
 
 
 class Parser(BaseParser):
@@ -120,9 +121,7 @@ class Parser(BaseParser):
 
         # Add workouts
         df['activity_state'] = "None"
-        # Loop through each row in workout_data and call add_activity_states
-        for index, row in workout_data.iterrows():
-            add_activity_states(df, row['startDate'], row['endDate'], row['workoutActivityType'])
+        add_activity_states(df, workout_data['startDate'], workout_data['endDate'], workout_data['workoutActivityType'])
 
         # Add hour of day
         df['hour'] = df.index.hour
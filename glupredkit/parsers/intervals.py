@@ -0,0 +1,149 @@
+"""
+Expansion of events with a duration, like basal rates, temporary basals and workouts, into the rows of a time grid.
+
+`expand_to_grid` assigns the intervals to the points of an existing time grid, and `split_intervals` splits the
+intervals into pieces of a fixed length from their start, to be resampled into a grid. The points covered by each
+interval are found with `searchsorted` on the grid, and the (interval, point) pairs are expanded with `np.repeat`, so
+the cost is proportional to the number of covered points instead of one pass over the grid per interval.
+
+The value of an interval is interpreted by its mode:
+    - 'label': The value is assigned to the covered points, like a workout type or a temporary basal rate.
+    - 'rate': The value is a rate that is added to the covered points, so that overlapping rates are summed.
+    - 'amount': The value is a total, like calories or insulin, that is divided between the covered points or pieces.
+    - 'percent': The value is a percent of the base value, which scales the value of the covered points.
+"""
+import numpy as np
+import pandas as pd
+
+MODES = ('label', 'rate', 'amount', 'percent')
+
+
+def _get_covered_points(grid, start, end, closed):
+    """
+    Returns the interval and the grid position of each point covered by the intervals, in the order of the intervals.
+    Intervals with a missing start or end cover no points.
+    """
+    if closed not in ('both', 'left', 'right', 'neither'):
+        raise ValueError(f"closed must be 'both', 'left', 'right' or 'neither', got {closed}.")
+    grid = pd.DatetimeIndex(grid)
+    order = None
+    if not grid.is_monotonic_increasing:
+        order = np.argsort(grid, kind='stable')
+        grid = grid[order]
+    start = pd.DatetimeIndex(start)
+    end = pd.DatetimeIndex(end)
+
+    first = grid.searchsorted(start, side='left' if closed in ('both', 'left') else 'right')
+    last = grid.searchsorted(end, side='right' if closed in ('both', 'right') else 'left')
+    counts = np.where(start.isna() | end.isna(), 0, np.maximum(last - first, 0))
+
+    intervals = np.repeat(np.arange(len(start)), counts)
+    positions = np.arange(len(intervals)) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(first, counts)
+    if order is not None:
+        positions = order[positions]
+    return intervals, positions, counts
+
+
+def expand_to_grid(grid, start, end, value, mode='label', base=np.nan, closed='left', overlap='last'):
+    """
+    Returns the values of the points of a time grid, after applying the intervals to the base values.
+
+    Args:
+        grid (pd.DatetimeIndex): The dates of the grid points.
+        start (array-like): The start date of each interval.
+        end (array-like): The end date of each interval.
+        value (array-like): The value of each interval.
+        mode (str or array-like): The mode of all intervals, or of each interval, from 'label', 'rate', 'amount' and
+            'percent'. The intervals are applied in their order, so that a label replaces the values of the earlier
+            intervals, and a percent scales them. Percents cannot be combined with rates and amounts.
+        base (scalar or array-like): The values of the grid points before the intervals are applied.
+        closed (str): Whether the start and end of the intervals cover the grid points at those dates, one of 'both',
+            'left', 'right' and 'neither'.
+        overlap (str): For labels, whether the 'last' or the 'first' of the overlapping intervals is used.
+
+    Returns:
+        np.ndarray: The value of each grid point.
+    """
+    if overlap not in ('last', 'first'):
+        raise ValueError(f"overlap must be 'last' or 'first', got {overlap}.")
+    value = np.asarray(value)
+    modes = np.broadcast_to(np.asarray(mode), value.shape)
+    unknown_modes = set(np.unique(modes)) - set(MODES)
+    if unknown_modes:
+        raise ValueError(f"Unknown interval modes {sorted(unknown_modes)}, expected {MODES}.")
+    if (modes == 'percent').any() and np.isin(modes, ['rate', 'amount']).any():
+        raise ValueError("Percents cannot be combined with rates and amounts.")
+
+    base = np.broadcast_to(np.asarray(base), (len(grid),))
+    values = base.astype(np.result_type(base, value))
+    intervals, positions, counts = _get_covered_points(grid, start, end, closed)
+    if len(intervals) == 0:
+        return values
+
+    # The label that is assigned to each point, and which is not changed by the earlier intervals
+    is_label = modes[intervals] == 'label'
+    if overlap == 'last':
+        label_intervals = np.full(len(values), -1)
+        np.maximum.at(label_intervals, positions[is_label], intervals[is_label])
+    else:
+        label_intervals = np.full(len(values), len(value))
+        np.minimum.at(label_intervals, positions[is_label], intervals[is_label])
+        label_intervals[label_intervals == len(value)] = -1
+    is_labelled = label_intervals >= 0
+    values[is_labelled] = value[label_intervals[is_labelled]]
+
+    # The other intervals are applied in order, after the label of their points
+    is_applied = ~is_label & (intervals > label_intervals[positions])
+    intervals, positions = intervals[is_applied], positions[is_applied]
+    applied_modes = modes[intervals]
+    is_percent = applied_modes == 'percent'
+    if is_percent.any():
+        np.multiply.at(values, positions[is_percent], value[intervals[is_percent]] / 100)
+    is_added = ~is_percent
+    if is_added.any():
+        # Amounts are divided between the points of their interval
+        divisors = np.where(applied_modes[is_added] == 'amount', counts[intervals[is_added]], 1)
+        np.add.at(values, positions[is_added], value[intervals[is_added]] / divisors)
+    return values
+
+
+def split_intervals(start, end, columns, freq='5min'):
+    """
+    Splits intervals into pieces of a fixed length from their start, where the last piece of an interval ends at the
+    end of the interval. Intervals with a missing start or end, or that end before they start, are dropped.
+
+    Args:
+        start (array-like): The start date of each interval.
+        end (array-like): The end date of each interval.
+        columns (dict): The value and mode of each column of the pieces, like {'basal': (rates, 'rate')}. The value of
+            a piece is the value of its interval for 'label', the rate times the fraction of `freq` that the piece
+            covers for 'rate', and the fraction of the amount of its interval that it covers for 'amount'.
+        freq (str or pd.Timedelta): The length of the pieces.
+
+    Returns:
+        pd.DataFrame: The pieces, indexed by their start date.
+    """
+    start = pd.DatetimeIndex(start)
+    end = pd.DatetimeIndex(end)
+    freq = pd.Timedelta(freq)
+    durations = end - start
+    counts = np.ceil(durations / freq)
+    counts = np.where(np.isnan(counts), 0, np.maximum(counts, 0)).astype(int)
+
+    intervals = np.repeat(np.arange(len(start)), counts)
+    pieces = np.arange(len(intervals)) - np.repeat(np.cumsum(counts) - counts, counts)
+    piece_start = start[intervals] + pieces * freq
+    piece_durations = np.minimum(piece_start + freq, end[intervals]) - piece_start
+
+    data = {}
+    for name, (value, mode) in columns.items():
+        value = np.asarray(value)[intervals]
+        if mode == 'label':
+            data[name] = value
+        elif mode == 'rate':
+            data[name] = value * (piece_durations / freq)
+        elif mode == 'amount':
+            data[name] = value * (piece_durations / durations[intervals])
+        else:
+            raise ValueError(f"Unknown piece mode {mode}, expected 'label', 'rate' or 'amount'.")
+    return pd.DataFrame(data, index=pd.DatetimeIndex(piece_start, name='date'))
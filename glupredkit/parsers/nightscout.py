@@ -2,6 +2,7 @@ import requests
 from aiohttp import ClientError, ClientConnectorError, ClientResponseError
 import nightscout
 from .base_parser import BaseParser
+from .intervals import expand_to_grid
 import pandas as pd
 import datetime
 import json
@@ -208,25 +209,21 @@ class Parser(BaseParser):
             # Sort temp basals chronologically
             temp_basals = temp_basals.sort_index()
             
-            for time, row in temp_basals.iterrows():
-                if pd.isna(row['duration']) or float(row['duration']) <= 0:
-                    continue
-                    
-                end_time = time + pd.Timedelta(minutes=float(row['duration']))
-                mask = (df.index >= time) & (df.index < end_time)
-                
-                # Get base rates for this period
-                base_rates = df.loc[mask, 'basal'].copy()
-                
-                if pd.notnull(row['basal']) and float(row['basal']) >= 0:
-                    # Absolute temp basal
-                    df.loc[mask, 'basal'] = float(row['basal'])
-                elif pd.notnull(row['percent_x']):
-                    # Percentage temp basal
-                    percent = float(row['percent_x'])
-                    multiplier = max(0, percent / 100)  # Ensure non-negative
-                    df.loc[mask, 'basal'] = base_rates * multiplier
-        
+            # Absolute temp basals replace the basal rate, and percentage temp basals scale it
+            durations = temp_basals['duration'].astype(float)
+            rates = temp_basals['basal'].astype(float)
+            percents = temp_basals['percent_x'].astype(float)
+            is_absolute = rates.notna() & (rates >= 0)
+            is_percent = ~is_absolute & percents.notna()
+            is_applied = ((durations > 0) & (is_absolute | is_percent)).to_numpy()
+
+            start_dates = temp_basals.index[is_applied]
+            end_dates = start_dates + pd.to_timedelta(durations[is_applied].to_numpy(), unit='m')
+            values = np.where(is_absolute, rates, percents.clip(lower=0))[is_applied]  # Ensure non-negative
+            modes = np.where(is_absolute, 'label', 'percent')[is_applied]
+            df['basal'] = expand_to_grid(df.index, start_dates, end_dates, values, mode=modes,
+                                         base=df['basal'].astype(float), closed='left')
+
         # Final validation
         df['basal'] = df['basal'].abs()
         return df
@@ -3,10 +3,10 @@ The Ohio T1DM parser is processing the raw .xml data from the Ohio T1DM datasets
 the same time grid in a dataframe.
 """
 from .base_parser import BaseParser
+from .intervals import expand_to_grid
 import xml.etree.ElementTree as ET
 import pandas as pd
 import os
-import datetime
 
 
 class Parser(BaseParser):
@@ -93,17 +93,13 @@ class Parser(BaseParser):
                                                        errors='coerce')
             df_temp_basal['ts_end'] = pd.to_datetime(df_temp_basal['ts_end'], format='%d-%m-%Y %H:%M:%S',
                                                      errors='coerce')
-            # Override the basal rates with the temp basal rate data
-            for index, row in df_temp_basal.iterrows():
-                def round_down_date_time(dt):
-                    delta_min = dt.minute % 5
-                    return datetime.datetime(dt.year, dt.month, dt.day, dt.hour, dt.minute - delta_min)
-
-                # Convert dates to nearest five minutes
-                start_date = round_down_date_time(row['ts_begin'])
-                end_date = round_down_date_time(row['ts_end'])
-                value = row['value']
-                df_basal.loc[start_date:end_date] = float(value)
+            # Override the basal rates with the temp basal rate data, from and including the five minutes of the start
+            # until and including the five minutes of the end
+            start_dates = df_temp_basal['ts_begin'].dt.floor('5min')
+            end_dates = df_temp_basal['ts_end'].dt.floor('5min')
+            values = df_temp_basal['value'].astype(float)
+            df_basal['basal'] = expand_to_grid(df_basal.index, start_dates, end_dates, values, mode='label',
+                                               base=df_basal['basal'], closed='both')
 
         # Merge basal into dataframe
         df_basal['basal'] = pd.to_numeric(df_basal['basal'], errors='coerce')
@@ -128,11 +124,10 @@ class Parser(BaseParser):
             df_exercise['duration'] = pd.to_numeric(df_exercise['duration'], errors='coerce')
             df_exercise['end_date'] = df_exercise['ts'] + pd.to_timedelta(df_exercise['duration'], unit='m')
             df_exercise.rename(columns={'ts': 'start_date', 'intensity': 'workout_intensity'}, inplace=True)
-            df['workout_intensity'] = 0
-            for idx, row in df_exercise.iterrows():
-                # Find the range in df that falls between start_date and end_date
-                mask = (df.index >= row['start_date']) & (df.index <= row['end_date'])
-                df.loc[mask, 'workout_intensity'] = row['workout_intensity']
+            # Find the range in df that falls between start_date and end_date
+            df['workout_intensity'] = expand_to_grid(df.index, df_exercise['start_date'], df_exercise['end_date'],
+                                                     df_exercise['workout_intensity'], mode='label', base=0,
+                                                     closed='both')
 
         df['is_test'] = is_test
         return df.sort_index()
@@ -3,417 +3,42 @@ import os
 import zipfile
 import re
 import numpy as np
-import psutil
+import io
 import json
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from .base_parser import BaseParser
+from .intervals import expand_to_grid
+
+ANDROID_APS_FILE = 'AndroidAPS Uploader.zip'
 
 
 class Parser(BaseParser):
     def __init__(self):
         super().__init__()
 
-    def __call__(self, file_path: str, *args):
+    def __call__(self, file_path: str, *args, n_workers=1):
         """
         file_path -- the file path to the folder that contains all the .zip files of the OpenAPS data.
-        """
-        merged_df = pd.DataFrame()
-
-        # List all files in the folder
-        files = [el for el in os.listdir(file_path) if el.endswith('.zip')]  # 142 subjects
-
-        # Process the files one by one
-        for file in files:
-            if file == 'AndroidAPS Uploader.zip':
-                with zipfile.ZipFile(file_path + 'AndroidAPS Uploader.zip', 'r') as zip_ref:
-                    # Find unique ids
-                    all_ids = np.unique([file.split('/')[0] for file in zip_ref.namelist() if not file.split('/')[0] == ''])
-
-                    for subject_id in all_ids:
-                        print(f'Processing {subject_id}...')
-
-                        def get_relevant_files(name):
-                            relevant_files = []
-
-                            for file_name in zip_ref.namelist():
-                                if file_name.startswith(subject_id) and file_name.endswith(f'{name}.json'):
-                                    relevant_files.append(file_name)
-                                    # print("FILE NAME", file_name)
+        n_workers -- the number of processes that parse subjects at the same time.
 
-                            # Check whether the file is found
-                            if not relevant_files:
-                                print(f"No files found  containing '{name}' in the name!")
-
-                            return relevant_files
-
-                        # Blood glucose
-                        entries_files = get_relevant_files('BgReadings')
-
-                        # Carbohydrates and insulin
-                        treatments_files = get_relevant_files('Treatments')
-
-                        # Basal rates
-                        basal_files = get_relevant_files('APSData')
-
-                        # Temporary basal rates
-                        temp_basal_files = get_relevant_files('TemporaryBasals')
-
-                        # Skip to next iteration if entries_files is empty
-                        if not entries_files or not treatments_files or not basal_files:
-                            print("Skipping to next subject...")
-                            continue
-
-                        all_entries_dfs = []
-                        for entries_file in entries_files:
-                            with zip_ref.open(entries_file) as f:
-                                entries_df = pd.read_json(f, convert_dates=False)
-
-                            entries_df['date'] = pd.to_datetime(entries_df['date'], unit='ms')
-                            entries_df['value'] = pd.to_numeric(entries_df['value'])
-                            entries_df = entries_df[['date', 'value']]
-                            entries_df.rename(columns={'value': 'CGM'}, inplace=True)
-                            entries_df.set_index('date', inplace=True)
-                            entries_df.sort_index(inplace=True)
-                            all_entries_dfs.append(entries_df)
-
-                        df = pd.concat(all_entries_dfs)
-                        df = df.resample('5min').mean()
-
-                        carbs_dfs = []
-                        bolus_dfs = []
-                        for treatments_file in treatments_files:
-                            with zip_ref.open(treatments_file) as f:
-                                treatments_df = pd.read_json(f, convert_dates=False)
-
-                            carbs_df = treatments_df.copy()[['date', 'carbs']]
-                            carbs_df['date'] = pd.to_datetime(carbs_df['date'], unit='ms')
-                            carbs_df['carbs'] = pd.to_numeric(carbs_df['carbs'])
-                            carbs_df.set_index('date', inplace=True)
-                            carbs_df.sort_index(inplace=True)
-                            carbs_df = carbs_df[carbs_df['carbs'].notna() & (carbs_df['carbs'] != 0)]
-                            carbs_dfs.append(carbs_df)
-
-                            bolus_df = treatments_df.copy()[['date', 'insulin']]
-                            bolus_df['date'] = pd.to_datetime(bolus_df['date'], unit='ms')
-                            bolus_df['insulin'] = pd.to_numeric(bolus_df['insulin'])
-                            bolus_df.rename(columns={'insulin': 'bolus'}, inplace=True)
-                            bolus_df.set_index('date', inplace=True)
-                            bolus_df.sort_index(inplace=True)
-                            bolus_df = bolus_df[bolus_df['bolus'].notna() & (bolus_df['bolus'] != 0)]
-                            bolus_dfs.append(bolus_df)
-
-                        df_carbs = pd.concat(carbs_dfs)
-                        df_carbs = drop_duplicates(df_carbs, 'carbs')
-                        df_carbs = df_carbs.resample('5min').sum().fillna(value=0)
-                        df = pd.merge(df, df_carbs, on="date", how='outer')
-                        df['carbs'] = df['carbs'].fillna(value=0.0)
-
-                        df_bolus = pd.concat(bolus_dfs)
-                        df_bolus = drop_duplicates(df_bolus, 'bolus')
-                        df_bolus = df_bolus.resample('5min').sum().fillna(value=0)
-                        df = pd.merge(df, df_bolus, on="date", how='outer')
-                        df['bolus'] = df['bolus'].fillna(value=0.0)
-
-                        all_basal_dfs = []
-                        for basal_file in basal_files:
-                            with zip_ref.open(basal_file) as f:
-                                basal_df = pd.read_json(f, convert_dates=False)
-                            basal_df = basal_df.copy()[['queuedOn', 'profile']]
-                            basal_df['queuedOn'] = pd.to_datetime(basal_df['queuedOn'], unit='ms')
-                            basal_df['profile'] = pd.to_numeric(basal_df['profile'].apply(lambda x: x['current_basal']))
-                            basal_df.rename(columns={'queuedOn': 'date', 'profile': 'basal'}, inplace=True)
-                            basal_df.set_index('date', inplace=True)
-                            basal_df.sort_index(inplace=True)
-                            all_basal_dfs.append(basal_df)
-
-                        df_basal = pd.concat(all_basal_dfs)
-                        df_basal = df_basal.resample('5min').last()
-                        df = pd.merge(df, df_basal, on="date", how='outer')
-
-                        # Override basal rates with temporary basal rates
-                        if len(temp_basal_files) > 0:
-                            all_temp_basal_dfs = []
-                            for temp_basal_file in temp_basal_files:
-                                with zip_ref.open(temp_basal_file) as f:
-                                    temp_basal_df = pd.read_json(f, convert_dates=False)
-                                temp_basal_df = temp_basal_df.copy()[
-                                    ['date', 'durationInMinutes', 'isAbsolute', 'percentRate', 'absoluteRate']]
-                                temp_basal_df['date'] = pd.to_datetime(temp_basal_df['date'], unit='ms')
-                                temp_basal_df.set_index('date', inplace=True)
-                                temp_basal_df.sort_index(inplace=True)
-                                temp_basal_df['durationInMinutes'] = pd.to_numeric(temp_basal_df['durationInMinutes'])
-                                temp_basal_df = temp_basal_df[temp_basal_df['durationInMinutes'] > 0]
-                                all_temp_basal_dfs.append(temp_basal_df)
-
-                            df_temp_basal = pd.concat(all_temp_basal_dfs)
-                            df_temp_basal = df_temp_basal.resample('5min').last()
-                            df_temp_basal['isAbsolute'] = df_temp_basal['isAbsolute'].astype('boolean')
-                            df = pd.merge(df, df_temp_basal, on="date", how='outer')
-
-                            # Forward fill temp_basal up to the number in the duration column
-                            for idx, row in df.iterrows():
-                                if not pd.isna(row['percentRate']) and not pd.isna(
-                                        row['durationInMinutes']) and not pd.isna(row['isAbsolute']):
-                                    fill_limit = int(
-                                        row['durationInMinutes'])  # duration in minutes, index freq is 5 minutes
-                                    timedeltas = range(5, int(row['durationInMinutes']), 5)
-
-                                    for timedelta in timedeltas:
-                                        fill_index = idx + pd.Timedelta(minutes=timedelta)
-                                        if fill_index in df.index:
-                                            df.loc[fill_index, 'percentRate'] = row['percentRate']
-                                            df.loc[fill_index, 'absoluteRate'] = row['absoluteRate']
-                                            df.loc[fill_index, 'isAbsolute'] = row['isAbsolute']
-
-                            df.loc[df['isAbsolute'] == False, 'absoluteRate'] = np.nan
-                            df['merged_basal'] = df['absoluteRate'].combine_first(df['basal'])
-
-                            # Check if temp basal is "Percentage". If yes, calculate from basal rate. Print those columns
-                            df.loc[df['isAbsolute'] == False, 'merged_basal'] = df['percentRate'] * df['basal'] / 100
-                            df.drop(columns=['durationInMinutes', 'isAbsolute', 'percentRate', 'absoluteRate', 'basal'],
-                                    inplace=True)
-                            df.rename(columns={'merged_basal': 'basal'}, inplace=True)
-
-                        # Merge bolus and basal into an insulin column
-                        df['insulin'] = df['bolus'] + df['basal'] * 5 / 60
-
-                        # Add id to a column
-                        df['id'] = subject_id
-
-                        merged_df = pd.concat([df, merged_df], ignore_index=False)
-                        print(f"Current memory usage: {get_memory_usage()} MB")
+        Each subject is parsed on its own, and its data is stored in a temporary partition on disk, so that the memory
+        of a worker is bounded by the data of one subject. The partitions are concatenated once at the end.
+        """
+        subjects = get_subjects(file_path)
 
+        with tempfile.TemporaryDirectory(prefix='open_aps_') as partition_dir:
+            tasks = [subject + (os.path.join(partition_dir, f'{i}.pkl'),) for i, subject in enumerate(subjects)]
+            if n_workers is None or n_workers <= 1 or not tasks:
+                partition_paths = [parse_subject(*task) for task in tasks]
             else:
-                id_name = file.split('.')[0]
-
-                print(f'Processing {file}...')
-                zip_file_path = file_path + file
-                sub_folder_path = 'direct-sharing-31/'
-
-                # Open the zip file
-                with zipfile.ZipFile(zip_file_path, 'r') as zip_ref:
-                    def get_relevant_files(name):
-                        relevant_files = []
-
-                        for file_name in zip_ref.namelist():
-                            if len(file_name.split('/')) == 2:
-                                if name in file_name.lower():
-                                    if file_name.endswith('.json'):
-                                        relevant_files.append(file_name)
-
-                        # Check whether the file is found
-                        if not relevant_files:
-                            print(f"No files found  containing '{name}' in the name!")
-
-                        return relevant_files
-
-                    # Blood glucose
-                    entries_files = get_relevant_files('entries')
-                    all_entries_dfs = []
-                    for entries_file in entries_files:
-                        with zip_ref.open(entries_file) as f:
-                            if entries_file.startswith(sub_folder_path):
-                                try:
-                                    entries_df = pd.read_json(f, convert_dates=False)
-                                except ValueError as e:
-                                    # Reset the file handle to the start
-                                    f.seek(0)
-                                    entries_df = pd.DataFrame()
-                                    print(f"Error parsing JSON directly: {e}")
-                                    for line in f:
-                                        try:
-                                            data = json.loads(line)
-                                            entries_df = entries_df._append(data, ignore_index=True)
-                                        except json.JSONDecodeError as json_err:
-                                            print(f"Skipping line due to error: {json_err}")
-                            else:
-                                entries_df = pd.read_json(f, convert_dates=False, lines=True)
-                            if entries_df.empty:
-                                continue
-                            entries_df['dateString'] = entries_df['dateString'].apply(parse_datetime_without_timezone)
-                            entries_df['sgv'] = pd.to_numeric(entries_df['sgv'])
-                            entries_df = entries_df[['dateString', 'sgv']]
-                            entries_df.rename(columns={'sgv': 'CGM', 'dateString': 'date'}, inplace=True)
-                            entries_df.set_index('date', inplace=True)
-                            entries_df.sort_index(inplace=True)
-                            all_entries_dfs.append(entries_df)
-
-                    if len(all_entries_dfs) == 0:
-                        print(f'No glucose entries for {file}. Skipping to next subject.')
-                        continue
-                    df = pd.concat(all_entries_dfs)
-                    df = df.resample('5min').mean()
-
-                    # Carbohydrates
-                    treatments_files = get_relevant_files('treatments')
-                    carbs_dfs = []
-                    bolus_dfs = []
-                    temp_basal_dfs = []
-                    for treatments_file in treatments_files:
-                        with zip_ref.open(treatments_file) as f:
-                            if treatments_file.startswith(sub_folder_path):
-                                treatments_df = pd.read_json(f, convert_dates=False)
-                            else:
-                                treatments_df = pd.read_json(f, convert_dates=False, lines=True)
-
-                            if treatments_df.empty:
-                                continue
-
-                            carbs_df = treatments_df.copy()[['created_at', 'carbs']]
-                            carbs_df['created_at'] = carbs_df['created_at'].apply(parse_datetime_without_timezone)
-                            carbs_df['carbs'] = pd.to_numeric(carbs_df['carbs'])
-                            carbs_df.rename(columns={'created_at': 'date'}, inplace=True)
-                            carbs_df.set_index('date', inplace=True)
-                            carbs_df.sort_index(inplace=True)
-                            carbs_df = carbs_df[carbs_df['carbs'].notna() & (carbs_df['carbs'] != 0)]
-                            carbs_dfs.append(carbs_df)
-
-                            bolus_df = treatments_df.copy()[['created_at', 'insulin']]
-                            bolus_df['created_at'] = bolus_df['created_at'].apply(parse_datetime_without_timezone)
-                            bolus_df['insulin'] = pd.to_numeric(bolus_df['insulin'])
-                            bolus_df.rename(columns={'created_at': 'date', 'insulin': 'bolus'}, inplace=True)
-                            bolus_df.set_index('date', inplace=True)
-                            bolus_df.sort_index(inplace=True)
-                            bolus_df = bolus_df[bolus_df['bolus'].notna() & (bolus_df['bolus'] != 0)]
-                            bolus_dfs.append(bolus_df)
-
-                            if not 'rate' in treatments_df.columns:
-                                if ('percent' in treatments_df.columns) and ('duration' in treatments_df.columns):
-                                    temp_basal_df = treatments_df.copy()[['created_at', 'percent', 'duration']]
-                                    temp_basal_df['temp'] = 'percentage'
-                                    temp_basal_df['created_at'] = temp_basal_df['created_at'].apply(
-                                        parse_datetime_without_timezone)
-                                    temp_basal_df['percent'] = pd.to_numeric(temp_basal_df['percent'],
-                                                                             errors='coerce') + 100
-                                    temp_basal_df.rename(columns={'created_at': 'date', 'percent': 'temp_basal'},
-                                                         inplace=True)
-                                elif ('absolute' in treatments_df.columns) and ('duration' in treatments_df.columns):
-                                    temp_basal_df = treatments_df.copy()[['created_at', 'absolute', 'duration']]
-                                    temp_basal_df['temp'] = np.nan
-                                    temp_basal_df['created_at'] = temp_basal_df['created_at'].apply(
-                                        parse_datetime_without_timezone)
-                                    temp_basal_df['absolute'] = pd.to_numeric(temp_basal_df['absolute'], errors='coerce')
-                                    temp_basal_df.rename(columns={'created_at': 'date', 'absolute': 'temp_basal'},
-                                                         inplace=True)
-                                else:
-                                    print("No columns for temporary basal is found! ")
-                                    print(f'Data columns are: {treatments_df.columns}')
-                                    print(f'EventTypes are: {treatments_df.eventType.unique()}')
-                                    temp_basal_df = pd.DataFrame()
-                            else:
-                                if 'temp' in treatments_df.columns:
-                                    temp_basal_df = treatments_df.copy()[['created_at', 'rate', 'duration', 'temp']]
-                                else:
-                                    temp_basal_df = treatments_df.copy()[['created_at', 'rate', 'duration']]
-                                    temp_basal_df['temp'] = None
-                                temp_basal_df['created_at'] = temp_basal_df['created_at'].apply(
-                                    parse_datetime_without_timezone)
-                                temp_basal_df['rate'] = pd.to_numeric(temp_basal_df['rate'], errors='coerce')
-                                temp_basal_df.rename(columns={'created_at': 'date', 'rate': 'temp_basal'}, inplace=True)
-                            if not temp_basal_df.empty:
-                                temp_basal_df.set_index('date', inplace=True)
-                                temp_basal_df.sort_index(inplace=True)
-                                temp_basal_df = temp_basal_df[temp_basal_df['temp_basal'].notna()]
-                                temp_basal_dfs.append(temp_basal_df)
-
-                    df_carbs = pd.concat(carbs_dfs)
-                    df_carbs = drop_duplicates(df_carbs, 'carbs')
-                    df_carbs = df_carbs.resample('5min').sum().fillna(value=0)
-                    df = pd.merge(df, df_carbs, on="date", how='outer')
-                    df['carbs'] = df['carbs'].fillna(value=0.0)
-
-                    df_bolus = pd.concat(bolus_dfs)
-                    df_bolus = drop_duplicates(df_bolus, 'bolus')
-                    df_bolus = df_bolus.resample('5min').sum().fillna(value=0)
-                    df = pd.merge(df, df_bolus, on="date", how='outer')
-                    df['bolus'] = df['bolus'].fillna(value=0.0)
-
-                    if temp_basal_df.empty:
-                        df['temp_basal'] = np.nan
-                        df['duration'] = np.nan
-                        df['temp'] = np.nan
-                    else:
-                        df_temp_basal = pd.concat(temp_basal_dfs)
-                        df_temp_basal = df_temp_basal.resample('5min').last()
-                        df = pd.merge(df, df_temp_basal, on="date", how='outer')
-
-                    # Forward fill temp_basal up to the number in the duration column
-                    for idx, row in df.iterrows():
-                        if not pd.isna(row['temp_basal']) and not pd.isna(row['duration']):
-                            fill_limit = int(row['duration'])  # duration in minutes, index freq is 5 minutes
-                            timedeltas = range(5, int(row['duration']), 5)
-
-                            for timedelta in timedeltas:
-                                fill_index = idx + pd.Timedelta(minutes=timedelta)
-                                if fill_index in df.index:
-                                    if pd.isna(df.loc[fill_index, 'temp_basal']):
-                                        df.loc[fill_index, 'temp_basal'] = row['temp_basal']
-                                        df.loc[fill_index, 'temp'] = row['temp']
-                                    else:
-                                        continue
-
-                    # Drop the duration column
-                    df.drop(columns='duration', inplace=True)
-
-                    # Basal rates
-                    profile_files = get_relevant_files('profile')
-                    for profile_file in profile_files:
-                        with zip_ref.open(profile_file) as f:
-                            if profile_file.startswith(sub_folder_path):
-                                basal_df = pd.read_json(f, convert_dates=False)
-                            else:
-                                basal_df = pd.read_json(f, convert_dates=False, lines=True)
-
-                            if 'store' in basal_df.columns:
-                                basal_df = basal_df[['store', 'startDate', 'defaultProfile']]
-                                basal_df['startDate'] = basal_df['startDate'].apply(parse_datetime_without_timezone)
-                                basal_df.set_index('startDate', inplace=True)
-
-                                # Drop duplicates based on the date part of the DatetimeIndex
-                                basal_df = basal_df[~basal_df.index.normalize().duplicated(keep='first')]
-                                basal_df.sort_index(inplace=True)
-
-                                df['basal'] = np.nan
-                                for idx, row in basal_df.iterrows():
-                                    if pd.isna(row['store']):
-                                        continue
-                                    basal_rates = row['store'][row['defaultProfile']]['basal']
-                                    for basal in basal_rates:
-                                        basal_time = datetime.strptime(basal['time'], "%H:%M").time()
-                                        # Create filter mask for main_df based on time and date
-                                        mask = (df.index >= idx) & (df.index.time >= basal_time)
-                                        df.loc[mask, 'basal'] = float(basal['value'])
-                            elif 'basal' in basal_df.columns:
-                                basal_df = basal_df[['basal', 'startDate']]
-                                basal_df['startDate'] = basal_df['startDate'].apply(parse_datetime_without_timezone)
-                                basal_df.set_index('startDate', inplace=True)
-
-                                # Drop duplicates based on the date part of the DatetimeIndex
-                                basal_df = basal_df[~basal_df.index.normalize().duplicated(keep='first')]
-                                basal_df.sort_index(inplace=True)
-
-                                df['basal'] = np.nan
-                                for idx, row in basal_df.iterrows():
-                                    basal_rates = row['basal']
-                                    for basal in basal_rates:
-                                        basal_time = datetime.strptime(basal['time'], "%H:%M").time()
-                                        # Create filter mask for main_df based on time and date
-                                        mask = (df.index >= idx) & (df.index.time >= basal_time)
-                                        df.loc[mask, 'basal'] = float(basal['value'])
-                            else:
-                                print(f"GET BASAL ERROR FOR {file}")
-
-                    df['merged_basal'] = df['temp_basal'].combine_first(df['basal'])
-
-                    # Check if temp basal is "Percentage". If yes, calculate from basal rate. Print those columns
-                    df.loc[df['temp'] == 'percentage', 'merged_basal'] = df['temp_basal'] * df['basal'] / 100
-                    df.drop(columns=['temp', 'temp_basal', 'basal'], inplace=True)
-                    df.rename(columns={'merged_basal': 'basal'}, inplace=True)
-                    df['insulin'] = df['bolus'] + df['basal'] * 5 / 60
-                    df['id'] = id_name
-
-                    print(f"Current memory usage: {get_memory_usage()} MB")
-                    merged_df = pd.concat([df, merged_df], ignore_index=False)
+                with ProcessPoolExecutor(max_workers=n_workers) as executor:
+                    partition_paths = list(executor.map(parse_subject, *zip(*tasks)))
+
+            # The latest parsed subject is first, like when each subject was added to the front of the merged data
+            dfs = [pd.read_pickle(path) for path in reversed(partition_paths) if path is not None]
+        merged_df = pd.concat(dfs, ignore_index=False) if dfs else pd.DataFrame()
 
         """
         # TODO: This should be removed to the CLI and check for all of the datasets
@@ -437,10 +62,471 @@ class Parser(BaseParser):
         """
         return merged_df
 
-def get_memory_usage():
-    process = psutil.Process(os.getpid())
-    mem_info = process.memory_info()
-    return mem_info.rss / (1024 ** 2)  # Return memory usage in MB
+
+def get_subjects(file_path):
+    """
+    Returns the zip file, the subject id and whether the zip file is the AndroidAPS uploader, for each subject.
+    """
+    subjects = []
+
+    # List all files in the folder
+    files = [el for el in os.listdir(file_path) if el.endswith('.zip')]  # 142 subjects
+    for file in files:
+        if file == ANDROID_APS_FILE:
+            with zipfile.ZipFile(file_path + file, 'r') as zip_ref:
+                # Find unique ids
+                all_ids = np.unique([file.split('/')[0] for file in zip_ref.namelist() if not file.split('/')[0] == ''])
+            subjects += [(file_path + file, subject_id, True) for subject_id in all_ids]
+        else:
+            subjects += [(file_path + file, file, False)]
+    return subjects
+
+
+def parse_subject(zip_file_path, subject, is_android_aps, partition_path):
+    """
+    Parses one subject and stores the data in partition_path. Returns partition_path, or None if the subject was
+    skipped.
+    """
+    if is_android_aps:
+        df = parse_android_aps_subject(zip_file_path, subject)
+    else:
+        df = parse_nightscout_subject(zip_file_path, subject)
+    if df is None:
+        return None
+
+    df.to_pickle(partition_path)
+    return partition_path
+
+
+def parse_android_aps_subject(zip_file_path, subject_id):
+    print(f'Processing {subject_id}...')
+
+    with zipfile.ZipFile(zip_file_path, 'r') as zip_ref:
+        def get_relevant_files(name):
+            relevant_files = []
+
+            for file_name in zip_ref.namelist():
+                if file_name.startswith(subject_id) and file_name.endswith(f'{name}.json'):
+                    relevant_files.append(file_name)
+                    # print("FILE NAME", file_name)
+
+            # Check whether the file is found
+            if not relevant_files:
+                print(f"No files found  containing '{name}' in the name!")
+
+            return relevant_files
+
+        # Blood glucose
+        entries_files = get_relevant_files('BgReadings')
+
+        # Carbohydrates and insulin
+        treatments_files = get_relevant_files('Treatments')
+
+        # Basal rates
+        basal_files = get_relevant_files('APSData')
+
+        # Temporary basal rates
+        temp_basal_files = get_relevant_files('TemporaryBasals')
+
+        # Skip to next iteration if entries_files is empty
+        if not entries_files or not treatments_files or not basal_files:
+            print("Skipping to next subject...")
+            return None
+
+        all_entries_dfs = []
+        for entries_file in entries_files:
+            with zip_ref.open(entries_file) as f:
+                entries_df = read_json(f, ['date', 'value'])
+
+            entries_df['date'] = pd.to_datetime(entries_df['date'], unit='ms')
+            entries_df['value'] = pd.to_numeric(entries_df['value'])
+            entries_df = entries_df[['date', 'value']]
+            entries_df.rename(columns={'value': 'CGM'}, inplace=True)
+            entries_df.set_index('date', inplace=True)
+            entries_df.sort_index(inplace=True)
+            all_entries_dfs.append(entries_df)
+
+        df = pd.concat(all_entries_dfs)
+        df = df.resample('5min').mean()
+
+        carbs_dfs = []
+        bolus_dfs = []
+        for treatments_file in treatments_files:
+            with zip_ref.open(treatments_file) as f:
+                treatments_df = read_json(f, ['date', 'carbs', 'insulin'])
+
+            carbs_df = treatments_df.copy()[['date', 'carbs']]
+            carbs_df['date'] = pd.to_datetime(carbs_df['date'], unit='ms')
+            carbs_df['carbs'] = pd.to_numeric(carbs_df['carbs'])
+            carbs_df.set_index('date', inplace=True)
+            carbs_df.sort_index(inplace=True)
+            carbs_df = carbs_df[carbs_df['carbs'].notna() & (carbs_df['carbs'] != 0)]
+            carbs_dfs.append(carbs_df)
+
+            bolus_df = treatments_df.copy()[['date', 'insulin']]
+            bolus_df['date'] = pd.to_datetime(bolus_df['date'], unit='ms')
+            bolus_df['insulin'] = pd.to_numeric(bolus_df['insulin'])
+            bolus_df.rename(columns={'insulin': 'bolus'}, inplace=True)
+            bolus_df.set_index('date', inplace=True)
+            bolus_df.sort_index(inplace=True)
+            bolus_df = bolus_df[bolus_df['bolus'].notna() & (bolus_df['bolus'] != 0)]
+            bolus_dfs.append(bolus_df)
+
+        df_carbs = pd.concat(carbs_dfs)
+        df_carbs = drop_duplicates(df_carbs, 'carbs')
+        df_carbs = df_carbs.resample('5min').sum().fillna(value=0)
+        df = pd.merge(df, df_carbs, on="date", how='outer')
+        df['carbs'] = df['carbs'].fillna(value=0.0)
+
+        df_bolus = pd.concat(bolus_dfs)
+        df_bolus = drop_duplicates(df_bolus, 'bolus')
+        df_bolus = df_bolus.resample('5min').sum().fillna(value=0)
+        df = pd.merge(df, df_bolus, on="date", how='outer')
+        df['bolus'] = df['bolus'].fillna(value=0.0)
+
+        all_basal_dfs = []
+        for basal_file in basal_files:
+            with zip_ref.open(basal_file) as f:
+                basal_df = read_json(f, ['queuedOn', 'profile'])
+            basal_df = basal_df.copy()[['queuedOn', 'profile']]
+            basal_df['queuedOn'] = pd.to_datetime(basal_df['queuedOn'], unit='ms')
+            basal_df['profile'] = pd.to_numeric(basal_df['profile'].apply(lambda x: x['current_basal']))
+            basal_df.rename(columns={'queuedOn': 'date', 'profile': 'basal'}, inplace=True)
+            basal_df.set_index('date', inplace=True)
+            basal_df.sort_index(inplace=True)
+            all_basal_dfs.append(basal_df)
+
+        df_basal = pd.concat(all_basal_dfs)
+        df_basal = df_basal.resample('5min').last()
+        df = pd.merge(df, df_basal, on="date", how='outer')
+
+        # Override basal rates with temporary basal rates
+        if len(temp_basal_files) > 0:
+            all_temp_basal_dfs = []
+            for temp_basal_file in temp_basal_files:
+                with zip_ref.open(temp_basal_file) as f:
+                    temp_basal_df = read_json(
+                        f, ['date', 'durationInMinutes', 'isAbsolute', 'percentRate', 'absoluteRate'])
+                temp_basal_df = temp_basal_df.copy()[
+                    ['date', 'durationInMinutes', 'isAbsolute', 'percentRate', 'absoluteRate']]
+                temp_basal_df['date'] = pd.to_datetime(temp_basal_df['date'], unit='ms')
+                temp_basal_df.set_index('date', inplace=True)
+                temp_basal_df.sort_index(inplace=True)
+                temp_basal_df['durationInMinutes'] = pd.to_numeric(temp_basal_df['durationInMinutes'])
+                temp_basal_df = temp_basal_df[temp_basal_df['durationInMinutes'] > 0]
+                all_temp_basal_dfs.append(temp_basal_df)
+
+            df_temp_basal = pd.concat(all_temp_basal_dfs)
+            df_temp_basal = df_temp_basal.resample('5min').last()
+            df_temp_basal['isAbsolute'] = df_temp_basal['isAbsolute'].astype('boolean')
+            df = pd.merge(df, df_temp_basal, on="date", how='outer')
+
+            # Forward fill temp_basal up to the number in the duration column
+            fill_temp_basals(df, ['percentRate', 'absoluteRate', 'isAbsolute'], 'durationInMinutes',
+                             required_columns=['percentRate', 'isAbsolute'])
+
+            df.loc[df['isAbsolute'] == False, 'absoluteRate'] = np.nan
+            df['merged_basal'] = df['absoluteRate'].combine_first(df['basal'])
+
+            # Check if temp basal is "Percentage". If yes, calculate from basal rate. Print those columns
+            df.loc[df['isAbsolute'] == False, 'merged_basal'] = df['percentRate'] * df['basal'] / 100
+            df.drop(columns=['durationInMinutes', 'isAbsolute', 'percentRate', 'absoluteRate', 'basal'],
+                    inplace=True)
+            df.rename(columns={'merged_basal': 'basal'}, inplace=True)
+
+        # Merge bolus and basal into an insulin column
+        df['insulin'] = df['bolus'] + df['basal'] * 5 / 60
+
+        # Add id to a column
+        df['id'] = subject_id
+
+        return df
+
+
+def parse_nightscout_subject(zip_file_path, file):
+    id_name = file.split('.')[0]
+
+    print(f'Processing {file}...')
+
+    # Open the zip file
+    with zipfile.ZipFile(zip_file_path, 'r') as zip_ref:
+        def get_relevant_files(name):
+            relevant_files = []
+
+            for file_name in zip_ref.namelist():
+                if len(file_name.split('/')) == 2:
+                    if name in file_name.lower():
+                        if file_name.endswith('.json'):
+                            relevant_files.append(file_name)
+
+            # Check whether the file is found
+            if not relevant_files:
+                print(f"No files found  containing '{name}' in the name!")
+
+            return relevant_files
+
+        # Blood glucose
+        entries_files = get_relevant_files('entries')
+        all_entries_dfs = []
+        for entries_file in entries_files:
+            with zip_ref.open(entries_file) as f:
+                entries_df = read_json(f, ['dateString', 'sgv'])
+                if entries_df.empty:
+                    continue
+                entries_df['dateString'] = entries_df['dateString'].apply(parse_datetime_without_timezone)
+                entries_df['sgv'] = pd.to_numeric(entries_df['sgv'])
+                entries_df = entries_df[['dateString', 'sgv']]
+                entries_df.rename(columns={'sgv': 'CGM', 'dateString': 'date'}, inplace=True)
+                entries_df.set_index('date', inplace=True)
+                entries_df.sort_index(inplace=True)
+                all_entries_dfs.append(entries_df)
+
+        if len(all_entries_dfs) == 0:
+            print(f'No glucose entries for {file}. Skipping to next subject.')
+            return None
+        df = pd.concat(all_entries_dfs)
+        df = df.resample('5min').mean()
+
+        # Carbohydrates
+        treatments_files = get_relevant_files('treatments')
+        carbs_dfs = []
+        bolus_dfs = []
+        temp_basal_dfs = []
+        for treatments_file in treatments_files:
+            with zip_ref.open(treatments_file) as f:
+                treatments_df = read_json(f, ['created_at', 'carbs', 'insulin', 'rate', 'duration', 'temp', 'percent',
+                                              'absolute', 'eventType'])
+
+                if treatments_df.empty:
+                    continue
+
+                carbs_df = treatments_df.copy()[['created_at', 'carbs']]
+                carbs_df['created_at'] = carbs_df['created_at'].apply(parse_datetime_without_timezone)
+                carbs_df['carbs'] = pd.to_numeric(carbs_df['carbs'])
+                carbs_df.rename(columns={'created_at': 'date'}, inplace=True)
+                carbs_df.set_index('date', inplace=True)
+                carbs_df.sort_index(inplace=True)
+                carbs_df = carbs_df[carbs_df['carbs'].notna() & (carbs_df['carbs'] != 0)]
+                carbs_dfs.append(carbs_df)
+
+                bolus_df = treatments_df.copy()[['created_at', 'insulin']]
+                bolus_df['created_at'] = bolus_df['created_at'].apply(parse_datetime_without_timezone)
+                bolus_df['insulin'] = pd.to_numeric(bolus_df['insulin'])
+                bolus_df.rename(columns={'created_at': 'date', 'insulin': 'bolus'}, inplace=True)
+                bolus_df.set_index('date', inplace=True)
+                bolus_df.sort_index(inplace=True)
+                bolus_df = bolus_df[bolus_df['bolus'].notna() & (bolus_df['bolus'] != 0)]
+                bolus_dfs.append(bolus_df)
+
+                if not 'rate' in treatments_df.columns:
+                    if ('percent' in treatments_df.columns) and ('duration' in treatments_df.columns):
+                        temp_basal_df = treatments_df.copy()[['created_at', 'percent', 'duration']]
+                        temp_basal_df['temp'] = 'percentage'
+                        temp_basal_df['created_at'] = temp_basal_df['created_at'].apply(
+                            parse_datetime_without_timezone)
+                        temp_basal_df['percent'] = pd.to_numeric(temp_basal_df['percent'],
+                                                                 errors='coerce') + 100
+                        temp_basal_df.rename(columns={'created_at': 'date', 'percent': 'temp_basal'},
+                                             inplace=True)
+                    elif ('absolute' in treatments_df.columns) and ('duration' in treatments_df.columns):
+                        temp_basal_df = treatments_df.copy()[['created_at', 'absolute', 'duration']]
+                        temp_basal_df['temp'] = np.nan
+                        temp_basal_df['created_at'] = temp_basal_df['created_at'].apply(
+                            parse_datetime_without_timezone)
+                        temp_basal_df['absolute'] = pd.to_numeric(temp_basal_df['absolute'], errors='coerce')
+                        temp_basal_df.rename(columns={'created_at': 'date', 'absolute': 'temp_basal'},
+                                             inplace=True)
+                    else:
+                        print("No columns for temporary basal is found! ")
+                        print(f'Data columns are: {treatments_df.columns}')
+                        print(f'EventTypes are: {treatments_df.eventType.unique()}')
+                        temp_basal_df = pd.DataFrame()
+                else:
+                    if 'temp' in treatments_df.columns:
+                        temp_basal_df = treatments_df.copy()[['created_at', 'rate', 'duration', 'temp']]
+                    else:
+                        temp_basal_df = treatments_df.copy()[['created_at', 'rate', 'duration']]
+                        temp_basal_df['temp'] = None
+                    temp_basal_df['created_at'] = temp_basal_df['created_at'].apply(
+                        parse_datetime_without_timezone)
+                    temp_basal_df['rate'] = pd.to_numeric(temp_basal_df['rate'], errors='coerce')
+                    temp_basal_df.rename(columns={'created_at': 'date', 'rate': 'temp_basal'}, inplace=True)
+                if not temp_basal_df.empty:
+                    temp_basal_df.set_index('date', inplace=True)
+                    temp_basal_df.sort_index(inplace=True)
+                    temp_basal_df = temp_basal_df[temp_basal_df['temp_basal'].notna()]
+                    temp_basal_dfs.append(temp_basal_df)
+
+        df_carbs = pd.concat(carbs_dfs)
+        df_carbs = drop_duplicates(df_carbs, 'carbs')
+        df_carbs = df_carbs.resample('5min').sum().fillna(value=0)
+        df = pd.merge(df, df_carbs, on="date", how='outer')
+        df['carbs'] = df['carbs'].fillna(value=0.0)
+
+        df_bolus = pd.concat(bolus_dfs)
+        df_bolus = drop_duplicates(df_bolus, 'bolus')
+        df_bolus = df_bolus.resample('5min').sum().fillna(value=0)
+        df = pd.merge(df, df_bolus, on="date", how='outer')
+        df['bolus'] = df['bolus'].fillna(value=0.0)
+
+        if temp_basal_df.empty:
+            df['temp_basal'] = np.nan
+            df['duration'] = np.nan
+            df['temp'] = np.nan
+        else:
+            df_temp_basal = pd.concat(temp_basal_dfs)
+            df_temp_basal = df_temp_basal.resample('5min').last()
+            df = pd.merge(df, df_temp_basal, on="date", how='outer')
+
+        # Forward fill temp_basal up to the number in the duration column, without replacing other temp basals
+        fill_temp_basals(df, ['temp_basal', 'temp'], 'duration', required_columns=['temp_basal'],
+                         only_missing='temp_basal')
+
+        # Drop the duration column
+        df.drop(columns='duration', inplace=True)
+
+        # Basal rates
+        profile_files = get_relevant_files('profile')
+        for profile_file in profile_files:
+            with zip_ref.open(profile_file) as f:
+                basal_df = read_json(f, ['store', 'startDate', 'defaultProfile', 'basal'])
+
+                if 'store' in basal_df.columns:
+                    basal_df = basal_df[['store', 'startDate', 'defaultProfile']]
+                    basal_df['startDate'] = basal_df['startDate'].apply(parse_datetime_without_timezone)
+                    basal_df.set_index('startDate', inplace=True)
+
+                    # Drop duplicates based on the date part of the DatetimeIndex
+                    basal_df = basal_df[~basal_df.index.normalize().duplicated(keep='first')]
+                    basal_df.sort_index(inplace=True)
+
+                    df['basal'] = np.nan
+                    for idx, row in basal_df.iterrows():
+                        if pd.isna(row['store']):
+                            continue
+                        basal_rates = row['store'][row['defaultProfile']]['basal']
+                        for basal in basal_rates:
+                            basal_time = datetime.strptime(basal['time'], "%H:%M").time()
+                            # Create filter mask for main_df based on time and date
+                            mask = (df.index >= idx) & (df.index.time >= basal_time)
+                            df.loc[mask, 'basal'] = float(basal['value'])
+                elif 'basal' in basal_df.columns:
+                    basal_df = basal_df[['basal', 'startDate']]
+                    basal_df['startDate'] = basal_df['startDate'].apply(parse_datetime_without_timezone)
+                    basal_df.set_index('startDate', inplace=True)
+
+                    # Drop duplicates based on the date part of the DatetimeIndex
+                    basal_df = basal_df[~basal_df.index.normalize().duplicated(keep='first')]
+                    basal_df.sort_index(inplace=True)
+
+                    df['basal'] = np.nan
+                    for idx, row in basal_df.iterrows():
+                        basal_rates = row['basal']
+                        for basal in basal_rates:
+                            basal_time = datetime.strptime(basal['time'], "%H:%M").time()
+                            # Create filter mask for main_df based on time and date
+                            mask = (df.index >= idx) & (df.index.time >= basal_time)
+                            df.loc[mask, 'basal'] = float(basal['value'])
+                else:
+                    print(f"GET BASAL ERROR FOR {file}")
+
+        df['merged_basal'] = df['temp_basal'].combine_first(df['basal'])
+
+        # Check if temp basal is "Percentage". If yes, calculate from basal rate. Print those columns
+        df.loc[df['temp'] == 'percentage', 'merged_basal'] = df['temp_basal'] * df['basal'] / 100
+        df.drop(columns=['temp', 'temp_basal', 'basal'], inplace=True)
+        df.rename(columns={'merged_basal': 'basal'}, inplace=True)
+        df['insulin'] = df['bolus'] + df['basal'] * 5 / 60
+        df['id'] = id_name
+
+        return df
+
+
+def read_json(f, columns, chunk_size=1 << 20):
+    """
+    Reads the given columns of the records in a JSON file, which is either a JSON array or JSON lines. The file is read
+    and decoded in chunks, and only the given columns are kept, so the memory does not grow with the other fields of the
+    records. Lines that are not valid JSON are skipped.
+
+    Returns:
+        pd.DataFrame: One row per record, with the given columns that are in at least one record.
+    """
+    text = io.TextIOWrapper(f, encoding='utf-8')
+    decoder = json.JSONDecoder()
+    values = {col: [] for col in columns}
+    is_present = dict.fromkeys(columns, False)
+
+    buffer = text.read(chunk_size)
+    position = len(buffer) - len(buffer.lstrip())
+    is_array = buffer.startswith('[', position)
+    if is_array:
+        position += 1
+    is_end_of_file = False
+    while True:
+        # Skip the whitespace, and the commas between the records of an array
+        while position < len(buffer) and (buffer[position].isspace() or (is_array and buffer[position] == ',')):
+            position += 1
+        if position == len(buffer):
+            if is_end_of_file:
+                break
+            chunk = text.read(chunk_size)
+            is_end_of_file = not chunk
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        if is_array and buffer[position] == ']':
+            break
+
+        try:
+            record, end = decoder.raw_decode(buffer, position)
+            is_complete = end < len(buffer) or is_end_of_file
+        except json.JSONDecodeError as json_err:
+            record, end, is_complete = None, None, False
+            if is_end_of_file or (not is_array and '\n' in buffer[position:]):
+                # An invalid record, which is skipped until the next line
+                print(f"Skipping line due to error: {json_err}")
+                next_line = buffer.find('\n', position)
+                position = len(buffer) if next_line < 0 else next_line + 1
+                continue
+        if not is_complete:
+            # The record continues in the next chunk
+            chunk = text.read(chunk_size)
+            is_end_of_file = not chunk
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+
+        position = end
+        if isinstance(record, dict):
+            for col in columns:
+                value = record.get(col)
+                values[col].append(value)
+                is_present[col] = is_present[col] or col in record
+
+    return pd.DataFrame({col: values[col] for col in columns if is_present[col]})
+
+
+def fill_temp_basals(df, columns, duration_column, required_columns, only_missing=None):
+    """
+    Forward fills the columns of each temporary basal in the five-minute grid of df, until the duration in minutes in
+    duration_column ends. Each row where the required columns and the duration are present is a temporary basal. The
+    rows are filled from the latest temporary basal that started before them, or, when only_missing is a column, only
+    the rows where that column is missing are filled, from the earliest temporary basal.
+    """
+    is_temp_basal = df[required_columns + [duration_column]].notna().all(axis=1).to_numpy()
+    temp_basal_rows = np.flatnonzero(is_temp_basal)
+    start_dates = df.index[temp_basal_rows]
+    # The duration is truncated to whole minutes
+    durations = df[duration_column].iloc[temp_basal_rows].astype(float).astype(int)
+    end_dates = start_dates + pd.to_timedelta(durations.to_numpy(), unit='min')
+
+    source_rows = expand_to_grid(df.index, start_dates, end_dates, temp_basal_rows, mode='label', base=-1,
+                                 closed='neither', overlap='last' if only_missing is None else 'first')
+    is_filled = source_rows >= 0
+    if only_missing is not None:
+        is_filled &= df[only_missing].isna().to_numpy()
+    filled_rows = np.flatnonzero(is_filled)
+    for col in columns:
+        df.iloc[filled_rows, df.columns.get_loc(col)] = df[col].to_numpy()[source_rows[filled_rows]]
+
 
 # TODO: We need to also look for possible duplicates across unique subject ids
 def drop_duplicates(df_with_duplications, col):
@@ -3,6 +3,7 @@ The Tidepool Dataset parser is processing the data from the Researcher datasets
 the same time grid in a dataframe.
 """
 from .base_parser import BaseParser
+from .intervals import split_intervals
 import pandas as pd
 import os
 import numpy as np
@@ -119,15 +120,9 @@ class Parser(BaseParser):
         # TODO: Verify that basals are correctly added according to schedule / percentage / temp basals...
         df_basal = df[df['type'] == 'basal'][['time', 'duration', 'rate', 'units']]
         df_basal.rename(columns={"time": "date", "rate": "basal"}, inplace=True)
-        df_basal['duration'] = df_basal['duration'] / 1000  # convert to seconds
         df_basal.sort_values(by='date', inplace=True, ascending=True)
         # We need to split each sample into five minute intervals, and create new rows for each five minutes
-        expanded_rows = []
-        for _, row in df_basal.iterrows():
-            intervals = split_basal_into_intervals(row)
-            expanded_rows.extend(intervals)
-        df_basal = pd.DataFrame(expanded_rows)
-        df_basal.set_index('date', inplace=True)
+        df_basal = split_basal_into_intervals(df_basal)
 
         # Dataframe carbohydrates
         df_carbs = pd.DataFrame()
@@ -153,76 +148,37 @@ class Parser(BaseParser):
                     df_workouts.rename(columns={"time": "date", "activityName": "workout_label"}, inplace=True)
                     df_workouts.sort_values(by='date', inplace=True, ascending=True)
                     # We need to split each sample into five minute intervals, and create new rows for each five minutes
-                    expanded_rows = []
-                    for _, row in df_workouts.iterrows():
-                        intervals = split_workouts_into_intervals(row)
-                        expanded_rows.extend(intervals)
-                    df_workouts = pd.DataFrame(expanded_rows)
-                    df_workouts.set_index('date', inplace=True)
+                    df_workouts = split_workouts_into_intervals(df_workouts)
                 else:
                     print("No duration registered for physical activity!")
 
         return df_glucose, df_bolus, df_basal, df_carbs, df_workouts
 
 
-def split_basal_into_intervals(row):
-    start = row.date
-    end = start + timedelta(seconds=row['duration'])
-    total_insulin_delivered = row['basal'] * row['duration'] / 60
-    interval = timedelta(minutes=5)
-
-    # Track rows for the new DataFrame
-    rows = []
-    current = start
-
-    while current < end:
-        next_interval = min(current + interval, end)
-        # Calculate the proportion of time in the 5-minute bin
-        proportion = (next_interval - current) / timedelta(minutes=row['duration'])
-        bin_value = total_insulin_delivered * proportion
-
-        # Add the row to the list
-        rows.append({
-            'date': current,
-            'basal': bin_value * 12  # Convert back to U/hr when we are done
-        })
-        current = next_interval
-
-    return rows
-
-
-def split_workouts_into_intervals(row):
-    start = row.date
-    if not pd.isna(row['activityDuration.value']):
-        end = start + timedelta(seconds=row['activityDuration.value'])
-    else:
-        end = start + timedelta(seconds=10)
-    bin_value = row['workout_label']
-    if 'energy.value' in row:
-        total_calories_burned = row['energy.value']
+def split_basal_into_intervals(df_basal):
+    """
+    Splits the basal rates into five-minute intervals from their start. The basal of an interval is the rate times the
+    fraction of five minutes that it covers, so that the sum of a five-minute bin is the mean rate in U/hr.
+    """
+    # The duration is in milliseconds
+    end = df_basal['date'] + pd.to_timedelta(df_basal['duration'], unit='ms')
+    return split_intervals(df_basal['date'], end, {'basal': (df_basal['basal'], 'rate')}, freq='5min')
+
+
+def split_workouts_into_intervals(df_workouts):
+    """
+    Splits the workouts into five-minute intervals from their start, with the workout label and the fraction of the
+    calories burned in each interval. Workouts without a duration last ten seconds.
+    """
+    duration = pd.to_timedelta(df_workouts['activityDuration.value'], unit='s').fillna(timedelta(seconds=10))
+    if 'energy.value' in df_workouts.columns:
+        total_calories_burned = df_workouts['energy.value']
     else:
-        total_calories_burned = np.nan
-    interval = timedelta(minutes=5)
-    total_duration = (end - start).total_seconds()
-
-    # Track rows for the new DataFrame
-    rows = []
-    current = start
-
-    while current < end:
-        next_interval = min(current + interval, end)
-
-        proportion = (next_interval - current).total_seconds() / total_duration
-        calories_burned = total_calories_burned * proportion
-
-        # Add the row to the list
-        rows.append({
-            'date': current,
-            'workout_label': bin_value,
-            'calories_burned': calories_burned
-        })
-        current = next_interval
-    return rows
+        total_calories_burned = np.full(len(df_workouts), np.nan)
+    return split_intervals(df_workouts['date'], df_workouts['date'] + duration, {
+        'workout_label': (df_workouts['workout_label'], 'label'),
+        'calories_burned': (total_calories_burned, 'amount')
+    }, freq='5min')
 
 
 def get_dfs_and_ids(file_path, all_dfs, all_ids, is_test_bools, is_test, id_prefix):
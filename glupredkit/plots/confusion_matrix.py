@@ -1,6 +1,5 @@
 import matplotlib.pyplot as plt
 import os
-import ast
 import numpy as np
 import seaborn as sns
 from datetime import datetime
@@ -30,14 +29,7 @@ class Plot(BasePlot):
 
             results = []
             for prediction_horizon in prediction_horizons:
-                percentages = df[f'glycemia_detection_{prediction_horizon}'][0]
-                if isinstance(percentages, str):
-                    percentages = percentages.replace("nan", "None")
-                    percentages = ast.literal_eval(percentages)
-                percentages = [
-                    [np.nan if x is None else x for x in sublist] for sublist in percentages
-                ]
-                results += [percentages]
+                results += [df[f'glycemia_detection_{prediction_horizon}'][0]]
 
             matrix_array = np.array(results)
             average_matrix = np.nanmean(matrix_array, axis=0)
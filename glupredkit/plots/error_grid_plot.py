@@ -1,6 +1,5 @@
 import matplotlib.pyplot as plt
 import numpy as np
-import ast
 from .base_plot import BasePlot
 from methcomp import parkes, clarke
 from glupredkit.helpers.unit_config_manager import unit_config_manager
@@ -36,25 +35,17 @@ class Plot(BasePlot):
             y_true_values = []
             y_pred_values = []
             for prediction_horizon in prediction_horizons:
-                y_true = df[f'target_{prediction_horizon}'][0].replace("nan", "None")
-                y_pred = df[f'y_pred_{prediction_horizon}'][0].replace("nan", "None")
-                y_true = ast.literal_eval(y_true)
-                y_pred = ast.literal_eval(y_pred)
-                y_true = [np.nan if x is None else x for x in y_true]
-                y_pred = [np.nan if x is None else x for x in y_pred]
+                y_true = df[f'target_{prediction_horizon}'][0]
+                y_pred = df[f'y_pred_{prediction_horizon}'][0]
+                valid = np.isfinite(y_true) & np.isfinite(y_pred)
 
-                filtered_pairs = [(x, y) for x, y in zip(y_true, y_pred) if np.isfinite(x) and np.isfinite(y)]
-
-                # Ensure filtered_pairs is not empty
-                if not filtered_pairs:
+                # Ensure there are valid pairs
+                if not valid.any():
                     print("No valid pairs of true and predicted values!")
                     return np.full((3, 3), np.nan)
 
-                # Unpack the filtered pairs
-                y_true, y_pred = map(list, zip(*filtered_pairs))
-
-                y_true_values += y_true
-                y_pred_values += y_pred
+                y_true_values += y_true[valid].tolist()
+                y_pred_values += y_pred[valid].tolist()
 
             if unit_config_manager.get_unit() == 'mmol/L':
                 y_true_values = [unit_config_manager.convert_value(val) for val in y_true_values]
@@ -1,5 +1,5 @@
 import matplotlib.pyplot as plt
-import ast
+import numpy as np
 import math
 from .base_plot import BasePlot
 from methcomp import parkeszones, clarkezones
@@ -32,17 +32,12 @@ class Plot(BasePlot):
             y_true_values = []
             y_pred_values = []
             for prediction_horizon in prediction_horizons:
-                y_true = df[f'target_{prediction_horizon}'][0].replace("nan", "None")
-                y_pred = df[f'y_pred_{prediction_horizon}'][0].replace("nan", "None")
-                y_true = ast.literal_eval(y_true)
-                y_pred = ast.literal_eval(y_pred)
+                y_true = df[f'target_{prediction_horizon}'][0]
+                y_pred = df[f'y_pred_{prediction_horizon}'][0]
+                valid = ~np.isnan(y_true) & ~np.isnan(y_pred)
 
-                filtered_y_true, filtered_y_pred = zip(
-                    *[(x, y) for x, y in zip(y_true, y_pred) if x is not None and y is not None]
-                )
-
-                y_true_values += filtered_y_true
-                y_pred_values += filtered_y_pred
+                y_true_values += y_true[valid].tolist()
+                y_pred_values += y_pred[valid].tolist()
 
             if type == 'parkes':
                 zones = parkeszones(1, y_true_values, y_pred_values, units="mgdl", numeric=False)
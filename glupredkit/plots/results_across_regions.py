@@ -1,7 +1,6 @@
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-import ast
 from .base_plot import BasePlot
 from glupredkit.helpers.unit_config_manager import unit_config_manager
 
@@ -23,18 +22,12 @@ class Plot(BasePlot):
             model_name = df['Model Name'][0]
 
             # Get results:
-            y_true = df[f'target_{prediction_horizon}'][0].replace("nan", "None")
-            y_true = ast.literal_eval(y_true)
-            y_true = np.array(y_true)
-            y_pred = df[f'y_pred_{prediction_horizon}'][0].replace("nan", "None")
-            y_pred = ast.literal_eval(y_pred)
-            y_pred = np.array(y_pred)
+            y_true = df[f'target_{prediction_horizon}'][0]
+            y_pred = df[f'y_pred_{prediction_horizon}'][0]
 
             # Remove nan predictions
-            y_true, y_pred = map(
-                np.array,
-                zip(*[(x, y) for x, y in zip(y_true, y_pred) if x is not None and y is not None])
-            )
+            valid = ~np.isnan(y_true) & ~np.isnan(y_pred)
+            y_true, y_pred = y_true[valid], y_pred[valid]
 
             # Define bins based on y_true values
             bin_edges = [0, 70, 180, np.inf]  # Bins: <70, 70-180, >180
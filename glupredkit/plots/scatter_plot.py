@@ -1,8 +1,6 @@
 import matplotlib.pyplot as plt
 import itertools
 import os
-import ast
-import numpy as np
 from datetime import datetime
 from .base_plot import BasePlot
 from glupredkit.helpers.unit_config_manager import unit_config_manager
@@ -39,17 +37,11 @@ class Plot(BasePlot):
                                  "trained model. Please provide a valid prediction horizon.")
 
             y_true = df[f'target_{prediction_horizon}'][0]
-            y_true = ast.literal_eval(y_true)
-
             y_pred = df[f'y_pred_{prediction_horizon}'][0]
 
-            y_pred = y_pred.replace("nan", "None")
-            y_pred = ast.literal_eval(y_pred)
-            y_pred = [np.nan if val is None else val for val in y_pred]
-
             if not unit_config_manager.use_mgdl:
-                y_pred = [unit_config_manager.convert_value(val) for val in y_pred]
-                y_true = [unit_config_manager.convert_value(val) for val in y_true]
+                y_pred = unit_config_manager.convert_value(y_pred)
+                y_true = unit_config_manager.convert_value(y_true)
 
             marker = next(markers)
 
@@ -1,7 +1,5 @@
 import matplotlib.pyplot as plt
 import matplotlib.patches as patches
-import numpy as np
-import ast
 from .base_plot import BasePlot
 from matplotlib.lines import Line2D
 from glupredkit.helpers.unit_config_manager import unit_config_manager
@@ -25,15 +23,15 @@ class Plot(BasePlot):
         for df in dfs:
             model_name = df['Model Name'][0]
 
-            y_pred = get_list_from_string(df, f'y_pred_{prediction_horizon}')[start_index:start_index + n_samples]
-            y_true = get_list_from_string(df, 'test_input_CGM')[start_index:start_index + n_samples]
+            y_pred = df[f'y_pred_{prediction_horizon}'][0][start_index:start_index + n_samples]
+            y_true = df['test_input_CGM'][0][start_index:start_index + n_samples]
 
             if unit_config_manager.use_mgdl:
                 hypo = 70
                 hyper = 180
             else:
-                y_pred = [unit_config_manager.convert_value(val) for val in y_pred]
-                y_true = [unit_config_manager.convert_value(val) for val in y_true]
+                y_pred = unit_config_manager.convert_value(y_pred)
+                y_true = unit_config_manager.convert_value(y_true)
                 hypo = 3.9
                 hyper = 10.0
 
@@ -119,10 +117,3 @@ class Plot(BasePlot):
             plt.close()
 
         return plots, names
-
-def get_list_from_string(df, col):
-    string_values = df[col][0]
-    string_values = string_values.replace("nan", "None")
-    list_values = ast.literal_eval(string_values)
-    list_values = [np.nan if x is None else x for x in list_values]
-    return list_values
@@ -1,5 +1,4 @@
 from .base_plot import BasePlot
-import ast
 import random
 import numpy as np
 import matplotlib.pyplot as plt
@@ -43,9 +42,6 @@ class Plot(BasePlot):
 
             # TODO: Use CGM input!
             y_true = df[f'target_5'][0]
-            string_values = y_true.replace("nan", "None")
-            y_true = ast.literal_eval(string_values)
-            y_true = [np.nan if x is None else x for x in y_true]
             n_samples = 12*24
 
             if len(y_true) - n_samples > len(y_true):
@@ -57,15 +53,12 @@ class Plot(BasePlot):
 
             for ph in prediction_horizons:
                 y_pred = df[f'y_pred_{ph}'][0]
-                y_pred = y_pred.replace("nan", "None")
-                y_pred = ast.literal_eval(y_pred)
-                y_pred = [np.nan if val is None else val for val in y_pred]
 
                 if not unit_config_manager.use_mgdl:
-                    y_pred = [unit_config_manager.convert_value(val) for val in y_pred]
+                    y_pred = unit_config_manager.convert_value(y_pred)
                 y_pred_lists += [y_pred]
 
-            y_true = np.array(y_true)[start_index:start_index + n_samples]
+            y_true = y_true[start_index:start_index + n_samples]
             y_pred_lists = np.array(y_pred_lists)
             y_pred_lists = np.transpose(y_pred_lists)[1 + start_index:start_index + n_samples + 1]
 
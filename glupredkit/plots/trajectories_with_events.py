@@ -1,7 +1,5 @@
 from .base_plot import BasePlot
-import ast
 import random
-import re
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -45,9 +43,7 @@ class Plot(BasePlot):
             ph = int(df['prediction_horizon'][0])
             prediction_horizons = range(5, ph + 1, 5)
 
-            dates_string_list = df['test_input_date'][0]
-            datetime_strings = re.findall(r"'(.*?)'", dates_string_list)
-            timestamp_list = [pd.Timestamp(ts) for ts in datetime_strings]
+            timestamp_list = df['test_input_date'][0]
 
             # TODO: Only use the types that are present in the input
             # TODO: We only use the first 2000 elements to use data from only one subject...
@@ -55,11 +51,11 @@ class Plot(BasePlot):
             try:
                 model_df = pd.DataFrame({
                     'date': timestamp_list[:2000],
-                    'CGM': get_list_from_string(df, 'test_input_CGM')[:2000],
-                    'basal': get_list_from_string(df, 'test_input_basal')[:2000],
-                    'bolus': get_list_from_string(df, 'test_input_bolus')[:2000],
-                    'carbs': get_list_from_string(df, 'test_input_carbs')[:2000],
-                    #'exercise': get_list_from_string(df, 'test_input_exercise')[:2000],
+                    'CGM': df['test_input_CGM'][0][:2000],
+                    'basal': df['test_input_basal'][0][:2000],
+                    'bolus': df['test_input_bolus'][0][:2000],
+                    'carbs': df['test_input_carbs'][0][:2000],
+                    #'exercise': df['test_input_exercise'][0][:2000],
                 })
             except Exception as e:
                 print(f"Could not draw trajectories_with_events for {model_name}. Following feature in the model is "
@@ -68,7 +64,7 @@ class Plot(BasePlot):
 
             pred_cols = [col for col in df.columns if col.startswith('y_pred_')]
             for col in pred_cols:
-                model_df[col] = get_list_from_string(df, col)[:2000]
+                model_df[col] = df[col][0][:2000]
 
             model_df.set_index('date', inplace=True)
             full_time_range = pd.date_range(start=model_df.index.min(), end=model_df.index.max(), freq='5T')
@@ -204,11 +200,3 @@ class Plot(BasePlot):
             plt.close()
 
         return plots, names
-
-def get_list_from_string(df, col):
-    string_values = df[col][0]
-    string_values = string_values.replace("nan", "None")
-    list_values = ast.literal_eval(string_values)
-    list_values = [np.nan if x is None else x for x in list_values]
-    return list_values
-
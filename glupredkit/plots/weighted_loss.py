@@ -1,7 +1,6 @@
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-import ast
 from .base_plot import BasePlot
 from glupredkit.helpers.unit_config_manager import unit_config_manager
 
@@ -59,10 +58,8 @@ class Plot(BasePlot):
         for df in dfs:
             model_name = df['Model Name'][0]
             y_true = df[f'target_{prediction_horizon}'][0]  # PH doesnt really matter that much
-            y_true = ast.literal_eval(y_true)
-            y_pred = df[f'y_pred_{prediction_horizon}'][0]
-            y_pred = ast.literal_eval(y_pred)[1:]
-            y_diffs = [j-i for i, j in zip(y_true[:-1], y_true[1:])]
+            y_pred = df[f'y_pred_{prediction_horizon}'][0][1:]
+            y_diffs = np.diff(y_true)
             y_true = y_true[1:]  # Removing first element because we don't have corresponding diff for that value
             costs = [slope_cost(bg, delta_bg) + zone_cost(bg) + 1 for bg, delta_bg in zip(y_true, y_diffs)]
             # important to add 1 to the costs because we never want them to multiply errors with 0.0!
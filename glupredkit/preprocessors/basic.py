@@ -1,4 +1,5 @@
 from .base_preprocessor import BasePreprocessor
+from glupredkit.helpers.scikit_learn import build_feature_matrix
 import pandas as pd
 from sklearn.preprocessing import OneHotEncoder
 import numpy as np
@@ -33,8 +34,8 @@ class Preprocessor(BasePreprocessor):
         # Check if any numerical features have NaN values before imputation, add a column "flag"
         test_df.loc[:, 'imputed'] = test_df.loc[:, self.numerical_features].isna().any(axis=1)
 
-        processed_train_df = pd.DataFrame()
-        processed_test_df = pd.DataFrame()
+        processed_train_dfs = []
+        processed_test_dfs = []
 
         for subject_id in dataset_ids:
             subset_df_train = train_df[train_df['id'] == subject_id]
@@ -55,27 +56,22 @@ class Preprocessor(BasePreprocessor):
             # Add target for train data after interpolation to use interpolated data for model training
             subset_train_df_with_targets = self.add_targets(subset_df_train)
 
-            if add_time_lagged_features:
-                train_lagged_features = self.add_time_lagged_features(subset_train_df_with_targets, self.numerical_features,
-                                                                self.num_lagged_features)
-                test_lagged_features = self.add_time_lagged_features(subset_test_df_with_targets,
-                                                                      self.numerical_features,
-                                                                      self.num_lagged_features)
-                subset_train_df_with_targets = pd.concat([subset_train_df_with_targets, train_lagged_features], axis=1)
-                subset_test_df_with_targets = pd.concat([subset_test_df_with_targets, test_lagged_features], axis=1)
-
-            if add_what_if_features:
-                train_what_if_features = self.add_what_if_features(subset_train_df_with_targets, self.what_if_features,
-                                                                self.prediction_horizon)
-                test_what_if_features = self.add_what_if_features(subset_test_df_with_targets,
-                                                                      self.what_if_features,
-                                                                      self.prediction_horizon)
-                subset_train_df_with_targets = pd.concat([subset_train_df_with_targets, train_what_if_features], axis=1)
-                subset_test_df_with_targets = pd.concat([subset_test_df_with_targets, test_what_if_features], axis=1)
+            if add_time_lagged_features or add_what_if_features:
+                lagged_cols = self.numerical_features if add_time_lagged_features else []
+                what_if_cols = self.what_if_features if add_what_if_features else []
+                train_features = build_feature_matrix(subset_train_df_with_targets, lagged_cols,
+                                                      self.num_lagged_features, what_if_cols, self.prediction_horizon)
+                test_features = build_feature_matrix(subset_test_df_with_targets, lagged_cols,
+                                                     self.num_lagged_features, what_if_cols, self.prediction_horizon)
+                subset_train_df_with_targets = pd.concat([subset_train_df_with_targets, train_features], axis=1)
+                subset_test_df_with_targets = pd.concat([subset_test_df_with_targets, test_features], axis=1)
 
             # Add the processed data to the dataframes
-            processed_train_df = pd.concat([processed_train_df, subset_train_df_with_targets], axis=0)
-            processed_test_df = pd.concat([processed_test_df, subset_test_df_with_targets], axis=0)
+            processed_train_dfs.append(subset_train_df_with_targets)
+            processed_test_dfs.append(subset_test_df_with_targets)
+
+        processed_train_df = pd.concat(processed_train_dfs, axis=0) if processed_train_dfs else pd.DataFrame()
+        processed_test_df = pd.concat(processed_test_dfs, axis=0) if processed_test_dfs else pd.DataFrame()
 
         # Transform columns
         if self.categorical_features:
@@ -122,22 +118,7 @@ class Preprocessor(BasePreprocessor):
         return df
 
     def add_time_lagged_features(self, df, lagged_cols, num_lagged_features):
-        lagged_df = pd.DataFrame()
-        indexes = list(range(1, num_lagged_features + 1))
-
-        for col in lagged_cols:
-            for i in indexes:
-                new_col_name = col + "_" + str(i * 5)
-                lagged_df = pd.concat([lagged_df, df[col].shift(i).rename(new_col_name)], axis=1)
-        return lagged_df
+        return build_feature_matrix(df, lagged_cols, num_lagged_features, [], 0)
 
     def add_what_if_features(self, df, what_if_cols, prediction_horizon):
-        what_if_df = pd.DataFrame()
-        prediction_index = prediction_horizon // 5
-        indexes = list(range(1, prediction_index + 1))
-
-        for col in what_if_cols:
-            for i in indexes:
-                new_col_name = col + "_what_if_" + str(i * 5)
-                what_if_df = pd.concat([what_if_df, df[col].shift(-i).rename(new_col_name)], axis=1)
-        return what_if_df
+        return build_feature_matrix(df, [], 0, what_if_cols, prediction_horizon)
@@ -32,8 +32,8 @@ class Preprocessor(BasePreprocessor):
         # Check if any numerical features have NaN values before imputation, add a column "flag"
         test_df.loc[:, 'imputed'] = test_df.loc[:, self.numerical_features].isna().any(axis=1)
 
-        processed_train_df = pd.DataFrame()
-        processed_test_df = pd.DataFrame()
+        processed_train_dfs = []
+        processed_test_dfs = []
 
         for subject_id in dataset_ids:
             subset_df_train = train_df[train_df['id'] == subject_id]
@@ -68,8 +68,11 @@ class Preprocessor(BasePreprocessor):
                     scaler.transform(subset_test_df_with_targets.loc[:, self.numerical_features]))
 
             # Add the processed data to the dataframes
-            processed_train_df = pd.concat([processed_train_df, subset_train_df_with_targets], axis=0)
-            processed_test_df = pd.concat([processed_test_df, subset_test_df_with_targets], axis=0)
+            processed_train_dfs.append(subset_train_df_with_targets)
+            processed_test_dfs.append(subset_test_df_with_targets)
+
+        processed_train_df = pd.concat(processed_train_dfs, axis=0) if processed_train_dfs else pd.DataFrame()
+        processed_test_df = pd.concat(processed_test_dfs, axis=0) if processed_test_dfs else pd.DataFrame()
 
         if self.categorical_features:
             encoder = OneHotEncoder(drop='first')  # dropping the first column to avoid dummy variable trap
@@ -1,4 +1,5 @@
 import os
+import json
 import pytest
 import numpy as np
 import pandas as pd
@@ -9,7 +10,7 @@ matplotlib.use('Agg')  # Use a non-interactive backend
 from pathlib import Path
 from click.testing import CliRunner
 from glupredkit.cli import (setup_directories, generate_config, train_model, evaluate_model, generate_evaluation_pdf,
-                            generate_comparison_pdf, draw_plots)
+                            generate_comparison_pdf, draw_plots, run_experiments)
 
 
 @pytest.fixture(scope="session")
@@ -179,11 +180,31 @@ def test_evaluate_model(runner, temp_dir):
         assert result.exit_code == 0
 
         # Check if the model test file was created
-        output_file_name = f'{model}__{config}__60.csv'
+        output_file_name = f'{model}__{config}__60.npz'
         output_path = Path('data') / 'tested_models' / output_file_name
         assert output_path.exists(), f"Expected file {output_path} was not created"
 
 
+def test_train_and_evaluate_model_per_subject(runner, temp_dir):
+    config = 'my_config_1'
+
+    result = runner.invoke(train_model, [config, '--model', 'lstm', '--per-subject'])
+    assert result.exit_code != 0
+    assert "--per-subject is not supported for lstm" in result.output
+
+    # Two per-subject models on one configuration use their own processed data
+    for model in ['ridge', 'zero_order']:
+        model_name = f'{model}_per_subject'
+        result = runner.invoke(train_model, [config, '--model', model, '--model-name', model_name, '--per-subject',
+                                             '--n-workers', '2'])
+        assert result.exit_code == 0, result.output
+
+        result = runner.invoke(evaluate_model, [f'{model_name}__{config}__60.pkl', '--max-samples', '100'])
+        assert result.exit_code == 0, result.output
+        assert "Using cached processed test data..." not in result.output
+        assert (Path('data') / 'tested_models' / f'{model_name}__{config}__60.npz').exists()
+
+
 def test_generate_evaluation_pdf(runner, temp_dir):
     runner = CliRunner()
 
@@ -191,7 +212,7 @@ def test_generate_evaluation_pdf(runner, temp_dir):
     models = ['naive_linear_regressor', 'ridge', 'zero_order']
 
     for model in models:
-        result = runner.invoke(generate_evaluation_pdf, ['--results-file', f'{model}__{config}__60.csv'])
+        result = runner.invoke(generate_evaluation_pdf, ['--results-file', f'{model}__{config}__60.npz'])
         assert result.exit_code == 0
 
         # Check if reports were generated
@@ -211,8 +232,36 @@ def test_draw_plots(runner, temp_dir):
     runner = CliRunner()
 
     config = 'my_config_1'
-    results_files = f'naive_linear_regressor__{config}__60.csv,ridge__{config}__60.csv'
+    results_files = f'naive_linear_regressor__{config}__60.npz,ridge__{config}__60.npz'
 
     result = runner.invoke(draw_plots, ['--results-files', results_files, '--plots', 'scatter_plot', '--prediction-horizons', '30'])
     assert result.exit_code == 0
 
+
+def test_run_experiments(runner, temp_dir):
+    spec = {
+        'models': ['ridge', 'zero_order'],
+        'configs': ['my_config_1'],
+        'options': [{'model_name': '{model}_matrix'}],
+        'evaluate_options': {'max_samples': 100},
+    }
+    spec_path = Path('data') / 'my_experiments.json'
+    with open(spec_path, 'w') as f:
+        json.dump(spec, f)
+
+    result = runner.invoke(run_experiments, [str(spec_path), '--n-workers', '2'])
+    assert result.exit_code == 0
+    assert "2 of 2 experiments are finished." in result.output
+    for model in ['ridge', 'zero_order']:
+        assert (Path('data') / 'trained_models' / f'{model}_matrix__my_config_1__60.pkl').exists()
+        assert (Path('data') / 'tested_models' / f'{model}_matrix__my_config_1__60.npz').exists()
+
+    # The finished experiments are not run again
+    result = runner.invoke(run_experiments, [str(spec_path)])
+    assert result.exit_code == 0
+    assert "Finished" not in result.output
+    assert "2 of 2 experiments are finished." in result.output
+
+    result = runner.invoke(run_experiments, [str(spec_path), '--n-workers', '2', '--max-deep-learning-jobs', '0'])
+    assert result.exit_code == 2
+    assert "--max-deep-learning-jobs" in result.output
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+from glupredkit.helpers.dataset_store import write_dataset, read_dataset, is_dataset
+from glupredkit.helpers.cli import read_data_from_csv
+
+
+class ConfigManager:
+    def get_subject_ids(self):
+        return [2]
+
+    def get_num_features(self):
+        return ['CGM', 'carbs']
+
+    def get_cat_features(self):
+        return []
+
+    def get_what_if_features(self):
+        return ['carbs']
+
+
+def get_dataset(start='2024-03-30 22:00'):
+    # By default, the dates are across a daylight saving time change
+    index = pd.date_range(start, periods=12, freq='1h', tz='Europe/Oslo', name='date')
+    return pd.DataFrame({
+        'id': ['1', '2', '3'] * 4,
+        'CGM': np.linspace(80, 190, 12),
+        'carbs': [0.0, 20.0, np.nan] * 4,
+        'hour': index.hour,
+        'source': ['a', None, 'b'] * 4,
+        'is_test': [False] * 6 + [True] * 6,
+    }, index=index)
+
+
+def test_write_and_read_dataset(tmp_path):
+    df = get_dataset()
+    write_dataset(df, tmp_path / 'df')
+
+    assert is_dataset(tmp_path / 'df')
+    assert sorted(path.name for path in (tmp_path / 'df').glob('subject_*')) == ['subject_0', 'subject_1', 'subject_2']
+
+    result = read_dataset(tmp_path / 'df')
+    assert list(result.columns) == list(df.columns)
+    pd.testing.assert_index_equal(result.index, df.index)
+    assert result['CGM'].dtype == np.float32
+    assert result['is_test'].dtype == bool
+    assert result['id'].dtype == 'category'
+    # Numeric ids are read as numbers, like from a CSV file
+    assert result['id'].tolist() == [1, 2, 3] * 4
+    np.testing.assert_allclose(result['carbs'], df['carbs'], equal_nan=True)
+    assert (result['hour'] == df['hour']).all()
+    assert result['source'].tolist()[:3] == ['a', np.nan, 'b']
+
+
+def test_read_dataset_pushdown(tmp_path):
+    df = get_dataset()
+    write_dataset(df, tmp_path / 'df')
+
+    result = read_dataset(tmp_path / 'df', columns=['id', 'CGM'], subject_ids=[1, 3], is_test=True)
+    expected = df[df['id'].isin(['1', '3']) & df['is_test']]
+    assert list(result.columns) == ['id', 'CGM']
+    pd.testing.assert_index_equal(result.index, expected.index)
+    assert list(result['id'].cat.categories) == [1, 3]
+    np.testing.assert_allclose(result['CGM'], expected['CGM'], rtol=1e-6)
+
+
+def test_read_data_from_csv_with_config(tmp_path):
+    df = get_dataset(start='2024-05-01 00:00')
+    df.to_csv(tmp_path / 'df.csv')
+
+    from_csv = read_data_from_csv(tmp_path, 'df.csv', ConfigManager(), is_test=False)
+    write_dataset(pd.read_csv(tmp_path / 'df.csv', index_col='date', parse_dates=True), tmp_path / 'df')
+    from_dataset = read_data_from_csv(tmp_path, 'df.csv', ConfigManager(), is_test=False)
+
+    for result in [from_csv, from_dataset]:
+        assert list(result.columns) == ['id', 'CGM', 'carbs', 'is_test']
+        assert result['id'].tolist() == [2, 2]
+        assert not result['is_test'].any()
+    pd.testing.assert_frame_equal(from_dataset, from_csv, check_dtype=False, check_categorical=False)
@@ -0,0 +1,87 @@
+import json
+import pytest
+from glupredkit.helpers.experiments import get_jobs, get_options_args, run_experiments, EVALUATE, DONE, FAILED
+
+
+def get_prediction_horizon(config):
+    return {'config_1': 60, 'config_2': 180}[config]
+
+
+def run(job, phase, log_dir):
+    # Writes an output file for each task, so that the tasks can be checked also when run in worker processes
+    if job['model'] == 'failing' and phase == EVALUATE:
+        raise ValueError('Evaluation failed')
+    (log_dir / f"{job['id']}__{phase}").write_text('output')
+    with open(log_dir / 'tasks.txt', 'a') as f:
+        f.write(f"{job['id']} {phase}\n")
+
+
+def get_output_checker(output_dir):
+    def is_output_stored(job, phase):
+        return (output_dir / f"{job['id']}__{phase}").exists()
+    return is_output_stored
+
+
+def pop_tasks(output_dir):
+    with open(output_dir / 'tasks.txt') as f:
+        tasks = sorted(tuple(line.split()) for line in f.read().splitlines())
+    (output_dir / 'tasks.txt').unlink()
+    return tasks
+
+
+def test_get_jobs():
+    spec = {
+        'models': ['ridge', 'lstm'],
+        'configs': ['config_1', 'config_2'],
+        'options': [{'model_name': '{model}_short', 'epochs': 2}, {'model_name': '{model}_long', 'epochs': 20}],
+        'evaluate_options': {'max_samples': 100},
+    }
+    jobs = get_jobs(spec, get_prediction_horizon)
+
+    assert [job['id'] for job in jobs][:4] == ['ridge_short__config_1__60', 'ridge_long__config_1__60',
+                                               'lstm_short__config_1__60', 'lstm_long__config_1__60']
+    assert len(jobs) == 8
+    assert jobs[1]['train_options'] == {'epochs': 20}
+    assert jobs[1]['evaluate_options'] == {'max_samples': 100}
+
+    with pytest.raises(ValueError):
+        get_jobs({**spec, 'options': [{'epochs': 2}, {'epochs': 20}]}, get_prediction_horizon)
+
+
+def test_get_options_args():
+    assert get_options_args({'epochs': 10, 'early_abandon': True, 'no_cache': False, 'max_samples': None}) == [
+        '--epochs', '10', '--early-abandon']
+
+
+@pytest.mark.parametrize('n_workers', [1, 2])
+def test_run_experiments_resumes_unfinished_tasks(tmp_path, n_workers):
+    jobs = get_jobs({'models': ['ridge', 'failing', 'lstm'], 'configs': ['config_1']}, get_prediction_horizon)
+    ledger_path = tmp_path / 'experiment' / 'ledger.json'
+
+    ledger = run_experiments(jobs, ledger_path, n_workers=n_workers, log_dir=tmp_path, run=run,
+                             is_output_stored=get_output_checker(tmp_path))
+    assert pop_tasks(tmp_path) == [('failing__config_1__60', 'train'), ('lstm__config_1__60', 'evaluate'),
+                                   ('lstm__config_1__60', 'train'), ('ridge__config_1__60', 'evaluate'),
+                                   ('ridge__config_1__60', 'train')]
+    assert ledger['ridge__config_1__60']['status'] == DONE
+    assert ledger['failing__config_1__60']['status'] == FAILED
+    assert ledger['failing__config_1__60']['failed_phase'] == EVALUATE
+    assert 'Evaluation failed' in ledger['failing__config_1__60']['error']
+    with open(ledger_path) as f:
+        assert json.load(f) == ledger
+
+    # Only the failed evaluation and the cells with removed output files are run again
+    (tmp_path / 'lstm__config_1__60__train').unlink()
+    ledger = run_experiments(jobs, ledger_path, n_workers=n_workers, log_dir=tmp_path, run=run,
+                             is_output_stored=get_output_checker(tmp_path))
+    assert pop_tasks(tmp_path) == [('lstm__config_1__60', 'evaluate'), ('lstm__config_1__60', 'train')]
+    assert ledger['lstm__config_1__60']['status'] == DONE
+    assert ledger['failing__config_1__60']['status'] == FAILED
+
+
+def test_run_experiments_requires_a_deep_learning_slot(tmp_path):
+    jobs = get_jobs({'models': ['lstm'], 'configs': ['config_1']}, get_prediction_horizon)
+
+    with pytest.raises(ValueError):
+        run_experiments(jobs, tmp_path / 'ledger.json', n_workers=2, max_deep_learning_tasks=0, run=run,
+                        is_output_stored=get_output_checker(tmp_path))
@@ -0,0 +1,33 @@
+import numpy as np
+from glupredkit.helpers.grid_search import grid_search
+
+TARGETS = {'a': 1.0, 'b': -2.0}
+
+
+def get_score(group, candidate, max_score):
+    # Abandons a candidate when its score is higher than the best so far, like the Loop therapy settings search
+    score = abs(candidate - TARGETS[group])
+    return np.inf if score > max_score else score
+
+
+def test_grid_search():
+    candidates = {'a': [0.0, 0.5, 1.5, 2.0], 'b': [-3.0, -2.5, 0.0, -1.5]}
+    expected = {'a': (0.5, 0.5), 'b': (-2.5, 0.5)}
+
+    # Ties are resolved by candidate order, so the result is the same for all search modes
+    assert grid_search(get_score, candidates) == expected
+    assert grid_search(get_score, candidates, early_abandon=True) == expected
+    assert grid_search(get_score, candidates, n_workers=2) == expected
+    assert grid_search(get_score, candidates, n_workers=2, early_abandon=True) == expected
+
+
+def test_grid_search_callback():
+    evaluated = []
+    grid_search(get_score, {'a': [0.0, 1.0, 3.0]}, early_abandon=True,
+                callback=lambda group, candidate, score: evaluated.append((candidate, score)))
+
+    assert evaluated == [(0.0, 1.0), (1.0, 0.0), (3.0, np.inf)]
+
+
+def test_grid_search_without_finite_scores():
+    assert grid_search(lambda group, candidate, max_score: np.nan, {'a': [1, 2]}) == {'a': (None, np.inf)}
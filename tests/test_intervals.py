@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+from glupredkit.parsers.intervals import expand_to_grid, split_intervals
+
+
+@pytest.fixture
+def grid():
+    return pd.date_range('2024-01-01 00:00', periods=12, freq='5min')
+
+
+def dates(*minutes):
+    return pd.Timestamp('2024-01-01 00:00') + pd.to_timedelta(list(minutes), unit='min')
+
+
+def test_labels_closed_bounds(grid):
+    values = expand_to_grid(grid, dates(10), dates(20), ['run'], base='None', closed='both')
+    assert list(values[1:6]) == ['None', 'run', 'run', 'run', 'None']
+
+    values = expand_to_grid(grid, dates(10), dates(20), [1.0], closed='neither')
+    np.testing.assert_array_equal(np.flatnonzero(~np.isnan(values)), [3])
+
+
+def test_labels_overlap(grid):
+    start, end = dates(0, 10), dates(30, 20)
+    np.testing.assert_array_equal(expand_to_grid(grid, start, end, [1, 2], base=0)[:7], [1, 1, 2, 2, 1, 1, 0])
+    np.testing.assert_array_equal(expand_to_grid(grid, start, end, [1, 2], base=0, overlap='first')[:7],
+                                  [1, 1, 1, 1, 1, 1, 0])
+
+
+def test_rates_and_amounts_are_added(grid):
+    values = expand_to_grid(grid, dates(0, 10), dates(20, 30), [1.0, 6.0], mode=['rate', 'amount'], base=0.0)
+    np.testing.assert_allclose(values[:7], [1, 1, 2.5, 2.5, 1.5, 1.5, 0])
+
+
+def test_percents_scale_the_latest_label(grid):
+    start, end = dates(0, 10, 20), dates(60, 30, 40)
+    values = expand_to_grid(grid, start, end, [50.0, 2.0, 50.0], mode=['percent', 'label', 'percent'], base=1.0)
+    np.testing.assert_allclose(values[:10], [0.5, 0.5, 2, 2, 1, 1, 0.25, 0.25, 0.5, 0.5])
+
+    with pytest.raises(ValueError):
+        expand_to_grid(grid, start, end, [50.0, 2.0, 1.0], mode=['percent', 'label', 'rate'])
+
+
+def test_unsorted_grid_and_missing_dates(grid):
+    shuffled = grid[::-1]
+    values = expand_to_grid(shuffled, [dates(10)[0], pd.NaT], dates(20, 30), [1.0, 2.0], base=0.0)
+    np.testing.assert_array_equal(values, expand_to_grid(grid, dates(10), dates(20), [1.0], base=0.0)[::-1])
+
+
+def test_split_intervals():
+    start = pd.DatetimeIndex(['2024-01-01 00:01', '2024-01-01 01:00', '2024-01-01 02:00'])
+    end = start + pd.to_timedelta([12, 0, -5], unit='min')
+    pieces = split_intervals(start, end, {'rate': ([1.2, 1.0, 1.0], 'rate'), 'amount': ([12.0, 1.0, 1.0], 'amount'),
+                                          'label': (['a', 'b', 'c'], 'label')})
+
+    assert list(pieces.index) == list(pd.DatetimeIndex(['2024-01-01 00:01', '2024-01-01 00:06', '2024-01-01 00:11']))
+    np.testing.assert_allclose(pieces['rate'], [1.2, 1.2, 0.48])
+    np.testing.assert_allclose(pieces['amount'], [5, 5, 2])
+    assert list(pieces['label']) == ['a', 'a', 'a']
@@ -154,3 +154,42 @@ def test_string_values(metric_cls):
 
 def get_metric_name(metric_class):
     return metric_class.__module__.split('.')[-1]
+
+
+def test_grmse_penalty():
+    from glupredkit.metrics.grmse import penalty
+
+    g = np.array([50, 85, 100, 100, 150, 200, 250, np.nan, 100])
+    g_hat = np.array([70, 80, 112, 90, 130, 190, 200, 100, np.nan])
+    pen = penalty(g, g_hat)
+
+    assert pen.shape == g.shape
+    # Every pair is evaluated like a single pair, including missing values
+    np.testing.assert_allclose(pen, [penalty(true_val, pred_val) for true_val, pred_val in zip(g, g_hat)])
+    np.testing.assert_allclose(pen[[0, 2, 3, 7, 8]], [2.5, 1.0, 1.0, 1.0, 1.0])
+
+
+@pytest.mark.parametrize("metric_cls", metric_classes)
+def test_calculate_matrix(metric_cls):
+    rng = np.random.default_rng(0)
+    y_true = rng.uniform(40, 300, (200, 6))
+    y_pred = y_true + rng.normal(0, 30, (200, 6))
+    prediction_horizons = [5, 10, 15, 20, 25, 30]
+
+    metric = metric_cls()
+    scores = metric.calculate_matrix(y_true, y_pred, prediction_horizons)
+
+    # Batched metrics give the same scores as calculating each horizon separately
+    assert len(scores) == len(prediction_horizons)
+    for i, minutes in enumerate(prediction_horizons):
+        expected = metric(y_true[:, i].tolist(), y_pred[:, i].tolist(), prediction_horizon=minutes)
+        if np.asarray(expected).dtype.kind in 'US':
+            assert scores[i] == expected
+        else:
+            np.testing.assert_allclose(np.asarray(scores[i], dtype=float), np.asarray(expected, dtype=float),
+                                       rtol=1e-12)
+
+
+def test_calculate_matrix_shape_mismatch():
+    with pytest.raises(ValueError):
+        RMSE().calculate_matrix(np.ones((10, 2)), np.ones((10, 3)), [5, 10])
@@ -1,9 +1,17 @@
+import dill
+import json
+import os
 import pytest
 import numpy as np
 import pandas as pd
+from types import SimpleNamespace
 from sklearn.exceptions import NotFittedError
+from glupredkit.models import uva_padova
 from glupredkit.models.naive_linear_regressor import Model as NaiveLinearRegressor
+from glupredkit.models.random_forest import Model as RandomForest
 from glupredkit.models.ridge import Model as Ridge
+from glupredkit.models.svr import Model as SVR
+from glupredkit.models.uva_padova import Model as UvaPadova
 from glupredkit.models.zero_order import Model as ZeroOrder
 
 # Defining the list of model classes
@@ -33,4 +41,171 @@ def test_metric_class_name(model_cls):
     assert model.__class__.__name__ == "Model", f"Class name for {model_cls.__name__} is not 'Model'"
 
 
+def test_resident_objects_are_loaded_once_and_not_pickled(sample_data):
+    model = ZeroOrder(prediction_horizon=30)
+    loads = []
 
+    def load():
+        loads.append(1)
+        return object()
+
+    resident = model.get_resident('backend', load)
+    assert model.get_resident('backend', load) is resident
+    assert len(loads) == 1
+
+    model = dill.loads(dill.dumps(model))
+    assert '_resident' not in model.__dict__
+    model.get_resident('backend', load)
+    assert len(loads) == 2
+
+    # Fitting replaces the stored model, so the resident object is loaded again
+    model.fit(sample_data, sample_data[['CGM']])
+    model.get_resident('backend', load)
+    assert len(loads) == 3
+
+
+
+@pytest.mark.parametrize("n_workers", [1, 2])
+def test_ridge_is_fitted_per_subject(sample_data, n_workers, tmp_path):
+    # The target of each subject depends on a different feature
+    targets = pd.DataFrame({
+        'target_5': np.choose(sample_data['id'] - 1, [sample_data['CGM'], sample_data['insulin'],
+                                                      sample_data['carbs']]),
+    })
+    targets['target_10'] = 2 * targets['target_5']
+    model = Ridge(prediction_horizon=10).fit(sample_data, targets, n_workers=n_workers)
+
+    assert len(model.coefficients) == 3
+    assert model.features == ['CGM', 'insulin', 'carbs']
+    assert len(model.best_params()) == 6
+    np.testing.assert_allclose(model.predict(sample_data), targets, atol=1e-3)
+    np.testing.assert_allclose(model.coefficients[1][:, 0], [0, 1, 0], atol=1e-3)
+
+    model.save_model_weights(tmp_path / 'weights.json', subject_id=2)
+    with open(tmp_path / 'weights.json') as f:
+        weights = json.load(f)
+    assert weights['n_outputs'] == 2
+    np.testing.assert_allclose(weights['coefficients'][0], [0, 1, 0], atol=1e-3)
+
+
+@pytest.mark.parametrize("n_bins", [None, 16])
+def test_random_forest_predicts_all_outputs_with_one_forest(sample_data, n_bins):
+    targets = pd.DataFrame({'target_5': sample_data['CGM'], 'target_10': sample_data['CGM'] + sample_data['carbs']})
+    model = RandomForest(prediction_horizon=10).fit(sample_data[:600], targets[:600], n_jobs=2, n_bins=n_bins)
+
+    assert model.best_params() == {'n_estimators': 300, 'min_samples_split': 80}
+    y_pred = model.predict(sample_data[:10])
+    assert y_pred.shape == (10, 2)
+
+
+
+@pytest.mark.parametrize("n_components", [None, 200])
+def test_svr_predicts_all_outputs(sample_data, n_components):
+    targets = pd.DataFrame({'target_5': sample_data['CGM'], 'target_10': sample_data['CGM'] + sample_data['carbs']})
+    model = SVR(prediction_horizon=10).fit(sample_data[:600], targets[:600], n_components=n_components)
+
+    assert model.best_params() == {'C': 100, 'epsilon': 0.03, 'gamma': 0.008}
+    y_pred = model.predict(sample_data[:10])
+    assert y_pred.shape == (10, 2)
+
+
+def test_svr_kernel_approximation_is_deterministic(sample_data):
+    targets = pd.DataFrame({'target_5': sample_data['CGM'], 'target_10': sample_data['CGM'] + sample_data['carbs']})
+    y_preds = [SVR(prediction_horizon=10).fit(sample_data[:600], targets[:600], n_components=200)
+               .predict(sample_data[:10]) for _ in range(2)]
+
+    np.testing.assert_array_equal(y_preds[0], y_preds[1])
+
+
+def test_weighted_ridge_solves_the_weighted_loss_in_closed_form(sample_data):
+    torch = pytest.importorskip('torch')
+    from glupredkit.models.weighted_ridge import Model as WeightedRidge
+
+    targets = pd.DataFrame({'target_5': 100 + 100 * sample_data['CGM'],
+                            'target_10': 100 + 100 * (sample_data['CGM'] + sample_data['carbs'])})
+    x_train = sample_data[:600].copy()
+    model = WeightedRidge(prediction_horizon=10).fit(x_train, targets[:600])
+    assert model.predict(sample_data[:10]).shape == (10, 2)
+
+    # The coefficients are where the iterative training converges, so the gradient of its loss is zero
+    x = torch.tensor(model.scaler.transform(sample_data[:600].drop(columns=['id'])), dtype=torch.float32)
+    y = torch.tensor(model.y_scaler.transform(targets[:600].to_numpy()), dtype=torch.float32)
+    weights = torch.tensor(model.get_weight(targets[:600].to_numpy(), targets[:600].diff().fillna(0.0).to_numpy()),
+                           dtype=torch.float32)
+    loss = model.criterion.forward(model.model(x), y, weights)
+    loss = loss + model.alpha * torch.sum(model.model.weight ** 2) / model.output_dim
+    loss.backward()
+    assert torch.max(torch.abs(model.model.weight.grad)) < 1e-3
+    assert torch.max(torch.abs(model.model.bias.grad)) < 1e-3
+
+
+def identify_subject_stub(subset_df, n_steps):
+    return dill.dumps(SimpleNamespace(subject_id=subset_df['id'].iloc[0], n_samples=len(subset_df)))
+
+
+@pytest.fixture
+def uva_padova_data():
+    index = pd.date_range('2024-01-01', periods=60, freq='5min')
+    x_train = pd.concat([pd.DataFrame({'id': subject_id, 'CGM': 120.0 + subject_id, 'carbs': 0.0, 'basal': 0.8,
+                                       'bolus': 0.0}, index=index) for subject_id in [1, 2, 3]])
+    return x_train
+
+
+@pytest.mark.parametrize("n_workers", [1, 2])
+def test_uva_padova_resumes_from_checkpoints(uva_padova_data, n_workers, tmp_path, monkeypatch):
+    checkpoint_dir = str(tmp_path / 'checkpoints')
+    identified = []
+
+    def interrupted_identify_subject(subset_df, n_steps):
+        if identified:
+            raise KeyboardInterrupt
+        identified.append(subset_df['id'].iloc[0])
+        return identify_subject_stub(subset_df, n_steps)
+
+    monkeypatch.setattr(uva_padova, 'identify_subject', interrupted_identify_subject)
+    with pytest.raises(KeyboardInterrupt):
+        UvaPadova(prediction_horizon=30).fit(uva_padova_data, None, 10, 48, checkpoint_dir=checkpoint_dir)
+    assert identified == [1]
+    assert len(os.listdir(checkpoint_dir)) == 1
+
+    def resumed_identify_subject(subset_df, n_steps):
+        assert subset_df['id'].iloc[0] != 1
+        return identify_subject_stub(subset_df, n_steps)
+
+    # The stub of the workers must be importable, the one of the main process must not identify subject 1 again
+    monkeypatch.setattr(uva_padova, 'identify_subject', identify_subject_stub if n_workers > 1
+                        else resumed_identify_subject)
+    model = UvaPadova(prediction_horizon=30).fit(uva_padova_data, None, 10, 48, n_workers=n_workers,
+                                                 checkpoint_dir=checkpoint_dir)
+    assert [m.subject_id for m in model.models] == [1, 2, 3]
+    assert [m.n_samples for m in model.models] == [48, 48, 48]
+    assert len(os.listdir(checkpoint_dir)) == 3
+    assert not [name for name in os.listdir(checkpoint_dir) if name.endswith('.tmp')]
+
+    # Checkpoints of other training data are not reused
+    monkeypatch.setattr(uva_padova, 'identify_subject', identify_subject_stub)
+    changed_data = uva_padova_data.assign(CGM=uva_padova_data['CGM'] + 1)
+    UvaPadova(prediction_horizon=30).fit(changed_data, None, 10, 48, checkpoint_dir=checkpoint_dir)
+    assert len(os.listdir(checkpoint_dir)) == 6
+
+
+def test_uva_padova_forecasts_with_the_fitted_number_of_particles(uva_padova_data, monkeypatch):
+    monkeypatch.setattr(uva_padova, 'identify_subject', identify_subject_stub)
+    model = UvaPadova(prediction_horizon=30).fit(uva_padova_data, None, 10, 48, n_forecast_particles=20)
+    for m in model.models:
+        m.model = SimpleNamespace(model_parameters=None)
+    forecast_particles = []
+
+    def get_phy_prediction(model_parameters, data, prediction_horizon, n_forecast_particles=None):
+        forecast_particles.append(n_forecast_particles)
+        return []
+
+    model.get_phy_prediction = get_phy_prediction
+    model._predict_model(uva_padova_data)
+    assert forecast_particles == [20, 20, 20]
+
+    # Models stored before the option was added predict with all particles
+    del model.n_forecast_particles
+    forecast_particles.clear()
+    model._predict_model(uva_padova_data)
+    assert forecast_particles == [None, None, None]
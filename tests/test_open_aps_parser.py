@@ -0,0 +1,76 @@
+import io
+import json
+import zipfile
+import numpy as np
+import pandas as pd
+import pytest
+from glupredkit.parsers.open_aps import Parser, read_json
+
+
+def to_stream(text):
+    return io.BytesIO(text.encode('utf-8'))
+
+
+def test_read_json_array_across_chunks():
+    records = [{'date': i, 'value': float(i), 'other': list(range(i % 5))} for i in range(50)]
+    df = read_json(to_stream(json.dumps(records)), ['date', 'value', 'missing'], chunk_size=7)
+
+    assert list(df.columns) == ['date', 'value']
+    assert df['date'].tolist() == list(range(50))
+    assert df['value'].tolist() == [float(i) for i in range(50)]
+
+
+def test_read_json_lines_skips_invalid_lines():
+    text = '{"sgv": 100, "dateString": "a"}\n{"sgv": \n{"dateString": "b"}\n'
+    df = read_json(to_stream(text), ['dateString', 'sgv'], chunk_size=4)
+
+    assert df['dateString'].tolist() == ['a', 'b']
+    assert df['sgv'].iloc[0] == 100
+    assert pd.isna(df['sgv'].iloc[1])
+
+
+def test_read_json_empty():
+    assert read_json(to_stream('[]'), ['date']).empty
+    assert read_json(to_stream(''), ['date']).empty
+
+
+@pytest.fixture
+def open_aps_dir(tmp_path):
+    rng = np.random.default_rng(0)
+    start = pd.Timestamp('2024-01-01 00:02:13')
+    n = 288
+
+    def times(count, step_min):
+        return [start + pd.Timedelta(minutes=step_min * i) for i in range(count)]
+
+    with zipfile.ZipFile(tmp_path / 'AndroidAPS Uploader.zip', 'w') as z:
+        for subject_id in ['11111', '22222']:
+            bg = [{'date': t.value // 10**6, 'value': float(rng.uniform(60, 250))} for t in times(n, 5)]
+            z.writestr(f'{subject_id}/BgReadings.json', json.dumps(bg))
+            treatments = [{'date': t.value // 10**6, 'carbs': 20.0, 'insulin': 1.5} for t in times(10, 70)]
+            z.writestr(f'{subject_id}/Treatments.json', json.dumps(treatments))
+            aps = [{'queuedOn': t.value // 10**6, 'profile': {'current_basal': 0.8}} for t in times(n // 3, 15)]
+            z.writestr(f'{subject_id}/APSData.json', json.dumps(aps))
+
+    with zipfile.ZipFile(tmp_path / '33333.zip', 'w') as z:
+        entries = [{'dateString': t.strftime('%Y-%m-%dT%H:%M:%S.000Z'), 'sgv': int(rng.uniform(60, 250))}
+                   for t in times(n, 5)]
+        z.writestr('upload/33333_entries.json', '\n'.join(json.dumps(entry) for entry in entries))
+        treatments = [{'created_at': t.strftime('%Y-%m-%dT%H:%M:%SZ'), 'carbs': 30, 'insulin': 2.0}
+                      for t in times(10, 70)]
+        treatments += [{'created_at': t.strftime('%Y-%m-%dT%H:%M:%SZ'), 'rate': 1.5, 'duration': 30,
+                        'temp': 'absolute'} for t in times(10, 90)]
+        z.writestr('upload/33333_treatments.json', '\n'.join(json.dumps(treatment) for treatment in treatments))
+        profiles = [{'startDate': '2023-12-31T00:00:00Z', 'basal': [{'time': '00:00', 'value': 0.5}]}]
+        z.writestr('upload/33333_profile.json', json.dumps(profiles[0]))
+
+    return str(tmp_path) + '/'
+
+
+def test_parser_workers(open_aps_dir):
+    df = Parser()(file_path=open_aps_dir)
+
+    assert sorted(df['id'].unique()) == ['11111', '22222', '33333']
+    assert list(df.columns) == ['CGM', 'carbs', 'bolus', 'basal', 'insulin', 'id']
+
+    pd.testing.assert_frame_equal(df, Parser()(file_path=open_aps_dir, n_workers=2))
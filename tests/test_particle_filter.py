@@ -0,0 +1,185 @@
+import math
+import numpy as np
+import pytest
+from scipy.stats import norm
+from glupredkit.helpers.particle_filter import (ParticleFilter, FrozenModelParameters, MockModelParameters,
+                                                compute_hypoglycemic_risk, gi_measurement_likelihood_function,
+                                                gi_particle_filter_state_function, gi_state_function_continuous)
+
+N_PARTICLES = 50
+SIGMA_U = np.array([1e-2, 1e-2, 1e-2, 1e-3, 1e-3, 1e-3, 1e-5, 1.0, 1.0])
+
+
+@pytest.fixture
+def model_parameters():
+    mP = MockModelParameters()
+    mP.TS = 1
+    return mP
+
+
+@pytest.fixture
+def particles():
+    rng = np.random.default_rng(0)
+    x = np.column_stack([
+        rng.uniform(0, 20, (N_PARTICLES, 3)),
+        rng.uniform(0, 5, (N_PARTICLES, 3)),
+        rng.uniform(0, 1e-3, N_PARTICLES),
+        rng.uniform(40, 250, (N_PARTICLES, 2)),
+    ])
+    # Glucose at the threshold of the risk model and at the basal glucose
+    x[:2, 7] = [60, MockModelParameters().Gb]
+    return x
+
+
+def reference_hypoglycemic_risk(G, mP):
+    Gth = 60
+    if G < Gth:
+        G = Gth - 1
+    risk = 0.0
+    if Gth <= G < mP.Gb:
+        risk = 10 * (math.log(G) ** mP.r2 - math.log(mP.Gb) ** mP.r2) ** 2
+    elif G < Gth:
+        risk = 10 * (math.log(Gth) ** mP.r2 - math.log(mP.Gb) ** mP.r2) ** 2
+    return abs(risk)
+
+
+def reference_state_function(x, CHO, INS, time, mP):
+    Qsto1, Qsto2, Qgut, Isc1, Isc2, Ip, X, G, IG = x
+    Ipb = (mP.ka1 / mP.ke) * mP.u2ss / (mP.ka1 + mP.kd) + (mP.ka2 / mP.ke) * (mP.kd / mP.ka2) * mP.u2ss / (
+            mP.ka1 + mP.kd)
+    if time < 4 or time >= 17:
+        SI, kabs = mP.SI_D, mP.kabs_D
+    elif time < 11:
+        SI, kabs = mP.SI_B, mP.kabs_B
+    else:
+        SI, kabs = mP.SI_L, mP.kabs_L
+    rho_risk = 1 + reference_hypoglycemic_risk(G, mP)
+    Ra = mP.f * kabs * Qgut
+    return np.array([
+        -mP.kgri * Qsto1 + CHO,
+        mP.kgri * Qsto1 - mP.kempt * Qsto2,
+        mP.kempt * Qsto2 - kabs * Qgut,
+        -mP.kd * Isc1 + INS,
+        mP.kd * Isc1 - mP.ka2 * Isc2,
+        mP.ka2 * Isc2 - mP.ke * Ip,
+        -mP.p2 * (X - (SI / mP.VI) * (Ip - Ipb)),
+        -((mP.SG + rho_risk * X) * G) + mP.SG * mP.Gb + Ra / mP.VG,
+        -(1 / mP.alpha) * (IG - G),
+    ])
+
+
+def test_hypoglycemic_risk_matches_each_particle(particles, model_parameters):
+    G = particles[:, 7]
+    expected = [reference_hypoglycemic_risk(g, model_parameters) for g in G]
+
+    np.testing.assert_allclose(compute_hypoglycemic_risk(G, model_parameters), expected, rtol=1e-12)
+    assert compute_hypoglycemic_risk(G[0], model_parameters) == pytest.approx(expected[0], rel=1e-12)
+
+
+@pytest.mark.parametrize('time', [2, 8, 13, 20])
+def test_state_function_matches_each_particle(particles, model_parameters, time):
+    dxdt = gi_state_function_continuous(particles, 5.0, 0.02, time, model_parameters)
+    expected = [reference_state_function(x, 5.0, 0.02, time, model_parameters) for x in particles]
+
+    np.testing.assert_allclose(dxdt, expected, rtol=1e-12, atol=1e-15)
+    np.testing.assert_allclose(gi_state_function_continuous(particles[3], 5.0, 0.02, time, model_parameters),
+                               expected[3], rtol=1e-12, atol=1e-15)
+
+
+def make_filter(particles, seed):
+    pf = ParticleFilter(gi_particle_filter_state_function, gi_measurement_likelihood_function, N_PARTICLES,
+                        particles[0], np.diag(SIGMA_U), seed=seed)
+    pf.particles = particles.copy()
+    return pf
+
+
+def test_predict_and_correct_match_each_particle(particles, model_parameters):
+    pf = make_filter(particles, seed=1)
+    rng = make_filter(particles, seed=1).rng
+    weights = pf.weights.copy()
+
+    mean, cov = pf.predict(5.0, 0.02, 8, SIGMA_U, model_parameters)
+
+    noise = rng.standard_normal(particles.shape)
+    expected = np.array([x + reference_state_function(x, 5.0, 0.02, 8, model_parameters) * model_parameters.TS +
+                         noise[k] * SIGMA_U for k, x in enumerate(particles)])
+    np.testing.assert_allclose(pf.particles, expected, rtol=1e-12, atol=1e-15)
+    np.testing.assert_allclose(mean, expected.mean(axis=0), rtol=1e-12)
+    np.testing.assert_allclose(cov, np.cov(expected, rowvar=False), rtol=1e-9, atol=1e-18)
+
+    measurement = float(np.median(expected[:, 8]))
+    mean, cov = pf.correct(measurement, 10.0)
+
+    for k in range(N_PARTICLES):
+        weights[k] *= norm.pdf(expected[k, 8], measurement, 10.0)
+    weights += 1.e-300
+    weights /= weights.sum()
+    cumulative_sum = np.cumsum(weights)
+    cumulative_sum[-1] = 1.0
+    indexes = [int(np.searchsorted(cumulative_sum, u)) for u in rng.random(N_PARTICLES)]
+    np.testing.assert_allclose(pf.particles, expected[indexes], rtol=1e-12)
+    np.testing.assert_allclose(pf.weights, np.full(N_PARTICLES, 1 / N_PARTICLES))
+    np.testing.assert_allclose(mean, expected[indexes].mean(axis=0), rtol=1e-12)
+
+
+def run_filter(seed, model_parameters):
+    x0 = [0, 0, 0, 1, 1, 1, 0, 120, 120]
+    pf = ParticleFilter(gi_particle_filter_state_function, gi_measurement_likelihood_function, N_PARTICLES, x0,
+                        np.diag(SIGMA_U), seed=seed)
+    for measurement in [122, 125, 121, 118]:
+        pf.predict(0.0, 0.01, 8, SIGMA_U, model_parameters)
+        pf.correct(measurement, 10.0)
+    return pf.particles
+
+
+def test_same_seed_gives_the_same_particles(model_parameters):
+    np.testing.assert_array_equal(run_filter(1, model_parameters), run_filter(1, model_parameters))
+    assert not np.array_equal(run_filter(1, model_parameters), run_filter(2, model_parameters))
+
+
+@pytest.mark.parametrize('n_forecast_particles', [None, N_PARTICLES, 20])
+def test_fork_leaves_the_filter_unchanged(particles, model_parameters, n_forecast_particles):
+    pf = make_filter(particles, seed=1)
+    reference = make_filter(particles, seed=1)
+    frozen_parameters = FrozenModelParameters(model_parameters)
+
+    for _ in range(2):
+        forecast = pf.fork(n_forecast_particles)
+        assert isinstance(forecast, ParticleFilter)
+        assert forecast.particles.shape == (n_forecast_particles or N_PARTICLES, particles.shape[1])
+        np.testing.assert_allclose(forecast.weights.sum(), 1.0)
+        # The particles of the fork are drawn from the particles of the filter
+        assert all((row == pf.particles).all(axis=1).any() for row in forecast.particles)
+        for _ in range(3):
+            forecast.predict(5.0, 0.02, 8, SIGMA_U, frozen_parameters)
+
+    np.testing.assert_array_equal(pf.particles, particles)
+    np.testing.assert_array_equal(pf.weights, reference.weights)
+    assert pf.rng.bit_generator.state == reference.rng.bit_generator.state
+
+    # The filter continues exactly as a filter that was never forked
+    pf.predict(5.0, 0.02, 8, SIGMA_U, model_parameters)
+    reference.predict(5.0, 0.02, 8, SIGMA_U, model_parameters)
+    np.testing.assert_array_equal(pf.particles, reference.particles)
+
+
+def test_fork_subsamples_distinct_particles(particles):
+    pf = make_filter(particles, seed=1)
+    forecast = pf.fork(20)
+
+    assert forecast.num_particles == 20
+    assert len(np.unique(forecast.particles, axis=0)) == 20
+    assert pf.fork(20) is forecast
+    assert pf.fork(10).particles.shape == (10, particles.shape[1])
+    assert pf.fork(2 * N_PARTICLES).num_particles == N_PARTICLES
+
+
+def test_frozen_model_parameters_reject_writes(model_parameters):
+    frozen_parameters = FrozenModelParameters(model_parameters)
+
+    assert frozen_parameters.Gb == model_parameters.Gb
+    with pytest.raises(AttributeError):
+        frozen_parameters.Gb = 100
+    with pytest.raises(AttributeError):
+        frozen_parameters.new_parameter = 1
+    assert frozen_parameters.Gb == model_parameters.Gb
@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+import pytest
+from glupredkit.models.per_subject import PerSubjectModel
+from glupredkit.models.base_model import BaseModel
+from glupredkit.models.ridge import Model as Ridge
+
+
+class MeanModel(BaseModel):
+    # Predicts the mean targets of the training data
+    def _fit_model(self, x_train, y_train, *args):
+        self.model = y_train.mean().to_numpy()
+        return self
+
+    def _predict_model(self, x_test):
+        return np.tile(self.model, (len(x_test), 1))
+
+
+class ArgumentsModel(MeanModel):
+    # Stores the fit arguments
+    def _fit_model(self, x_train, y_train, *args, **kwargs):
+        self.fit_args = args, kwargs
+        return super()._fit_model(x_train, y_train)
+
+
+class DtypesModel(MeanModel):
+    # Stores the types of the features
+    def _fit_model(self, x_train, y_train, *args):
+        self.dtypes = x_train.dtypes.to_dict()
+        return super()._fit_model(x_train, y_train)
+
+
+def get_data():
+    rng = np.random.default_rng(0)
+    x = pd.DataFrame({
+        'id': rng.choice([1, 2, 3], 900),
+        'CGM': rng.uniform(60, 250, 900),
+        'insulin': rng.uniform(0, 2, 900),
+    })
+    # Each subject has its own relation between the inputs and the targets
+    y = pd.DataFrame({
+        'target_5': x['CGM'] + x['id'] * x['insulin'],
+        'target_10': x['CGM'] - 10 * x['id'] * x['insulin'],
+    })
+    return x, y
+
+
+@pytest.mark.parametrize("n_workers, use_threads", [(1, False), (2, False), (2, True)])
+def test_per_subject_predictions_are_in_row_order(n_workers, use_threads):
+    x, y = get_data()
+    model = PerSubjectModel(Ridge, 10, n_workers=n_workers, use_threads=use_threads).fit(x, y)
+
+    assert model.subject_ids == list(x['id'].unique())
+    # The ridge model is already fitted per subject, so it gives the same predictions
+    expected = Ridge(10).fit(x, y).predict(x)
+    np.testing.assert_allclose(model.predict(x), expected, rtol=1e-10)
+
+    for subject_id in [1, 2, 3]:
+        rows = (x['id'] == subject_id).to_numpy()
+        subject_model = Ridge(10).fit(x[rows], y[rows])
+        np.testing.assert_allclose(model.models[subject_id].predict(x[rows]), subject_model.predict(x[rows]))
+
+
+def test_per_subject_unseen_subjects_use_the_fallback():
+    x, y = get_data()
+    x_test = x.copy()
+    x_test.loc[x_test.index[::2], 'id'] = 4
+
+    with pytest.raises(ValueError):
+        PerSubjectModel(Ridge, 10).fit(x, y).predict(x_test)
+
+    model = PerSubjectModel(Ridge, 10, fallback=MeanModel(10)).fit(x, y)
+    y_pred = model.predict(x_test)
+    unseen = (x_test['id'] == 4).to_numpy()
+    np.testing.assert_allclose(y_pred[unseen], np.tile(y.mean().to_numpy(), (unseen.sum(), 1)))
+    np.testing.assert_allclose(y_pred[~unseen], Ridge(10).fit(x, y).predict(x_test[~unseen]))
+
+
+def test_per_subject_passes_fit_arguments():
+    x, y = get_data()
+    model = PerSubjectModel(ArgumentsModel, 10, fallback=ArgumentsModel(10)).fit(x, y, 5, n_components=20)
+
+    for subject_model in list(model.models.values()) + [model.fallback]:
+        assert subject_model.fit_args == ((5,), {'n_components': 20})
+
+
+def test_per_subject_requires_subject_ids():
+    x, y = get_data()
+
+    with pytest.raises(ValueError):
+        PerSubjectModel(Ridge, 10).fit(x.drop(columns='id'), y)
+
+
+@pytest.mark.parametrize("n_workers, use_threads", [(1, False), (2, False), (2, True)])
+def test_per_subject_features_keep_their_types(n_workers, use_threads):
+    x, y = get_data()
+    x['steps'] = np.arange(len(x))
+    model = PerSubjectModel(DtypesModel, 10, n_workers=n_workers, use_threads=use_threads).fit(x, y)
+
+    for subject_model in model.models.values():
+        assert subject_model.dtypes == x.dtypes.to_dict()
@@ -0,0 +1,48 @@
+import numpy as np
+from sklearn.cross_decomposition import PLSRegression
+from glupredkit.helpers.pls_solver import get_pls_components
+
+
+def get_data(n_outputs):
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=(400, 20)) * 10
+    x[:, 5] = 2 * x[:, 4]
+    y = x[:, :5] @ rng.normal(size=(5, n_outputs)) + rng.normal(size=(400, n_outputs)) * 20
+    return x[:300], y[:300], x[300:], y[300:]
+
+
+def get_scikit_learn_errors(x_train, y_train, x_validation, y_validation, max_components):
+    errors = []
+    for n_components in range(1, max_components + 1):
+        y_pred = PLSRegression(n_components).fit(x_train, y_train).predict(x_validation)
+        errors += [np.sqrt(np.mean((y_pred.reshape(y_validation.shape) - y_validation) ** 2))]
+    return errors
+
+
+def test_pls_components_are_equal_to_scikit_learn():
+    x_train, y_train, x_validation, y_validation = get_data(1)
+    y_train, y_validation = y_train[:, 0], y_validation[:, 0]
+    n_components, errors = get_pls_components(x_train, y_train, x_validation, y_validation)
+
+    expected = get_scikit_learn_errors(x_train, y_train, x_validation, y_validation, len(errors))
+    np.testing.assert_allclose(errors, expected, rtol=1e-8)
+    assert n_components == np.argmin(expected) + 1
+
+
+def test_pls_components_with_several_outputs():
+    data = get_data(3)
+    n_components, errors = get_pls_components(*data, max_components=10)
+
+    assert len(errors) == 10
+    # Scikit-learn finds the weights of several outputs by power iteration with a tolerance
+    np.testing.assert_allclose(errors, get_scikit_learn_errors(*data, 10), rtol=1e-3)
+
+
+def test_pls_components_stop_when_the_error_flattens():
+    data = get_data(1)
+    n_components, errors = get_pls_components(*data)
+    early_n_components, early_errors = get_pls_components(*data, patience=3)
+
+    assert len(early_errors) < len(errors)
+    assert early_errors == errors[:len(early_errors)]
+    assert early_n_components == n_components
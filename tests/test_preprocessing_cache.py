@@ -0,0 +1,94 @@
+import os
+import importlib
+import pandas as pd
+from glupredkit.helpers.preprocessing_cache import get_or_compute, get_cache_key, get_code_fingerprint, CACHE_EXTENSION
+from glupredkit.helpers.cli import get_preprocessed_data
+from glupredkit.models.per_subject import PerSubjectModel
+
+
+class ConfigManager:
+    def __init__(self, config):
+        self.config = config
+
+    def get_data(self):
+        return 'df.csv'
+
+
+class Counter:
+    def __init__(self, value):
+        self.value = value
+        self.n_calls = 0
+
+    def __call__(self):
+        self.n_calls += 1
+        return self.value
+
+
+def get_key(input_path, config, model='ridge', per_subject=False):
+    preprocessor_module = importlib.import_module('glupredkit.preprocessors.basic')
+    model_module = importlib.import_module(f'glupredkit.models.{model}')
+    chosen_model = PerSubjectModel(model_module.Model, 30) if per_subject else model_module.Model(30)
+    return get_cache_key(input_path, ConfigManager(config), get_preprocessed_data, preprocessor_module,
+                         chosen_model.process_data, split='train')
+
+
+def test_get_or_compute(tmp_path):
+    compute = Counter(pd.DataFrame({'CGM': [100.0, 110.0]}))
+
+    value, is_cached = get_or_compute('key', compute, cache_dir=tmp_path)
+    assert not is_cached
+    value, is_cached = get_or_compute('key', compute, cache_dir=tmp_path)
+    assert is_cached
+    pd.testing.assert_frame_equal(value, compute.value)
+    assert compute.n_calls == 1
+
+    get_or_compute('key', compute, cache_dir=tmp_path, rebuild=True)
+    assert compute.n_calls == 2
+
+    get_or_compute('other_key', compute, cache_dir=tmp_path, use_cache=False)
+    assert compute.n_calls == 3
+    assert not (tmp_path / ('other_key' + CACHE_EXTENSION)).exists()
+
+
+def test_evict_least_recently_used(tmp_path):
+    for i, key in enumerate(['a', 'b', 'c']):
+        get_or_compute(key, Counter(bytes(1000)), cache_dir=tmp_path)
+        os.utime(tmp_path / (key + CACHE_EXTENSION), ns=(i * 10 ** 9, i * 10 ** 9))
+
+    # Reading 'a' makes it the most recently used entry, so 'b' and 'c' are removed
+    get_or_compute('a', Counter(None), cache_dir=tmp_path)
+    get_or_compute('d', Counter(bytes(1000)), cache_dir=tmp_path, max_size=2500)
+    assert sorted(path.stem for path in tmp_path.glob('*' + CACHE_EXTENSION)) == ['a', 'd']
+
+
+def test_get_cache_key(tmp_path):
+    (tmp_path / 'df.csv').write_text('date,id,CGM\n')
+    key = get_key(tmp_path, {'num_features': ['CGM']})
+
+    assert get_key(tmp_path, {'num_features': ['CGM']}) == key
+    # Models that use the same data processing share the cache entry
+    assert get_key(tmp_path, {'num_features': ['CGM']}, model='svr') == key
+    assert get_key(tmp_path, {'num_features': ['CGM']}, model='zero_order') != key
+    assert get_key(tmp_path, {'num_features': ['CGM', 'carbs']}) != key
+
+    os.utime(tmp_path / 'df.csv', ns=(0, 0))
+    assert get_key(tmp_path, {'num_features': ['CGM']}) != key
+
+
+def test_get_cache_key_of_wrapped_models(tmp_path):
+    (tmp_path / 'df.csv').write_text('date,id,CGM\n')
+    config = {'num_features': ['CGM']}
+    key = get_key(tmp_path, config, model='ridge', per_subject=True)
+
+    # The processed data of a per-subject model depends on the model class that it wraps
+    assert get_key(tmp_path, config, model='zero_order', per_subject=True) != key
+    assert get_key(tmp_path, config, model='ridge', per_subject=True) == key
+
+
+def test_code_fingerprint_is_stable():
+    def process_data(df):
+        return [col for col in df.columns if col.startswith('target')]
+
+    # Nested code objects are fingerprinted by their content, not by their memory address
+    assert get_code_fingerprint(process_data) == get_code_fingerprint(process_data)
+    assert not any(' at 0x' in value for value in get_code_fingerprint(process_data))
@@ -0,0 +1,149 @@
+import datetime
+import numpy as np
+import pandas as pd
+from pyloopkit.carb_store import get_carb_glucose_effects as get_carb_glucose_effects_unbatched
+from pyloopkit.dose import DoseType
+from pyloopkit.dose_store import get_glucose_effects as get_glucose_effects_unbatched
+from pyloopkit.glucose_store import get_recent_momentum_effects
+from pyloopkit.loop_data_manager import update
+from glupredkit.helpers.pyloopkit import (SubjectEvents, get_glucose_effects, get_momentum_effects,
+                                          get_carb_glucose_effects, get_prediction_output, get_prediction_outputs)
+from glupredkit.models.loop import Model
+
+
+def get_subject_df(n_lags=96):
+    rng = np.random.default_rng(0)
+    dates = pd.date_range('2024-01-02 12:00', periods=3, freq='5min', tz='UTC', name='date')
+    columns = {'CGM': [150.0, 152.0, 155.0], 'carbs': [0.0, 40.0, 0.0], 'bolus': [0.0, 4.0, 0.0],
+               'basal': [0.8, 0.8, 0.8]}
+    for i in range(1, n_lags + 1):
+        columns[f'CGM_{5 * i}'] = 150 + 20 * np.sin(i / 10) + rng.normal(0, 2, 3)
+        columns[f'carbs_{5 * i}'] = 30.0 if i == 40 else 0.0
+        columns[f'bolus_{5 * i}'] = 3.0 if i in [40, 70] else 0.0
+        columns[f'basal_{5 * i}'] = 0.8
+    columns['carbs_what_if_5'] = 20.0
+    columns['bolus_what_if_5'] = 0.0
+    return pd.DataFrame(columns, index=dates)
+
+
+def test_subject_events_input_dict():
+    df = get_subject_df(n_lags=2)
+    input_dict = SubjectEvents(df).get_input_dict(1, {})
+    date = df.index[1]
+
+    assert input_dict['time_to_calculate_at'] == date
+    assert input_dict['glucose_dates'] == [date - datetime.timedelta(minutes=10), date - datetime.timedelta(minutes=5),
+                                           date]
+    assert input_dict['carb_dates'] == [date, date + datetime.timedelta(minutes=5)]
+    assert input_dict['carb_values'] == [40.0, 20.0]
+    assert input_dict['carb_absorption_times'] == [180, 180]
+
+    # Basals are registered before a bolus at the same time
+    assert input_dict['dose_types'] == [DoseType.basal, DoseType.basal, DoseType.basal, DoseType.bolus]
+    assert input_dict['dose_start_times'][-2:] == [date, date]
+    assert input_dict['dose_end_times'][-2:] == [date + datetime.timedelta(minutes=5), date]
+
+
+def test_get_glucose_effects():
+    start = datetime.datetime(2024, 1, 2, 12)
+    dose_types, dose_starts, dose_ends, dose_values = [], [], [], []
+    for i, minutes in enumerate([0, 5, 30, 45, 90, 0, 15]):
+        dose_start = start - datetime.timedelta(hours=8) + datetime.timedelta(minutes=50 * i)
+        dose_types.append(DoseType.tempbasal if minutes else DoseType.bolus)
+        dose_starts.append(dose_start)
+        dose_ends.append(dose_start + datetime.timedelta(minutes=minutes))
+        dose_values.append(1.0 + i / 2)
+    args = (dose_types, dose_starts, dose_ends, dose_values, [None] * len(dose_types))
+    schedules = ([datetime.time(0, 0)], [0.8], [1440], [datetime.time(0, 0)], [datetime.time(0, 0)], [40.0],
+                 [360, 75])
+
+    for start_date in [start - datetime.timedelta(hours=24), start]:
+        expected_dates, expected_values = get_glucose_effects_unbatched(*args, start_date, *schedules)
+        effect_dates, effect_values = get_glucose_effects(*args, start_date, *schedules)
+
+        assert effect_dates == expected_dates
+        np.testing.assert_allclose(effect_values, expected_values, atol=1e-9)
+
+
+def test_get_prediction_output():
+    model = Model(prediction_horizon=60)
+    subject_events = SubjectEvents(get_subject_df())
+
+    for i in range(len(subject_events)):
+        input_dict = subject_events.get_input_dict(i, model.get_input_dict(40.0, 10.0, 0.8))
+        expected = update(dict(input_dict))['predicted_glucose_values']
+        output = get_prediction_output(dict(input_dict))['predicted_glucose_values']
+
+        np.testing.assert_allclose(output, expected)
+
+
+def test_get_momentum_effects():
+    now = datetime.datetime(2024, 1, 2, 12)
+    glucose_dates = [now - datetime.timedelta(minutes=5 * i) for i in range(6, -1, -1)]
+    glucose_inputs = [
+        (glucose_dates, [150.0, 152.0, 155.0, 154.0, 158.0, 161.0, 163.0], now - datetime.timedelta(hours=24), now,
+         15),
+        (glucose_dates, [150.0] * 7, now - datetime.timedelta(hours=24), now, 15),
+        (glucose_dates, [150.0, 152.0, 155.0, 154.0, 158.0, 161.0, 160.0], now - datetime.timedelta(hours=24), now,
+         30),
+        # Too few values, values at the same time and no start date give no momentum
+        (glucose_dates, [150.0, 152.0, 155.0, 154.0, 158.0, 161.0, 163.0], now - datetime.timedelta(hours=24), now,
+         5),
+        ([now] * 3, [150.0, 152.0, 155.0], now - datetime.timedelta(hours=24), now, 15),
+        (glucose_dates, [150.0] * 7, None, now, 15),
+    ]
+
+    effects = get_momentum_effects(glucose_inputs)
+
+    for glucose_input, (effect_dates, effect_values) in zip(glucose_inputs, effects):
+        expected_dates, expected_values = get_recent_momentum_effects(*glucose_input, 5)
+        assert effect_dates == expected_dates
+        np.testing.assert_allclose(effect_values, expected_values, atol=1e-12)
+    assert effects[3] == effects[4] == effects[5] == ([], [])
+
+
+def test_get_carb_glucose_effects():
+    rng = np.random.default_rng(0)
+    at_date = datetime.datetime(2024, 1, 2, 12)
+    carb_dates = [at_date - datetime.timedelta(minutes=minutes) for minutes in [200, 90, 30, -5]]
+    carb_values = [30.0, 50.0, 20.0, 20.0]
+    absorption_times = [120, 180, 240, 180]
+    effect_starts = [at_date - datetime.timedelta(minutes=5 * i) for i in range(96, 0, -1)]
+    effect_ends = [date + datetime.timedelta(minutes=5) for date in effect_starts]
+    schedules = ([datetime.time(0, 0)], [10.0], [datetime.time(0, 0)], [datetime.time(0, 0)], [40.0],
+                 [120.0, 180.0, 240.0])
+
+    # Low counteraction effects leave the absorption to be estimated, high ones are observed as absorption
+    carb_inputs = [(carb_dates, carb_values, absorption_times, at_date, effect_starts, effect_ends,
+                    list(velocity + rng.normal(0, 0.5, len(effect_starts))), *schedules)
+                   for velocity in [0.0, 1.0, 4.0]]
+    carb_inputs += [
+        (carb_dates, carb_values, absorption_times, at_date, [], [], [], *schedules),
+        ([], [], [], at_date, effect_starts, effect_ends, [1.0] * len(effect_starts), *schedules),
+    ]
+
+    for delay in [0, 10]:
+        effects = get_carb_glucose_effects(carb_inputs, delay=delay)
+
+        for carb_input, (effect_dates, effect_values) in zip(carb_inputs, effects):
+            expected_dates, expected_values = get_carb_glucose_effects_unbatched(*carb_input, delay=delay)
+            assert effect_dates == expected_dates
+            np.testing.assert_allclose(effect_values, expected_values, atol=1e-9)
+        assert effects[-1] == ([], [])
+
+
+def test_get_prediction_outputs():
+    model = Model(prediction_horizon=60)
+    subject_events = SubjectEvents(get_subject_df())
+
+    for insulin_sensitivity, carb_ratio in [(40.0, 10.0), (10.0, 30.0)]:
+        input_dicts = [subject_events.get_input_dict(i, model.get_input_dict(insulin_sensitivity, carb_ratio, 0.8))
+                       for i in range(len(subject_events))]
+        outputs = get_prediction_outputs([dict(input_dict) for input_dict in input_dicts])
+
+        for input_dict, output in zip(input_dicts, outputs):
+            expected = update(dict(input_dict))
+            for key in ['momentum_effect', 'carb_effect']:
+                assert output[f'{key}_dates'] == expected[f'{key}_dates']
+                np.testing.assert_allclose(output[f'{key}_values'], expected[f'{key}_values'], atol=1e-9)
+            np.testing.assert_allclose(output['predicted_glucose_values'], expected['predicted_glucose_values'])
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+from glupredkit.helpers.results import (save_results, load_results, convert_legacy_results_csv, list_results_files,
+                                        read_legacy_results_csv)
+
+
+def get_results_df():
+    dates = pd.date_range('2024-01-01', periods=4, freq='5min')
+    return pd.DataFrame({
+        'Model Name': ['ridge'],
+        'test_samples': [4],
+        'prediction_horizon': [10],
+        'num_features': [['CGM', 'carbs']],
+        'test_input_CGM': [np.array([100.0, 110.0, np.nan, 130.0])],
+        'test_input_carbs': [np.array([0, 20, 0, 0])],
+        'test_input_date': [dates.to_numpy()],
+        'target_5': [np.array([110.0, np.nan, 130.0, 140.0])],
+        'y_pred_5': [np.array([108.0, 119.5, 131.0, 138.0])],
+        'rmse_5': [1.5],
+        'parkes_error_grid_5': [['100%', '0%', '0%', '0%', '0%']],
+        'target_10': [np.array([np.nan, 130.0, 140.0, np.nan])],
+        'y_pred_10': [np.array([118.0, 127.0, 142.5, 150.0])],
+        'rmse_10': [2.5],
+        'parkes_error_grid_10': [['90%', '10%', '0%', '0%', '0%']],
+    })
+
+
+def assert_results_equal(df, expected):
+    assert list(df.columns) == list(expected.columns)
+    for col in expected.columns:
+        value, expected_value = df[col][0], expected[col][0]
+        if isinstance(expected_value, np.ndarray):
+            assert isinstance(value, np.ndarray)
+            if np.issubdtype(expected_value.dtype, np.datetime64):
+                np.testing.assert_array_equal(value, expected_value)
+            else:
+                np.testing.assert_allclose(value, expected_value, equal_nan=True)
+        else:
+            assert value == expected_value
+
+
+def test_save_and_load_results(tmp_path):
+    expected = get_results_df()
+    results_path = save_results(expected, str(tmp_path / 'ridge__config__10.csv'))
+
+    assert results_path == str(tmp_path / 'ridge__config__10.npz')
+    assert (tmp_path / 'ridge__config__10.json').exists()
+
+    df = load_results(results_path)
+    assert_results_equal(df, expected)
+    assert df['y_pred_5'][0].dtype == np.float32
+    assert df['test_input_carbs'][0].dtype == expected['test_input_carbs'][0].dtype
+
+    with np.load(results_path) as bundle:
+        assert bundle['predictions'].shape == (4, 2)
+        assert bundle['targets'].dtype == np.float32
+
+
+def test_legacy_results_csv(tmp_path):
+    expected = get_results_df()
+
+    # The legacy format stored every list as a string
+    legacy_df = expected.copy()
+    legacy_df['test_input_date'] = [pd.DatetimeIndex(expected['test_input_date'][0]).tolist()]
+    for col in legacy_df.columns:
+        if isinstance(legacy_df[col][0], (list, np.ndarray)):
+            legacy_df[col] = str(list(legacy_df[col][0]))
+    legacy_path = tmp_path / 'ridge__config__10.csv'
+    legacy_df.to_csv(legacy_path, index=False)
+
+    assert list_results_files(tmp_path) == ['ridge__config__10.csv']
+    assert_results_equal(read_legacy_results_csv(str(legacy_path)), expected)
+    assert_results_equal(load_results(str(legacy_path)), expected)
+
+    convert_legacy_results_csv(str(legacy_path))
+
+    assert list_results_files(tmp_path) == ['ridge__config__10.npz']
+    assert_results_equal(load_results(str(tmp_path / 'ridge__config__10.npz')), expected)
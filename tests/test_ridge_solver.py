@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from sklearn.linear_model import Ridge
+from sklearn.model_selection import GridSearchCV
+from glupredkit.helpers.ridge_solver import fit_ridge, fit_weighted_ridge
+
+ALPHAS = [0.001, 0.01, 0.1, 1.0, 1e4, 1e6]
+
+
+def get_data():
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=(500, 8)) * 10
+    y = x @ rng.normal(size=(8, 4)) + rng.normal(size=(500, 4)) * [1, 10, 100, 1000]
+    return x, y
+
+
+def test_fit_ridge_is_equal_to_scikit_learn():
+    x, y = get_data()
+    coefficients, intercepts, best_alphas, cv_errors = fit_ridge(x, y, ALPHAS)
+
+    assert cv_errors.shape == (len(ALPHAS), 4)
+    for i, alpha in enumerate(best_alphas):
+        # The folds are contiguous, like the unshuffled folds of a grid search
+        grid_search = GridSearchCV(Ridge(), {'alpha': ALPHAS}, cv=5, scoring='neg_mean_squared_error').fit(x, y[:, i])
+        np.testing.assert_allclose(cv_errors[:, i], -grid_search.cv_results_['mean_test_score'], rtol=1e-8)
+        assert alpha == grid_search.best_params_['alpha']
+        ridge = Ridge(alpha=alpha).fit(x, y[:, i])
+        np.testing.assert_allclose(coefficients[:, i], ridge.coef_, rtol=1e-8)
+        np.testing.assert_allclose(intercepts[i], ridge.intercept_, rtol=1e-8)
+
+
+def test_fit_ridge_requires_a_sample_per_fold():
+    x, y = get_data()
+    with pytest.raises(ValueError):
+        fit_ridge(x[:4], y[:4], ALPHAS)
+
+
+def test_fit_ridge_with_constant_features():
+    x, y = get_data()
+    x = np.column_stack([x, np.ones(len(x))])
+    coefficients, intercepts, _, _ = fit_ridge(x, y, [1.0])
+
+    ridge = Ridge(alpha=1.0).fit(x, y)
+    np.testing.assert_allclose(coefficients, ridge.coef_.T, atol=1e-8)
+    np.testing.assert_allclose(intercepts, ridge.intercept_, rtol=1e-8)
+
+
+def test_fit_weighted_ridge_is_equal_to_scikit_learn():
+    x, y = get_data()
+    weights = np.random.default_rng(1).uniform(1, 500, size=y.shape)
+    coefficients, intercepts = fit_weighted_ridge(x, y, weights, alpha=10.0)
+
+    for i in range(y.shape[1]):
+        ridge = Ridge(alpha=10.0).fit(x, y[:, i], sample_weight=weights[:, i])
+        np.testing.assert_allclose(coefficients[:, i], ridge.coef_, rtol=1e-8)
+        np.testing.assert_allclose(intercepts[i], ridge.intercept_, rtol=1e-8)
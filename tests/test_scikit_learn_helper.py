@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import Ridge
+from sklearn.multioutput import MultiOutputRegressor
+from glupredkit.helpers.scikit_learn import build_feature_matrix, fit_parameter_grid
+
+
+def test_build_feature_matrix():
+    df = pd.DataFrame({
+        'CGM': [100.0, 110.0, 120.0, 200.0, 210.0, 220.0],
+        'carbs': [0.0, 10.0, 0.0, 0.0, 0.0, 30.0],
+    })
+    features = build_feature_matrix(df, ['CGM'], 2, ['carbs'], 10, groups=[1, 1, 1, 2, 2, 2])
+
+    assert list(features.columns) == ['CGM_5', 'CGM_10', 'carbs_what_if_5', 'carbs_what_if_10']
+    assert features.index.equals(df.index)
+
+    # Values are never shifted across subjects
+    expected = pd.DataFrame({
+        'CGM_5': [np.nan, 100.0, 110.0, np.nan, 200.0, 210.0],
+        'CGM_10': [np.nan, np.nan, 100.0, np.nan, np.nan, 200.0],
+        'carbs_what_if_5': [10.0, 0.0, np.nan, 0.0, 30.0, np.nan],
+        'carbs_what_if_10': [0.0, np.nan, np.nan, 30.0, np.nan, np.nan],
+    })
+    pd.testing.assert_frame_equal(features, expected)
+
+
+def test_build_feature_matrix_single_group():
+    df = pd.DataFrame({'CGM': np.arange(10, dtype=float)})
+    features = build_feature_matrix(df, ['CGM'], 3, [], 30)
+
+    for i in range(1, 4):
+        pd.testing.assert_series_equal(features[f'CGM_{i * 5}'], df['CGM'].shift(i), check_names=False)
+
+
+def test_fit_parameter_grid():
+    rng = np.random.default_rng(0)
+    x = pd.DataFrame(rng.normal(size=(100, 3)))
+    y = pd.DataFrame({'target_5': x[0] * 2, 'target_10': x[1] - x[2]})
+
+    model, params = fit_parameter_grid(MultiOutputRegressor(Ridge()), {'estimator__alpha': [0.5]}, x, y)
+    assert params == {'alpha': 0.5}
+    assert model.estimators_[0].alpha == 0.5
+
+    # Several candidates are chosen between by cross-validation
+    model, params = fit_parameter_grid(MultiOutputRegressor(Ridge()), {'estimator__alpha': [1e-3, 1e3]}, x, y)
+    assert params == {'alpha': 1e-3}
+    assert model.predict(x).shape == (100, 2)
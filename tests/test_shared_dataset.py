@@ -0,0 +1,91 @@
+import gc
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+import pytest
+from glupredkit.helpers.shared_dataset import SharedDataset
+
+
+def get_data():
+    index = pd.date_range('2024-01-01', periods=1000, freq='5min', tz='Europe/Oslo', name='date')
+    x = pd.DataFrame({
+        'CGM': np.random.uniform(60, 250, 1000),
+        'id': np.repeat(['a', 'b', 'c', 'a'], 250),
+        'insulin': np.random.uniform(0, 2, 1000),
+    }, index=index)
+    y = pd.DataFrame({'target_5': x['CGM'] + 1, 'target_10': x['CGM'] + 2}, index=index)
+    return x, y
+
+
+def get_subject_sums(dataset, subject_id):
+    x, y = dataset.to_frame(dataset.get_subject_rows()[subject_id])
+    return x['CGM'].sum(), y.to_numpy().sum()
+
+
+def is_removed(name):
+    try:
+        shared_memory.SharedMemory(name=name).close()
+        return False
+    except FileNotFoundError:
+        return True
+
+
+def test_shared_dataset_is_identical_to_the_frame():
+    x, y = get_data()
+    with SharedDataset.from_frame(x, y) as dataset:
+        x_shared, y_shared = dataset.to_frame()
+        pd.testing.assert_frame_equal(x_shared, x, check_freq=False)
+        pd.testing.assert_frame_equal(y_shared, y, check_freq=False)
+        # All rows are views of the shared memory
+        assert np.shares_memory(x_shared['CGM'].to_numpy(), dataset.x)
+
+        rows = dataset.get_subject_rows()
+        assert list(rows) == ['a', 'b', 'c']
+        pd.testing.assert_frame_equal(dataset.to_frame(rows['a'])[0], x[x['id'] == 'a'])
+
+
+def test_shared_dataset_keeps_the_feature_types():
+    x, y = get_data()
+    x['steps'] = np.arange(len(x))
+    x['is_test'] = x['CGM'] > 150
+    with SharedDataset.from_frame(x, y) as dataset:
+        assert dataset.x.dtype == np.float64
+        x_shared, _ = dataset.to_frame(np.arange(10, 20))
+        pd.testing.assert_frame_equal(x_shared, x.iloc[10:20], check_freq=False)
+
+        x_worker, _ = pickle.loads(pickle.dumps(dataset)).to_frame()
+        assert x_worker.dtypes.to_dict() == x.dtypes.to_dict()
+
+
+def test_shared_dataset_is_attached_in_worker_processes():
+    x, y = get_data()
+    with SharedDataset.from_frame(x, y) as dataset:
+        # Only the name and layout of the shared memory are pickled
+        assert len(pickle.dumps(dataset)) < 2000
+
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            results = list(executor.map(get_subject_sums, [dataset] * 3, ['a', 'b', 'c']))
+        for subject_id, (cgm_sum, target_sum) in zip(['a', 'b', 'c'], results):
+            rows = x['id'] == subject_id
+            assert cgm_sum == pytest.approx(x.loc[rows, 'CGM'].sum())
+            assert target_sum == pytest.approx(y[rows].to_numpy().sum())
+
+
+def test_shared_dataset_is_removed_when_closed_or_collected():
+    x, y = get_data()
+    dataset = SharedDataset.from_frame(x, y)
+    name = dataset._state['name']
+    attached = pickle.loads(pickle.dumps(dataset))
+    attached.close()
+    assert not is_removed(name)
+    dataset.close()
+    assert is_removed(name)
+
+    dataset = SharedDataset(np.zeros((10, 4, 3), dtype=np.float32))
+    name = dataset._state['name']
+    assert dataset.x.shape == (10, 4, 3) and not dataset.x.flags.writeable
+    del dataset
+    gc.collect()
+    assert is_removed(name)
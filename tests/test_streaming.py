@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+import pytest
+from glupredkit.helpers import scikit_learn, tf_keras
+from glupredkit.helpers.streaming import StreamingPredictor, RingBuffer
+from glupredkit.helpers.tf_keras import process_data
+from glupredkit.models.ridge import Model as RidgeModel
+from glupredkit.models.zero_order import Model as ZeroOrderModel
+
+
+class ConfigManager:
+    def get_num_features(self):
+        return ['CGM', 'insulin', 'carbs']
+
+    def get_num_lagged_features(self):
+        return 4
+
+    def get_what_if_features(self):
+        return ['insulin']
+
+    def get_prediction_horizon(self):
+        return 15
+
+
+class SequenceModel:
+    # A model that takes the sequences of the tf_keras helper, and predicts the last CGM value
+    def process_data(self, df, model_config_manager, real_time):
+        return process_data(df, model_config_manager, real_time)
+
+    def predict(self, x_test):
+        return x_test['sequence'][:, 3, :1]
+
+
+def get_preprocessed_data(subject_ids=(1, 2), n_samples=40):
+    np.random.seed(0)
+    dfs = []
+    for subject_id in subject_ids:
+        index = pd.date_range('2024-01-01', periods=n_samples, freq='5min', name='date')
+        df = pd.DataFrame({
+            'CGM': np.random.uniform(60, 250, n_samples),
+            'insulin': np.random.uniform(0, 2, n_samples),
+            'carbs': np.random.choice([0.0, 0.0, 30.0], n_samples),
+            'id': subject_id,
+            'imputed': False,
+        }, index=index)
+        df.loc[df.index[10], 'CGM'] = np.nan
+        df.loc[df.index[20], 'imputed'] = True
+        for i in range(1, 4):
+            df[f'target_{i * 5}'] = df['CGM'].shift(-i)
+        dfs += [df]
+    return pd.concat(dfs)
+
+
+def get_what_if(df, date, skip_imputed=True):
+    # The planned insulin of the next samples, where imputed samples are skipped like in the scikit-learn process_data
+    if skip_imputed:
+        df = df[~df['imputed']]
+    return {'insulin': df.loc[df.index > date, 'insulin'].iloc[:3].tolist()}
+
+
+def test_ring_buffer():
+    buffer = RingBuffer(3, 1)
+    for value in range(5):
+        buffer.append([value])
+    assert buffer.get_rows([0, 1, 2])[:, 0].tolist() == [4, 3, 2]
+
+    buffer = RingBuffer(3, 1)
+    buffer.append([1])
+    assert np.isnan(buffer.get_rows([0, 1])[1, 0])
+
+
+def test_streaming_features_are_identical_to_process_data():
+    df = get_preprocessed_data()
+    config = ConfigManager()
+    expected = scikit_learn.process_data(df.copy(), config, real_time=True)
+    expected = expected.drop(columns=[col for col in expected.columns if col.startswith('target')])
+
+    streaming = StreamingPredictor(RidgeModel(15), config, columns=list(df.columns))
+    rows = []
+    for subject_id, subject_df in df.groupby('id'):
+        for date, sample in subject_df.iterrows():
+            if streaming.add_sample(sample.to_dict()):
+                row = streaming.get_model_input(subject_id, date, what_if=get_what_if(subject_df, date))
+                if row is not None:
+                    rows += [row]
+    result = pd.concat(rows)
+
+    # The batch rows need the targets, so the newest rows of each subject are only in the streaming result
+    result = result[result.index.isin(expected.index)]
+    assert len(result) == len(expected)
+    np.testing.assert_array_equal(result.to_numpy(dtype=float), expected.to_numpy(dtype=float))
+    assert list(result.columns) == list(expected.columns)
+
+
+def test_streaming_predictions_are_identical_to_batch_predictions():
+    df = get_preprocessed_data()
+    config = ConfigManager()
+    processed = scikit_learn.process_data(df.copy(), config, real_time=False)
+    target_cols = [col for col in processed.columns if col.startswith('target')]
+    model = RidgeModel(15).fit(processed.drop(columns=target_cols), processed[target_cols])
+    expected = model.predict(processed.drop(columns=target_cols))
+
+    streaming = StreamingPredictor(model, config)
+    subject_df = df[df['id'] == 1]
+    predictions = {}
+    for date, sample in subject_df.iterrows():
+        y_pred = streaming.predict(sample.to_dict(), date, what_if=get_what_if(subject_df, date))
+        if y_pred is not None:
+            predictions[date] = y_pred
+
+    expected = expected[(processed['id'] == 1).to_numpy()]
+    dates = processed[processed['id'] == 1].index
+    np.testing.assert_allclose([predictions[date] for date in dates], expected, rtol=1e-12)
+
+
+def test_streaming_sequences_are_identical_to_process_data():
+    df = get_preprocessed_data(subject_ids=[1])
+    config = ConfigManager()
+    expected = tf_keras.process_data(df.copy(), config, real_time=True)
+
+    streaming = StreamingPredictor(SequenceModel(), config)
+    sequences = {}
+    for date, sample in df.iterrows():
+        streaming.add_sample(sample.to_dict())
+        model_input = streaming.get_model_input(1, date, what_if=get_what_if(df, date, skip_imputed=False))
+        if model_input is not None:
+            sequences[date] = model_input['sequence'][0]
+            assert model_input.feature_names == expected.feature_names
+
+    assert len(expected) > 0
+    for date, sequence in zip(expected.index, expected['sequence']):
+        np.testing.assert_array_equal(sequences[date], sequence)
+
+
+def test_streaming_is_not_supported_for_other_data_processing():
+    with pytest.raises(ValueError):
+        StreamingPredictor(ZeroOrderModel(15), ConfigManager())
@@ -0,0 +1,99 @@
+import pytest
+import numpy as np
+import pandas as pd
+from glupredkit.helpers.tf_keras import SequenceDataset, KerasPredictor, prepare_sequences
+
+
+@pytest.fixture
+def sample_data():
+    dates = pd.date_range('2024-01-01', periods=40, freq='5min', tz='UTC', name='date')
+    df_X = pd.DataFrame({
+        'CGM': np.arange(100, 140, dtype=float),
+        'insulin': np.linspace(0, 1, 40),
+        'carbs': np.zeros(40),
+    }, index=dates)
+    df_y = pd.DataFrame({
+        'target_5': df_X['CGM'].shift(-1),
+        'target_10': df_X['CGM'].shift(-2),
+    }, index=dates)
+    return df_X, df_y
+
+
+@pytest.fixture
+def dataset(sample_data):
+    df_X, df_y = sample_data
+    sequences, targets, dates = prepare_sequences(df_X, df_y, window_size=6, what_if_columns=['insulin'],
+                                                  prediction_horizon=10, real_time=False)
+    return SequenceDataset(sequences=sequences, targets=targets, dates=dates, feature_names=['CGM', 'insulin'])
+
+
+def test_dataset_arrays(dataset):
+    assert dataset['sequence'].dtype == np.float32
+    assert dataset['sequence'].shape == (len(dataset), 8, 2)
+    assert dataset['target'].shape == (len(dataset), 2)
+    assert dataset.index.name == 'date'
+    # What-if columns extend into the prediction horizon, the other columns are padded with -1
+    np.testing.assert_array_equal(dataset['sequence'][0, 6:, 0], [-1, -1])
+    assert dataset['sequence'][0, 7, 1] > dataset['sequence'][0, 5, 1]
+
+
+def test_dataframe_interface(dataset):
+    target_cols = [col for col in dataset if col.startswith('target')]
+    assert target_cols == ['target']
+
+    x = dataset.drop(target_cols, axis=1)
+    assert list(x.columns) == ['sequence']
+    with pytest.raises(KeyError):
+        x['target']
+
+    tail = dataset[-5:]
+    assert len(tail) == 5
+    np.testing.assert_array_equal(tail['target'], dataset['target'][-5:])
+    assert tail.index.equals(dataset.index[-5:])
+
+
+@pytest.mark.parametrize("mmap", [False, True])
+def test_save_and_load(dataset, tmp_path, mmap):
+    path = str(tmp_path / ('dataset' if mmap else 'dataset.npz'))
+    dataset.save(path, mmap=mmap)
+    loaded = SequenceDataset.load(path, mmap=mmap)
+
+    np.testing.assert_array_equal(loaded['sequence'], dataset['sequence'])
+    np.testing.assert_array_equal(loaded['target'], dataset['target'])
+    assert loaded.index.equals(dataset.index)
+    assert loaded.feature_names == ['CGM', 'insulin']
+
+
+@pytest.mark.parametrize("real_time", [False, True])
+def test_prepare_sequences_skips_invalid_windows(sample_data, real_time):
+    df_X, df_y = sample_data
+    df_X = df_X.copy()
+    df_X['imputed'] = False
+    df_X.iloc[10, df_X.columns.get_loc('CGM')] = np.nan
+    df_X.iloc[30, df_X.columns.get_loc('imputed')] = True
+    df_y = df_y.copy()
+    df_y.iloc[20, 0] = np.nan
+
+    sequences, targets, dates = prepare_sequences(df_X, df_y, window_size=6, what_if_columns=[],
+                                                  prediction_horizon=10, real_time=real_time)
+    last_indices = [df_X.index.get_loc(date) for date in dates]
+
+    # Windows covering the NaN value, ending at an imputed sample or missing their label are skipped
+    assert not any(8 <= i <= 15 for i in last_indices)
+    assert 30 not in last_indices
+    assert (20 in last_indices) == real_time
+    assert sequences.shape == (len(dates), 8, 2)
+    np.testing.assert_array_equal(sequences[:, :6, 0], [df_X['CGM'].iloc[i - 5:i + 1] for i in last_indices])
+
+
+def test_keras_predictor(dataset):
+    tf = pytest.importorskip('tensorflow')
+    sequences = dataset['sequence']
+    inputs = tf.keras.Input(shape=sequences.shape[1:])
+    outputs = tf.keras.layers.Dense(2)(tf.keras.layers.Flatten()(inputs))
+    model = tf.keras.Model(inputs=inputs, outputs=outputs)
+
+    predictor = KerasPredictor(model, batch_size=7)
+    np.testing.assert_allclose(predictor.predict(sequences), model.predict(sequences), rtol=1e-5)
+    assert predictor.predict(sequences[:1]).shape == (1, 2)
+